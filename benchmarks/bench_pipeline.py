@@ -0,0 +1,190 @@
+# coding: utf-8
+
+# Benchmarks of every stage of the Data Wrangling and EDA pipeline.
+#
+# Run with pytest-benchmark:
+#   python -m pytest benchmarks/bench_pipeline.py --benchmark-only
+# The sizes of the synthetic datasets are taken from TMDB_BENCH_SIZES
+# (comma separated, default 10000), for example
+#   TMDB_BENCH_SIZES=10000,1000000,10000000 python -m pytest benchmarks/bench_pipeline.py
+# Every benchmark reports the wall time per stage and, in extra_info, the
+# peak memory allocated by the stage as traced by tracemalloc.
+
+import os
+import sys
+import tracemalloc
+
+import pytest
+
+pytest.importorskip('pytest_benchmark')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd  # noqa: E402
+
+from benchmarks.synthetic import csv_path  # noqa: E402
+from tmdb import pipeline  # noqa: E402
+from tmdb.aggregates import AggregateCache  # noqa: E402
+from tmdb.binning import quantile_edges  # noqa: E402
+from tmdb.bitmaps import BitmapIndex  # noqa: E402
+from tmdb.bridges import build_bridges  # noqa: E402
+from tmdb.cube import Cube  # noqa: E402
+from tmdb.dedup import deduplicate  # noqa: E402
+from tmdb.schema import memory_usage  # noqa: E402
+from tmdb.stats import correlation, ols  # noqa: E402
+
+SIZES = [int(size) for size in os.environ.get('TMDB_BENCH_SIZES', '10000').split(',')]
+ROUNDS = int(os.environ.get('TMDB_BENCH_ROUNDS', '3'))
+
+
+def measure(benchmark, function, *args):
+    """Benchmark function(*args) and record its peak traced memory in MiB."""
+    tracemalloc.start()
+    try:
+        function(*args)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    benchmark.extra_info['peak_memory_mib'] = round(peak / 2 ** 20, 2)
+    return benchmark.pedantic(function, args=args, rounds=ROUNDS, iterations=1)
+
+
+@pytest.fixture(scope='session', params=SIZES, ids=lambda size: '{}rows'.format(size))
+def path(request):
+    return csv_path(request.param)
+
+
+@pytest.fixture(scope='session')
+def raw(path):
+    return pd.read_csv(path)
+
+
+@pytest.fixture(scope='session')
+def loaded(path):
+    return pipeline.load(path)
+
+
+@pytest.fixture(scope='session')
+def cleaned(loaded):
+    return pipeline.clean(loaded)
+
+
+@pytest.fixture(scope='session')
+def classified(cleaned):
+    return pipeline.classify(cleaned)
+
+
+@pytest.fixture(scope='session')
+def bridges(classified):
+    return build_bridges(classified)
+
+
+# load:
+
+def test_read_csv_all_columns(benchmark, path):
+    measure(benchmark, pd.read_csv, path)
+
+
+def test_read_csv_typed(benchmark, path):
+    measure(benchmark, pipeline.load, path)
+
+
+# cleaning:
+
+def test_drop_duplicates(benchmark, raw):
+    measure(benchmark, lambda df: df.drop(columns=pipeline.NOT_RELEVANT).drop_duplicates(), raw)
+
+
+def test_deduplicate_by_id(benchmark, loaded):
+    measure(benchmark, deduplicate, loaded)
+
+
+def test_fillna(benchmark, loaded):
+    measure(benchmark, pipeline.fill_unknown, loaded)
+
+
+def test_clean(benchmark, loaded):
+    measure(benchmark, pipeline.clean, loaded)
+
+
+# classification:
+
+def test_bin_edges(benchmark, cleaned):
+    measure(benchmark, quantile_edges, cleaned, list(pipeline.QUANTILE_CLASSES))
+
+
+def test_classify(benchmark, cleaned):
+    classified = measure(benchmark, pipeline.classify, cleaned)
+    benchmark.extra_info['dataset_mib'] = round(memory_usage(classified).sum() / 2 ** 20, 2)
+
+
+# explode:
+
+def test_explode_genres_frame(benchmark, classified):
+    measure(benchmark, lambda df: df.assign(genres_splitted=df['genres'].str.split('|')).explode('genres_splitted'),
+            classified)
+
+
+def test_explode_cast_frame(benchmark, classified):
+    measure(benchmark, lambda df: df.assign(cast_splitted=df['cast'].str.split('|')).explode('cast_splitted'),
+            classified)
+
+
+def test_build_bridges(benchmark, classified):
+    bridges = measure(benchmark, build_bridges, classified)
+    usage = memory_usage(classified, bridges)
+    benchmark.extra_info['bridges_mib'] = round(usage[usage.index.str.startswith('bridge ')].sum() / 2 ** 20, 2)
+
+
+# groupbys:
+
+def test_groupby_release_year(benchmark, classified):
+    measure(benchmark, lambda df: df.groupby('release_year')[['budget', 'revenue', 'winnings']].mean(), classified)
+
+
+def test_aggregate_cache_genres(benchmark, classified, bridges):
+    measure(benchmark, lambda: AggregateCache(classified, bridges).frame('genre', ['budget', 'revenue', 'winnings']))
+
+
+def test_crosstab_groupby(benchmark, classified):
+    measure(benchmark, lambda df: df.groupby(['vote_counts_class', 'rating_class'], observed=False).size(),
+            classified)
+
+
+def test_crosstab_bitmaps(benchmark, classified, bridges):
+    index = BitmapIndex.build(classified, bridges)
+    measure(benchmark, index.crosstab, 'vote_counts_class', 'rating_class')
+
+
+def test_build_cube(benchmark, classified, bridges):
+    measure(benchmark, Cube.build, classified, bridges)
+
+
+def test_cube_genre_means(benchmark, classified, bridges):
+    cube = Cube.build(classified, bridges)
+    measure(benchmark, lambda: cube.rollup('genre').frame(['budget', 'revenue', 'winnings']))
+
+
+def test_aggregate_all_questions(benchmark, classified, bridges):
+    measure(benchmark, pipeline.aggregate, classified, 'Actor 0', bridges)
+
+
+# statistics:
+
+def test_spearman_by_genre(benchmark, classified, bridges):
+    measure(benchmark, correlation, classified, ['budget', 'revenue', 'winnings'], 'spearman', 'genre', bridges)
+
+
+def test_ols_by_release_year(benchmark, classified):
+    measure(benchmark, ols, classified, 'revenue', ['budget', 'runtime'], 'release_year')
+
+
+# plots:
+
+def test_render(benchmark, classified, bridges, tmp_path):
+    pytest.importorskip('matplotlib')
+    pytest.importorskip('seaborn')
+    from tmdb.report import render_report
+    results = pipeline.aggregate(classified, 'Actor 0', bridges)
+    results.update(pipeline.chart_data(classified))
+    measure(benchmark, lambda: render_report(results, str(tmp_path), actor='Actor 0', processes=1, force=True))
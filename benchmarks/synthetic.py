@@ -0,0 +1,95 @@
+# coding: utf-8
+
+# Synthetic datasets with the shape of tmdb-movies.csv for the benchmarks.
+#
+# The generated csv-files have all 21 columns of the original file and the
+# properties the cleaning has to deal with: about 54% movies with 0 budget,
+# 55% with 0 revenue and 0.3% with 0 runtime, missing values in the text
+# columns, a few exactly duplicated rows and pipe-delimited cast, genre,
+# company and keyword lists whose names are Zipf distributed, like real
+# credits where a few actors appear in many movies.
+
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+GENRES = ['Action', 'Adventure', 'Animation', 'Comedy', 'Crime', 'Documentary', 'Drama', 'Family', 'Fantasy',
+          'Foreign', 'History', 'Horror', 'Music', 'Mystery', 'Romance', 'Science Fiction', 'TV Movie',
+          'Thriller', 'War', 'Western']
+
+
+def _names(prefix, count):
+    return np.array(['{} {}'.format(prefix, i) for i in range(count)], dtype=object)
+
+
+def _pipe_lists(rng, names, n, max_length, zipf=1.3):
+    """Return n pipe-delimited lists of 1 to max_length Zipf distributed names."""
+    lengths = rng.integers(1, max_length + 1, n)
+    picks = (rng.zipf(zipf, lengths.sum()) - 1) % len(names)
+    tokens = names[picks]
+    ends = np.cumsum(lengths)
+    return ['|'.join(tokens[end - length:end]) for end, length in zip(ends, lengths)]
+
+
+def make_raw(n, seed=0, duplicates=0.001):
+    """Return a raw DataFrame with n rows (plus duplicates) in the layout of tmdb-movies.csv."""
+    rng = np.random.default_rng(seed)
+    actors = _names('Actor', max(100, n // 10))
+    companies = _names('Company', max(50, n // 50))
+    keywords = _names('Keyword', max(50, n // 20))
+    directors = _names('Director', max(50, n // 5))
+
+    budget = rng.integers(1, 400, n) * 1000000
+    budget[rng.random(n) < 0.5443] = 0
+    revenue = (rng.lognormal(17, 1.5, n)).astype(np.int64)
+    revenue[rng.random(n) < 0.5537] = 0
+    runtime = rng.integers(3, 240, n)
+    runtime[rng.random(n) < 0.0029] = 0
+    release = pd.to_datetime('1960-01-01') + pd.to_timedelta(rng.integers(0, 365 * 56, n), unit='D')
+
+    def with_missing(values, share):
+        values = pd.Series(values, dtype=object)
+        values[rng.random(n) < share] = None
+        return values
+
+    df = pd.DataFrame({
+        'id': np.arange(1, n + 1),
+        'imdb_id': ['tt{:07d}'.format(i) for i in range(n)],
+        'popularity': rng.exponential(0.6, n),
+        'budget': budget,
+        'revenue': revenue,
+        'original_title': ['Movie {}'.format(i) for i in range(n)],
+        'cast': with_missing(_pipe_lists(rng, actors, n, 5), 0.007),
+        'homepage': with_missing(['http://www.movie{}.com/'.format(i) for i in range(n)], 0.73),
+        'director': with_missing(directors[rng.integers(0, len(directors), n)], 0.004),
+        'tagline': with_missing(['A tagline for movie {}.'.format(i) for i in range(n)], 0.26),
+        'keywords': with_missing(_pipe_lists(rng, keywords, n, 5), 0.14),
+        'overview': ['An overview of movie {} with a few more words than the tagline has.'.format(i)
+                     for i in range(n)],
+        'runtime': runtime,
+        'genres': with_missing(_pipe_lists(rng, np.array(GENRES, dtype=object), n, 4, zipf=1.1), 0.002),
+        'production_companies': with_missing(_pipe_lists(rng, companies, n, 3), 0.09),
+        'release_date': release.strftime('%-m/%-d/%y'),
+        'vote_count': rng.integers(10, 10000, n),
+        'vote_average': np.round(rng.normal(6, 0.9, n).clip(1.5, 9.2), 1),
+        'release_year': release.year,
+    })
+    df['budget_adj'] = df['budget'] * 1.2
+    df['revenue_adj'] = df['revenue'] * 1.2
+
+    duplicated = df.sample(frac=duplicates, random_state=seed)
+    return pd.concat([df, duplicated], ignore_index=True)
+
+
+def csv_path(n, seed=0, directory=None):
+    """Return the path of a synthetic csv-file with n rows, it is generated only once per directory."""
+    if directory is None:
+        directory = os.path.join(tempfile.gettempdir(), 'tmdb-benchmarks')
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, 'tmdb-movies-{}-{}.csv'.format(n, seed))
+    if not os.path.exists(path):
+        make_raw(n, seed).to_csv(path + '.tmp', index=False)
+        os.replace(path + '.tmp', path)
+    return path
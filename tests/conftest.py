@@ -0,0 +1,32 @@
+# coding: utf-8
+
+# Fixtures of the tests: small synthetic datasets in the layout of
+# tmdb-movies.csv, see benchmarks/synthetic.py.
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic import csv_path, make_raw  # noqa: E402
+from tmdb import pipeline  # noqa: E402
+
+ROWS = 3000
+
+
+@pytest.fixture(scope='session')
+def raw():
+    return make_raw(ROWS, seed=1)
+
+
+@pytest.fixture(scope='session')
+def path(tmp_path_factory):
+    return csv_path(ROWS, seed=1, directory=str(tmp_path_factory.mktemp('data')))
+
+
+@pytest.fixture(scope='session')
+def cleaned(path):
+    """The cleaned and classified movies, which the tests must not modify."""
+    return pipeline.classify(pipeline.clean(pipeline.load(path)))
@@ -0,0 +1,47 @@
+# coding: utf-8
+
+import pandas as pd
+import pytest
+
+from tmdb.aggregates import STATISTICS, AggregateCache
+from tmdb.bridges import build_bridges
+
+
+@pytest.mark.parametrize('stat', STATISTICS)
+def test_statistics_match_groupby(cleaned, stat):
+    aggregates = AggregateCache(cleaned)
+    grouped = cleaned.groupby('release_year')
+    expected = grouped.size() if stat == 'count' else grouped['revenue'].agg(stat)
+    pd.testing.assert_series_equal(aggregates.get('release_year', 'revenue', stat), expected, check_names=False,
+                                   check_dtype=False)
+
+
+@pytest.mark.parametrize('filter', ['budget_class == "premium" & vote_counts_class != "few"',
+                                    'genre == "Drama"', 'release_year >= 2000 and runtime < 120'])
+def test_filters(cleaned, filter):
+    aggregates = AggregateCache(cleaned, build_bridges(cleaned, {'genre': 'genres'}))
+    if filter.startswith('genre'):
+        selected = cleaned[cleaned['genres'].astype(object).str.split('|').map(lambda genres: 'Drama' in genres)]
+    else:
+        selected = cleaned.query(filter)
+    expected = selected.groupby('rating_class', observed=True)['budget'].mean()
+    pd.testing.assert_series_equal(aggregates.get('rating_class', 'budget', filter=filter), expected,
+                                   check_names=False)
+
+
+def test_groupings_are_shared_and_evicted(cleaned):
+    aggregates = AggregateCache(cleaned, maxsize=2)
+    aggregates.get('release_year', 'budget')
+    aggregates.get('release_year', 'revenue', 'max')
+    aggregates.get('release_year', 'budget')
+    info = aggregates.cache_info()
+    assert (info['tables'].misses, info['results'].misses, info['results'].hits) == (1, 2, 1)
+
+    # the filter is part of the key of a grouped table:
+    aggregates.get('release_year', 'budget', filter='budget_class == "low"')
+    aggregates.get('budget_class', 'budget')
+    assert aggregates.cache_info()['tables'].misses == 3
+    # the least recently used table (release_year without filter) is gone:
+    aggregates.get('release_year', 'runtime')
+    assert aggregates.cache_info()['tables'].misses == 4
+    assert aggregates.cache_info()['tables'].currsize == 2
@@ -0,0 +1,145 @@
+# coding: utf-8
+
+import asyncio
+import email.utils
+import json
+import time
+
+import pytest
+
+from tmdb.api import TMDBClient, TokenBucket, retry_after
+from tmdb.api_server import MockTMDBServer
+
+MOVIES = {movie_id: {'id': movie_id, 'budget': movie_id * 1000, 'revenue': movie_id * 3000, 'runtime': 90}
+          for movie_id in range(1, 41)}
+
+
+def _movies(server, ids, **options):
+    async def fetch():
+        async with TMDBClient(server.url, **options) as client:
+            return await client.movies(ids), client
+
+    return asyncio.run(fetch())
+
+
+def _scripted(responses, ids, **options):
+    """Answer the requests of the client with the raw responses in turn, return the details and the connections."""
+    async def run():
+        connections = []
+
+        async def answer(reader, writer):
+            connections.append(writer)
+            while responses:
+                try:
+                    await reader.readuntil(b'\r\n\r\n')
+                except asyncio.IncompleteReadError:
+                    break
+                response, close = responses.pop(0)
+                writer.write(response)
+                await writer.drain()
+                if close:
+                    break
+            writer.close()
+
+        server = await asyncio.start_server(answer, '127.0.0.1', 0)
+        url = 'http://127.0.0.1:{}/3'.format(server.sockets[0].getsockname()[1])
+        async with TMDBClient(url, **options) as client:
+            details = await client.movies(ids)
+        server.close()
+        return details, len(connections)
+
+    return asyncio.run(run())
+
+
+def _response(status, headers, body=b''):
+    lines = ['HTTP/1.1 {} X'.format(status)] + ['{}: {}'.format(name, value) for name, value in headers]
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode() + body
+
+
+def test_details_and_unknown_ids():
+    with MockTMDBServer(MOVIES) as server:
+        details, client = _movies(server, [1, 2, 999])
+    assert details[1] == MOVIES[1] and details[2] == MOVIES[2]
+    assert details[999] is None
+    assert client.failures == {}
+
+
+def test_keep_alive_connections_are_reused():
+    with MockTMDBServer(MOVIES) as server:
+        details, client = _movies(server, list(MOVIES), concurrency=4)
+    assert len(details) == len(MOVIES)
+    assert server.requests == len(MOVIES)
+    assert server.connections <= 4
+
+
+def test_retry_after_429():
+    with MockTMDBServer(MOVIES, rate_limit=10) as server:
+        start = time.monotonic()
+        details, client = _movies(server, list(MOVIES)[:25], rate=1000, retries=5)
+    assert all(details[movie_id] == MOVIES[movie_id] for movie_id in list(MOVIES)[:25])
+    assert server.requests > 25
+    # the server answers Retry-After: 1 once more than 10 requests arrive in one second:
+    assert time.monotonic() - start >= 1
+
+
+def test_5xx_is_retried_and_failures_are_recorded():
+    # with one connection every second request fails and every movie needs at most one retry:
+    with MockTMDBServer(MOVIES, fail_every=2) as server:
+        details, client = _movies(server, list(MOVIES)[:10], concurrency=1, backoff=0.01, retries=1)
+    assert len(details) == 10 and client.failures == {}
+    assert server.requests == 19
+
+    with MockTMDBServer(MOVIES, fail_every=1) as server:
+        details, client = _movies(server, [1, 2, 3], backoff=0.01, retries=1)
+    assert details == {}
+    assert sorted(client.failures) == [1, 2, 3]
+    assert server.requests == 6
+
+
+def test_second_run_is_answered_from_the_cache(tmp_path):
+    with MockTMDBServer(MOVIES) as server:
+        first, _ = _movies(server, [1, 2, 999], cache_dir=str(tmp_path))
+        requests = server.requests
+        second, client = _movies(server, [1, 2, 999], cache_dir=str(tmp_path))
+    assert second == first
+    assert server.requests == requests == 3
+    assert client.requests == 0
+
+
+def test_token_bucket_recovers_its_rate():
+    async def run():
+        bucket = TokenBucket(100, recovery=0.5)
+        bucket.throttle(0.1)
+        assert bucket.rate == 50
+        for _ in range(60):
+            await bucket.acquire()
+        return bucket.rate
+
+    assert asyncio.run(run()) == pytest.approx(100)
+
+
+def test_body_without_length_ends_with_the_connection():
+    bodies = [json.dumps(MOVIES[movie_id]).encode() for movie_id in (1, 2)]
+    responses = [(_response(200, [('Content-Type', 'application/json')], body), True) for body in bodies]
+    details, connections = _scripted(responses, [1, 2], concurrency=1)
+    assert details == {1: MOVIES[1], 2: MOVIES[2]}
+    assert connections == 2
+
+
+def test_retry_after_as_http_date():
+    assert retry_after('2') == 2
+    assert retry_after('soon') is None
+    assert retry_after(email.utils.formatdate(time.time() - 60, usegmt=True)) == 0
+    assert 0 < retry_after(email.utils.formatdate(time.time() + 60, usegmt=True)) <= 60
+
+    body = json.dumps(MOVIES[1]).encode()
+    date = email.utils.formatdate(time.time() + 2, usegmt=True)
+    responses = [(_response(429, [('Retry-After', date), ('Content-Length', 0)]), False),
+                 (_response(503, [('Retry-After', 'later'), ('Content-Length', 0)]), False),
+                 (_response(200, [('Content-Length', len(body))], body), False)]
+    start = time.monotonic()
+    details, connections = _scripted(responses, [1], backoff=0.01, retries=2)
+    assert details == {1: MOVIES[1]}
+    assert connections == 1
+    # the HTTP-date is rounded down to whole seconds:
+    assert 1 <= time.monotonic() - start < 3
@@ -0,0 +1,51 @@
+# coding: utf-8
+
+import numpy as np
+import pytest
+
+from tmdb.binning import QUARTILES, KLLSketch, quantile_edges, sketch_edges
+
+Q = np.linspace(0.05, 0.95, 19)
+
+
+def _rank_error(values, estimates, q):
+    ranks = np.searchsorted(np.sort(values), estimates, side='right') / len(values)
+    return np.abs(ranks - q).max()
+
+
+def test_quantile_edges_match_series_quantile(cleaned):
+    edges = quantile_edges(cleaned, ['budget', 'vote_count'])
+    assert edges['budget'] == cleaned['budget'].quantile(QUARTILES).tolist()
+    assert edges['vote_count'] == cleaned['vote_count'].quantile(QUARTILES).tolist()
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_kll_rank_error_and_memory(seed):
+    values = np.random.default_rng(seed).lognormal(size=200000)
+    sketch = KLLSketch(k=200, seed=seed)
+    for chunk in np.array_split(values, 37):
+        sketch.update(chunk)
+    assert sketch.n == len(values)
+    assert _rank_error(values, sketch.quantile(Q), Q) < 0.02
+    np.testing.assert_array_equal(sketch.quantile([0, 1]), [values.min(), values.max()])
+    # the memory depends on k, not on the number of values:
+    assert sum(len(level) for level in sketch.levels) < 3 * 200
+
+
+def test_kll_merge_of_parts():
+    values = np.random.default_rng(7).normal(size=100000)
+    parts = [KLLSketch(k=200, seed=i).update(part) for i, part in enumerate(np.array_split(values, 4))]
+    merged = parts[0]
+    for part in parts[1:]:
+        merged.merge(part)
+    assert merged.n == len(values)
+    assert _rank_error(values, merged.quantile(Q), Q) < 0.02
+    assert np.isnan(KLLSketch().quantile(0.5)).all()
+
+
+def test_sketch_edges_of_chunks(cleaned):
+    chunks = [cleaned.iloc[start:start + 100] for start in range(0, len(cleaned), 100)]
+    edges = sketch_edges(chunks, ['vote_count'], k=50, seed=0)['vote_count']
+    exact = quantile_edges(cleaned, ['vote_count'])['vote_count']
+    assert edges[0] == exact[0] and edges[-1] == exact[-1]
+    assert _rank_error(cleaned['vote_count'].to_numpy(), np.array(edges[1:-1]), np.array(QUARTILES[1:-1])) < 0.1
@@ -0,0 +1,60 @@
+# coding: utf-8
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from tmdb.bitmaps import BitmapIndex, pack, popcount, unpack
+from tmdb.bridges import build_bridges
+
+
+@pytest.fixture(scope='module')
+def index(cleaned):
+    return BitmapIndex.build(cleaned, build_bridges(cleaned))
+
+
+@pytest.mark.parametrize('n', [0, 1, 63, 64, 65, 1000])
+def test_pack_round_trip(n):
+    mask = np.random.default_rng(n).random((3, n)) < 0.3
+    words = pack(mask)
+    assert words.shape == (3, -(-n // 64))
+    np.testing.assert_array_equal(unpack(words, n), mask)
+    assert popcount(words) == mask.sum()
+    np.testing.assert_array_equal(popcount(words, axis=-1), mask.sum(axis=-1))
+
+
+def test_crosstab_matches_pandas(cleaned, index):
+    expected = pd.crosstab(cleaned['vote_counts_class'], cleaned['rating_class'], dropna=False)
+    result = index.crosstab('vote_counts_class', 'rating_class')
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False, check_names=False)
+
+    premium = cleaned[cleaned['budget_class'] == 'premium']
+    expected = pd.crosstab(premium['vote_counts_class'], premium['rating_class'], dropna=False)
+    result = index.crosstab('vote_counts_class', 'rating_class', budget_class='premium')
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False, check_names=False)
+
+
+@pytest.mark.parametrize('where', [
+    'vote_counts_class == "many" and budget_class == "premium"',
+    'rating_class >= "medium" or runtime_class in ["short film", "over-length film"]',
+    'budget_class != "premium"',
+    'rating_class not in ["very low", "high"]',
+])
+def test_filters_match_query(cleaned, index, where):
+    expected = cleaned.eval(where).to_numpy(dtype=bool)
+    np.testing.assert_array_equal(index.mask(where), expected)
+    assert index.count(where) == expected.sum()
+
+
+def test_genres(cleaned, index):
+    drama = cleaned['genres'].astype(object).str.split('|').map(lambda genres: 'Drama' in genres)
+    np.testing.assert_array_equal(index.mask('genre == "Drama"'), drama.to_numpy(dtype=bool))
+    np.testing.assert_array_equal(index.mask('genre != "Drama"'), ~drama.to_numpy(dtype=bool))
+    assert index.count(genre='no such genre') == 0
+    counts = index.counts('budget_class', genre='Drama')
+    expected = cleaned.loc[drama.to_numpy(dtype=bool), 'budget_class'].value_counts(sort=False)
+    pd.testing.assert_series_equal(counts, expected, check_dtype=False, check_names=False, check_index_type=False)
+    with pytest.raises(ValueError, match='no order'):
+        index.mask('genre > "Drama"')
+    with pytest.raises(ValueError, match='no bitmap index'):
+        index.counts('director')
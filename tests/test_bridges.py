@@ -0,0 +1,39 @@
+# coding: utf-8
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from tmdb.bridges import LIST_COLUMNS, Bridge, build_bridges
+
+MEASURES = ['budget', 'revenue', 'runtime']
+
+
+def _exploded(df, column):
+    return df[MEASURES].assign(name=df[column].astype(object).str.split('|')).explode('name')
+
+
+@pytest.mark.parametrize('entity', ['genre', 'actor', 'company'])
+def test_group_sum_matches_groupby(cleaned, entity):
+    bridge = build_bridges(cleaned, {entity: LIST_COLUMNS[entity]})[entity]
+    counts, sums = bridge.group_sum(cleaned, MEASURES)
+    grouped = _exploded(cleaned, LIST_COLUMNS[entity]).groupby('name')
+    pd.testing.assert_frame_equal(sums.sort_index(), grouped.sum().astype(np.float64), check_names=False,
+                                  check_index_type=False)
+    pd.testing.assert_series_equal(counts.sort_index(), grouped.size().astype(np.float64), check_names=False,
+                                   check_index_type=False)
+    pd.testing.assert_frame_equal(bridge.group_mean(cleaned, MEASURES).sort_index(), grouped.mean(),
+                                  check_names=False, check_index_type=False)
+
+
+def test_incidence_and_postings():
+    column = pd.Series(['a|b', 'b', None, 'c|a|a'])
+    bridge = Bridge.from_column(column, movie_ids=np.array([10, 11, 12, 13]))
+    assert list(bridge.names) == ['a', 'b', 'c']
+    incidence = bridge.incidence().toarray()
+    np.testing.assert_array_equal(incidence, [[1, 0, 0, 2], [1, 1, 0, 0], [0, 0, 0, 1]])
+    np.testing.assert_array_equal(bridge.rows_of('a'), [0, 3, 3])
+    assert len(bridge.rows_of('missing')) == 0
+    assert bridge.frame()['movie_id'].tolist() == [10, 10, 11, 13, 13, 13]
+    subset = bridge.subset(np.array([True, False, False, True]))
+    np.testing.assert_array_equal(subset.incidence().toarray().sum(axis=1), [3, 1, 1])
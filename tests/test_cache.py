@@ -0,0 +1,31 @@
+# coding: utf-8
+
+import os
+import shutil
+
+from tmdb.cache import cache_path, cleaning_parameters, load_cleaned, load_store
+
+
+def test_only_stale_files_of_the_same_csv_are_removed(path, tmp_path):
+    sources = [str(tmp_path / 'a' / 'movies.csv'), str(tmp_path / 'a' / 'movies.v2.csv'),
+               str(tmp_path / 'b' / 'movies.csv')]
+    for source in sources:
+        os.makedirs(os.path.dirname(source), exist_ok=True)
+        shutil.copy(path, source)
+    cache_dir = str(tmp_path / 'cache')
+    for source in sources:
+        load_cleaned(source, cache_dir)
+        load_store(source, cache_dir)
+    files = {source: [cache_path(source, cache_dir, cleaning_parameters(), extension)
+                      for extension in ('.feather', '.conflicts.feather', '.parquet')] for source in sources}
+    assert len(set(sum(files.values(), []))) == 9
+    assert all(os.path.exists(name) for names in files.values() for name in names)
+
+    # other cleaning parameters replace the files of the first csv-file only:
+    load_cleaned(sources[0], cache_dir, keep='most_votes')
+    parameters = cleaning_parameters('most_votes')
+    assert [os.path.exists(name) for name in files[sources[0]]] == [False, False, True]
+    assert all(os.path.exists(name) for source in sources[1:] for name in files[source])
+    assert os.path.exists(cache_path(sources[0], cache_dir, parameters))
+    assert os.path.exists(cache_path(sources[0], cache_dir, parameters, '.conflicts.feather'))
+    assert len(os.listdir(cache_dir)) == 9
@@ -0,0 +1,19 @@
+# coding: utf-8
+
+import numpy as np
+
+from tmdb.counting import count_tokens, encode_tokens
+
+
+def test_categorical_and_string_columns_give_the_same_links(raw):
+    column = raw['cast']
+    rows, codes, names = encode_tokens(column.astype('category'))
+    expected_rows, expected_codes, expected_names = encode_tokens(column.astype(object), batch_size=700)
+    np.testing.assert_array_equal(rows, expected_rows)
+    np.testing.assert_array_equal(np.asarray(names)[codes], np.asarray(expected_names)[expected_codes])
+
+
+def test_count_tokens_matches_value_counts(raw):
+    expected = raw['genres'].dropna().str.split('|').explode().value_counts()
+    counts = count_tokens(raw['genres'].astype('category'))
+    assert counts.sort_index().to_dict() == expected.sort_index().to_dict()
@@ -0,0 +1,58 @@
+# coding: utf-8
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from tmdb.cube import Cube, build_cube
+from tmdb.query import write_store
+
+
+@pytest.fixture(scope='module')
+def cube(cleaned):
+    return Cube.build(cleaned)
+
+
+def _assert_cubes_equal(result, expected):
+    assert result.dimensions == expected.dimensions
+    for stat, table in expected.tables.items():
+        if isinstance(table, pd.Series):
+            pd.testing.assert_series_equal(result.tables[stat], table, check_index_type=False)
+        else:
+            pd.testing.assert_frame_equal(result.tables[stat], table, check_index_type=False)
+
+
+def test_merge_of_shards_equals_the_whole(cleaned, cube):
+    shards = [Cube.build(cleaned.iloc[start:start + 400]) for start in range(0, len(cleaned), 400)]
+    _assert_cubes_equal(shards[0].merge(*shards[1:]), cube)
+    _assert_cubes_equal(build_cube(cleaned, processes=1, shards=3), cube)
+
+
+def test_build_from_a_store(cleaned, cube, tmp_path):
+    path = str(tmp_path / 'movies.parquet')
+    write_store(cleaned, path, row_group_size=256)
+    _assert_cubes_equal(build_cube(path=path, processes=1, shards=2), cube)
+
+
+def test_rollup_matches_groupby(cleaned, cube):
+    by_year = cube.rollup('release_year')
+    grouped = cleaned.groupby('release_year')
+    pd.testing.assert_series_equal(by_year.get('revenue', 'mean'), grouped['revenue'].mean(), check_names=False)
+    pd.testing.assert_series_equal(by_year.get('runtime', 'max'), grouped['runtime'].max().astype(np.float64),
+                                   check_names=False)
+    np.testing.assert_allclose(by_year.get('budget', 'std').to_numpy(), grouped['budget'].std().to_numpy())
+
+    counts = cube.rollup('budget_class', 'rating_class').counts()
+    expected = cleaned.groupby(['budget_class', 'rating_class'], observed=True).size()
+    pd.testing.assert_series_equal(counts, expected, check_names=False, check_index_type=False)
+
+
+def test_genres_count_every_movie_once_per_genre(cleaned, cube):
+    genres = cleaned[['revenue']].assign(genre=cleaned['genres'].astype(object).str.split('|')).explode('genre')
+    by_genre = cube.rollup('genre')
+    pd.testing.assert_series_equal(by_genre.get('revenue', 'sum'), genres.groupby('genre')['revenue'].sum(),
+                                   check_names=False)
+    # rolling the genres up counts every movie once:
+    assert cube.rollup('budget_class').counts().sum() == len(cleaned)
+    with pytest.raises(ValueError):
+        cube.slice(genre=['Drama', 'Comedy']).rollup('budget_class')
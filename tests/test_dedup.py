@@ -0,0 +1,50 @@
+# coding: utf-8
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from tmdb.dedup import ChunkedDeduplicator, deduplicate, resolve
+
+
+def test_resolve_keeps_one_version_per_id():
+    ids = np.array([1, 2, 1, 3, 2, 1])
+    hashes = np.array([10, 20, 11, 30, 20, 10], dtype=np.uint64)
+    votes = np.array([5, 1, 9, 1, 1, 2])
+
+    positions, report = resolve(ids, hashes, votes, 'latest')
+    # id 2 is an exact duplicate, id 1 has two versions and the latest one is 10 (row 5):
+    np.testing.assert_array_equal(positions, [0, 1, 3])
+    assert report.to_dict('records') == [{'id': 1, 'rows': 3, 'versions': 2, 'kept_row': 0}]
+
+    positions, report = resolve(ids, hashes, votes, 'most_votes')
+    np.testing.assert_array_equal(positions, [1, 2, 3])
+    assert report['kept_row'].tolist() == [2]
+
+    with pytest.raises(ValueError):
+        resolve(ids, hashes, votes, 'first')
+
+
+def test_deduplicate_matches_drop_duplicates_without_conflicts(raw):
+    deduplicated, report = deduplicate(raw)
+    pd.testing.assert_frame_equal(deduplicated, raw.drop_duplicates())
+    assert len(report) == 0
+
+
+def test_chunked_deduplicator_matches_deduplicate(raw):
+    changed = raw.sample(15, random_state=3).assign(vote_count=lambda df: df['vote_count'] + 100)
+    df = pd.concat([raw, changed, raw.iloc[:10]], ignore_index=True)
+    expected, expected_report = deduplicate(df, 'most_votes')
+
+    chunks = [df.iloc[start:start + 700] for start in range(0, len(df), 700)]
+    deduplicator = ChunkedDeduplicator('most_votes')
+    for chunk in chunks:
+        deduplicator.add(chunk)
+    kept = pd.concat([deduplicator.filter(chunk) for chunk in chunks])
+
+    pd.testing.assert_frame_equal(kept, expected)
+    report = deduplicator.report()
+    pd.testing.assert_frame_equal(report.sort_values('id', ignore_index=True),
+                                  expected_report.sort_values('id', ignore_index=True))
+    assert len(report) == 15
+    assert all(columns == ['vote_count'] for columns in report['differing_columns'])
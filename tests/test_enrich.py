@@ -0,0 +1,66 @@
+# coding: utf-8
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from tmdb import pipeline
+from tmdb.enrich import JoinFiller, enrich
+
+MOVIES = pd.DataFrame({'id': [1, 2, 3, 4], 'imdb_id': ['tt1', 'tt2', None, 'tt4'],
+                       'budget': [0, 10, 0, 0], 'revenue': [5, 0, 0, 7], 'runtime': [90, 0, 100, 80],
+                       'director': pd.Categorical(['A', None, 'B', None])})
+
+# id 1 twice (the last row wins), id 3 has a zero budget, id 5 is not in the movies:
+REFERENCE = pd.DataFrame({'id': [1, 3, 1, 5, 2], 'imdb_id': ['tt1', 'tt3', 'tt1', 'tt5', 'tt2'],
+                          'budget': [11, 0, 12, 13, 14], 'revenue': [1, 2, 3, 4, 50], 'runtime': [1, 2, 3, 4, 60],
+                          'director': ['X', 'Y', 'Z', 'W', 'V'], 'overview': ['a', 'b', 'c', 'd', 'e']})
+
+
+@pytest.fixture(params=['.csv', '.parquet'])
+def reference(request, tmp_path):
+    path = str(tmp_path / ('reference' + request.param))
+    if request.param == '.csv':
+        REFERENCE.to_csv(path, index=False)
+    else:
+        REFERENCE.to_parquet(path)
+    return path
+
+
+def test_enrich_by_id(reference):
+    df, stats = enrich(MOVIES, reference, key='id', batch_size=2)
+    assert df['budget'].tolist() == [12, 10, 0, 0]
+    assert df['revenue'].tolist() == [5, 50, 2, 7]
+    assert df['runtime'].tolist() == [90, 60, 100, 80]
+    assert df['director'].tolist() == ['A', 'V', 'B', np.nan]
+    assert isinstance(df['director'].dtype, pd.CategoricalDtype)
+    assert 'overview' not in df
+    assert stats == {'incomplete': 4, 'matched': 3, 'recovered': 2,
+                     'filled': {'budget': 1, 'revenue': 2, 'runtime': 1, 'director': 1}}
+    # the input is not modified:
+    assert MOVIES['budget'].tolist() == [0, 10, 0, 0]
+
+
+def test_enrich_by_imdb_id(reference):
+    df, stats = enrich(MOVIES, reference, key='imdb_id')
+    # the movie without imdb_id is not joined:
+    assert stats['incomplete'] == 3 and stats['matched'] == 2
+    assert df['budget'].tolist() == [12, 10, 0, 0]
+    with pytest.raises(ValueError):
+        enrich(MOVIES, reference, key='title')
+
+
+def test_join_filler_recovers_movies(raw, path, tmp_path):
+    # the reference knows the numbers of the movies with zeros:
+    reference = raw.assign(budget=raw['budget'].where(raw['budget'] > 0, 1000000),
+                           revenue=raw['revenue'].where(raw['revenue'] > 0, 2000000),
+                           runtime=raw['runtime'].where(raw['runtime'] > 0, 95))
+    reference_path = str(tmp_path / 'reference.csv')
+    reference[['imdb_id', 'budget', 'revenue', 'runtime']].to_csv(reference_path, index=False)
+
+    filler = JoinFiller(reference_path, key='imdb_id')
+    filled = pipeline.clean(pipeline.load(path, usecols=pipeline.fill_columns(filler)), fill=filler)
+    plain = pipeline.clean(pipeline.load(path))
+    assert filler.stats['recovered'] > 0
+    assert len(filled) == len(plain) + filler.stats['recovered']
+    assert list(filled.columns) == list(plain.columns)
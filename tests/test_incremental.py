@@ -0,0 +1,73 @@
+# coding: utf-8
+
+import pandas as pd
+
+from tmdb import pipeline
+from tmdb.incremental import MEASURES, IncrementalStore, contributions
+
+
+def _raw_row(raw, **values):
+    row = raw[(raw.budget > 0) & (raw.revenue > 0) & (raw.runtime > 0)].iloc[[0]].copy()
+    return row.assign(**values)
+
+
+def test_upsert_beyond_outer_edges(raw, cleaned):
+    store = IncrementalStore(cleaned)
+    row = _raw_row(raw, runtime=cleaned['runtime'].max() + 1,
+                   budget=int(cleaned['budget'].max() * pipeline.MILLION) + 1000000,
+                   vote_count=cleaned['vote_count'].max() + 3)
+    result = store.apply_changes(row)
+
+    movie = store.df.loc[row['id'].iloc[0]]
+    assert result['upserted'] == 1
+    assert movie['runtime_class'] == pipeline.BIN_LABELS_RUNTIME[-1]
+    assert movie['budget_class'] == 'premium'
+    assert movie['vote_counts_class'] == 'many'
+    assert not store.df[['rating_class', 'vote_counts_class', 'runtime_class', 'budget_class']].isna().any().any()
+
+
+def test_aggregates_match_recomputation(raw, cleaned):
+    store = IncrementalStore(cleaned)
+    changed = pd.concat([_raw_row(raw, revenue=123456789), _raw_row(raw.iloc[100:], budget=0)])
+    deleted = cleaned['id'].iloc[5:8].tolist()
+    result = store.apply_changes(changed, deleted_ids=deleted)
+    assert result['removed'] == 4
+
+    expected = contributions(store.df)
+    for key in expected:
+        pd.testing.assert_frame_equal(store.aggregate(key, 'sum').sort_index(),
+                                      expected[key][MEASURES].sort_index(), check_dtype=False, check_names=False)
+        pd.testing.assert_series_equal(store.aggregate(key, 'count').sort_index(), expected[key]['count'].sort_index(),
+                                       check_dtype=False, check_names=False)
+    recomputed = pipeline.classify(pipeline.clean(pd.concat([raw, changed])))
+    recomputed = recomputed[~recomputed['id'].isin(deleted)]
+    assert store.aggregate('release_year', 'count').sum() == len(recomputed)
+    pd.testing.assert_series_equal(store.aggregate('release_year')['revenue'].sort_index(),
+                                   recomputed.groupby('release_year')['revenue'].mean(), check_names=False,
+                                   check_index_type=False)
+
+
+def test_conflicting_changes_are_reported(raw, cleaned):
+    store = IncrementalStore(cleaned)
+    row = _raw_row(raw)
+    conflicts = []
+    result = store.apply_changes(pd.concat([row.assign(vote_count=1), row.assign(vote_count=2)]),
+                                 conflicts=conflicts)
+    assert result['conflicts'] == 1
+    assert conflicts[0]['differing_columns'].tolist() == [['vote_count']]
+    assert store.df.loc[row['id'].iloc[0], 'vote_count'] == 2
+
+
+def test_edges_are_checked_only_if_needed(raw, cleaned, monkeypatch):
+    store = IncrementalStore(cleaned)
+    checks = []
+    current_edges = store.current_edges
+    monkeypatch.setattr(store, 'current_edges', lambda: checks.append(store.changed) or current_edges())
+    valid = raw[(raw.budget > 0) & (raw.revenue > 0) & (raw.runtime > 0)]
+    # changes inside the edges are only checked once they exceed the tolerance of all movies:
+    store.apply_changes(valid.iloc[[1]].assign(revenue=123456789))
+    assert checks == []
+    store.apply_changes(valid.iloc[2:2 + int(store.tolerance * len(store.df))])
+    assert len(checks) == 1 and store.changed == 0
+    store.apply_changes(_raw_row(raw, runtime=cleaned['runtime'].max() + 1))
+    assert len(checks) == 2
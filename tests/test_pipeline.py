@@ -0,0 +1,40 @@
+# coding: utf-8
+
+import io
+
+import pandas as pd
+import pytest
+
+from tmdb import pipeline
+from tmdb.dedup import deduplicate
+
+
+def test_conflict_report_of_the_cleaning(raw, tmp_path):
+    changed = raw.sample(20, random_state=2).assign(vote_count=lambda df: df['vote_count'] + 1)
+    path = str(tmp_path / 'conflicts.csv')
+    pd.concat([raw, changed]).to_csv(path, index=False)
+    expected = io.StringIO()
+    deduplicate(pipeline.load(path).drop(columns=pipeline.NOT_RELEVANT, errors='ignore'), 'latest')[1].to_csv(
+        expected, index=False)
+
+    for run in range(2):
+        # the second run takes the dataset and the report from the cache:
+        report = tmp_path / 'report{}.csv'.format(run)
+        assert pipeline.main([path, '--cache', str(tmp_path / 'cache'), '--conflicts', str(report)]) == 0
+        assert report.read_text() == expected.getvalue()
+
+
+def test_api_and_enrich_exclude_each_other(path, capsys):
+    with pytest.raises(SystemExit) as error:
+        pipeline.main([path, '--api', '--enrich', 'fill.csv'])
+    assert error.value.code == 2
+    assert 'not allowed with argument --api' in capsys.readouterr().err
+
+
+def test_chart_data_only_for_the_drawn_charts(cleaned):
+    results = pipeline.aggregate(cleaned, 'Actor 0')
+    assert not [key for key in results if key.startswith(('money_outliers', 'density_')) or key == 'money']
+    assert list(pipeline.chart_data(cleaned)) == ['money']
+    densities = pipeline.chart_data(cleaned, density=True)
+    assert 'money' not in densities and 'money_outliers' in densities
+    assert sum(key.startswith('density_') for key in densities) == 3
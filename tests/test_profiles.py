@@ -0,0 +1,45 @@
+# coding: utf-8
+
+import pandas as pd
+import pytest
+
+from tmdb import profiles
+from tmdb.bridges import build_bridges
+from tmdb.pipeline import BIN_LABELS_BUDGET
+
+
+def _movies_of(df, column, name):
+    return df[df[column].astype(object).str.split('|').map(lambda names: name in names)]
+
+
+@pytest.mark.parametrize('role, column', [('cast', 'cast'), ('director', 'director')])
+def test_profile_matches_a_scan(cleaned, monkeypatch, role, column):
+    built = []
+    monkeypatch.setattr(profiles, 'build_bridges', lambda df, columns: built.append(list(columns)) or
+                        build_bridges(df, columns))
+    name = cleaned[column].astype(object).str.split('|').explode().value_counts().index[0]
+    # the bridges of pipeline.aggregate() have no director:
+    profile = profiles.person_profile(cleaned, name, role, build_bridges(cleaned, {'actor': 'cast'}))
+    assert built == ([] if role == 'cast' else [['director']])
+
+    movies = _movies_of(cleaned, column, name)
+    assert profile['filmography']['id'].tolist() == movies['id'].tolist()
+    pd.testing.assert_series_equal(profile['budget_classes'],
+                                   movies['budget_class'].value_counts().reindex(BIN_LABELS_BUDGET, fill_value=0),
+                                   check_names=False, check_index_type=False)
+    assert profile['votes']['mean'] == pytest.approx(movies['vote_average'].mean())
+
+
+def test_profile_of_a_name_without_movies(cleaned, monkeypatch):
+    built = []
+    monkeypatch.setattr(profiles, 'build_bridges', lambda df, columns: built.append(list(columns)) or
+                        build_bridges(df, columns))
+    profile = profiles.person_profile(cleaned, 'Nobody Known', 'director')
+    assert built == [['director']]
+    assert len(profile['filmography']) == 0
+    assert profile['budget_classes'].tolist() == [0] * len(BIN_LABELS_BUDGET)
+    assert profile['budget_percentages'].tolist() == [0] * len(BIN_LABELS_BUDGET)
+    assert profile['votes']['count'] == 0
+    assert profile['votes_by_budget'].isna().all()
+    with pytest.raises(ValueError):
+        profiles.person_profile(cleaned, 'Nobody Known', 'producer')
@@ -0,0 +1,36 @@
+# coding: utf-8
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pytest
+
+from tmdb import profiling
+from tmdb.profiling import Profiler, init_worker, stage
+
+
+def _records_in_worker():
+    with stage('worker') as record:
+        return record
+
+
+def test_pool_workers_do_not_record_into_the_parent_profiler():
+    with Profiler() as profiler:
+        with ProcessPoolExecutor(max_workers=1, initializer=init_worker) as pool:
+            assert pool.submit(_records_in_worker).result() == {}
+    assert profiler.records == []
+    assert profiling._active == []
+
+
+def test_peak_rss_of_a_stage():
+    with Profiler() as profiler:
+        with stage('outer'):
+            with stage('large'):
+                large = np.ones(2 ** 25)
+                del large
+        with stage('small'):
+            pass
+    peaks = {record['stage']: record['peak_rss_bytes'] for record in profiler.records}
+    if peaks['small'] is None:
+        pytest.skip('the peak RSS can only be reset on Linux')
+    assert peaks['outer'] >= peaks['large'] > peaks['small'] + 2 ** 27
@@ -0,0 +1,66 @@
+# coding: utf-8
+
+import pandas as pd
+import pytest
+
+from tmdb.query import Store, main, parse, write_store
+
+EXPRESSIONS = [
+    'vote_counts_class == "many" & budget_class == "premium"',
+    'budget_class >= "higher" and release_year < 1990',
+    'release_year in [1999, 2000] | runtime > 200',
+    '~(rating_class == "high") & vote_count >= 5000',
+    '2000 <= release_year <= 2005 and budget_class != "low"',
+    'budget_class not in ["low", "middle"] & revenue > 100',
+]
+
+
+@pytest.fixture(scope='module')
+def store(cleaned, tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('store') / 'movies.parquet')
+    write_store(cleaned, path, row_group_size=128)
+    return Store(path)
+
+
+@pytest.mark.parametrize('expression', EXPRESSIONS)
+def test_select_matches_query(cleaned, store, expression):
+    columns = ['id', 'title', 'release_year', 'budget_class']
+    expected = cleaned.query(expression)[columns].sort_values('id', ignore_index=True)
+    result = store.select(expression, columns).sort_values('id', ignore_index=True)
+    pd.testing.assert_frame_equal(result, expected, check_categorical=False, check_index_type=False)
+    assert store.count(expression) == len(expected)
+
+
+@pytest.mark.parametrize('expression', EXPRESSIONS[:2])
+def test_pruned_row_groups_have_no_matches(store, expression):
+    plan = store.plan(expression)
+    assert 0 < len(plan['row_groups']) < len(store.statistics)
+    pruned = [i for i in range(len(store.statistics)) if i not in plan['row_groups']]
+    skipped = store.file.read_row_groups(pruned).to_pandas()
+    assert len(skipped.query(expression)) == 0
+
+
+def test_invalid_expressions(store):
+    with pytest.raises(ValueError):
+        parse('budget > revenue')
+    with pytest.raises(ValueError):
+        store.select('budget_class == "huge"')
+    with pytest.raises(ValueError):
+        store.select('no_column == 1')
+    with pytest.raises(ValueError, match='only numbers can be negated'):
+        parse('title == -"text"')
+
+
+@pytest.mark.parametrize('expression, message', [('no_column == 1', 'unknown column no_column'),
+                                                 ('budget + revenue', 'unsupported expression'),
+                                                 ('runtime > -"long"', 'only numbers can be negated')])
+def test_main_reports_invalid_expressions(store, capsys, expression, message):
+    with pytest.raises(SystemExit) as error:
+        main([store.path, expression, '--count'])
+    assert error.value.code == 2
+    assert message in capsys.readouterr().err
+
+
+def test_main_counts(store, cleaned, capsys):
+    assert main([store.path, 'release_year >= 2000', '--count']) == 0
+    assert capsys.readouterr().out.splitlines()[-1] == str((cleaned['release_year'] >= 2000).sum())
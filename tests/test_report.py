@@ -0,0 +1,46 @@
+# coding: utf-8
+
+import os
+
+import pytest
+
+from tmdb import pipeline
+
+pytest.importorskip('matplotlib')
+pytest.importorskip('seaborn')
+
+from tmdb.report import ACTOR_CHARTS, CHARTS, fingerprint, render_report  # noqa: E402
+
+
+@pytest.fixture(scope='module')
+def results(cleaned):
+    results = pipeline.aggregate(cleaned, 'Actor 0')
+    results.update(pipeline.chart_data(cleaned))
+    return results
+
+
+def _names(paths):
+    return sorted(os.path.splitext(os.path.basename(path))[0] for path in paths)
+
+
+def test_unchanged_charts_are_skipped(results, tmp_path):
+    output_dir = str(tmp_path)
+    assert _names(render_report(results, output_dir, actor='Actor 0', processes=1)) == sorted(CHARTS)
+    assert render_report(results, output_dir, actor='Actor 0', processes=1) == []
+
+    # only the charts of changed data, of another actor or with a missing file are drawn again:
+    changed = dict(results, years_mean=results['years_mean'] * 2)
+    assert _names(render_report(changed, output_dir, actor='Actor 0', processes=1)) == [
+        'years_budget_revenue_winnings']
+    assert _names(render_report(changed, output_dir, actor='Actor 1', processes=1)) == sorted(ACTOR_CHARTS)
+    os.remove(os.path.join(output_dir, 'genres_count.png'))
+    assert _names(render_report(changed, output_dir, actor='Actor 1', processes=1)) == ['genres_count']
+
+
+def test_fingerprint(results):
+    data = {'years_mean': results['years_mean']}
+    digest = fingerprint('years_budget_revenue_winnings', data, 'Actor 0', ['png'])
+    assert fingerprint('years_budget_revenue_winnings', data, 'Actor 1', ['png']) == digest
+    assert fingerprint('years_budget_revenue_winnings', data, 'Actor 0', ['svg']) != digest
+    assert fingerprint('years_budget_revenue_winnings', {'years_mean': data['years_mean'].round(-3)}, 'Actor 0',
+                       ['png']) != digest
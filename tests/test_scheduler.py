@@ -0,0 +1,20 @@
+# coding: utf-8
+
+import pandas as pd
+
+from tmdb import pipeline
+from tmdb.scheduler import run_parallel
+
+
+def test_parallel_results_match_serial(cleaned):
+    actor = cleaned['cast'].astype(object).str.split('|').explode().mode()[0]
+    serial = pipeline.aggregate(cleaned, actor=actor)
+    parallel = run_parallel(cleaned, actor=actor, processes=2)
+    assert list(parallel) == list(serial)
+    for name in ['genres_count', 'genres_mean', 'top10_actors', 'actor_movies', 'ratings_by_votes',
+                 'top20_companies_many_premium']:
+        expected, result = serial[name], parallel[name]
+        if isinstance(expected, pd.Series):
+            pd.testing.assert_series_equal(result, expected)
+        else:
+            pd.testing.assert_frame_equal(result, expected)
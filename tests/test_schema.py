@@ -0,0 +1,27 @@
+# coding: utf-8
+
+import pandas as pd
+import pytest
+
+from tmdb import pipeline
+from tmdb.cache import read_cache, write_cache
+from tmdb.schema import LABEL_DTYPES, MemoryBudgetError, check_memory_budget, compact, memory_usage
+
+
+def test_cache_is_read_with_the_compact_schema(cleaned, tmp_path):
+    path = str(tmp_path / 'cleaned.feather')
+    write_cache(cleaned.astype({'cast': object, 'runtime': 'int64', 'rating_class': object}), path)
+    df = read_cache(path)
+    assert isinstance(df['cast'].dtype, pd.CategoricalDtype)
+    assert df['runtime'].dtype == 'int16'
+    assert df['rating_class'].dtype == LABEL_DTYPES['rating_class']
+    pd.testing.assert_frame_equal(df, compact(cleaned), check_categorical=False)
+
+
+def test_memory_budget(cleaned, path, capsys):
+    total = check_memory_budget(cleaned, 2 ** 30)
+    assert total == memory_usage(cleaned).sum()
+    with pytest.raises(MemoryBudgetError):
+        check_memory_budget(cleaned, total - 1)
+    assert pipeline.main([path, '--memory-budget', '0.01']) == 1
+    assert 'more than the memory budget' in capsys.readouterr().err
@@ -0,0 +1,68 @@
+# coding: utf-8
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from tmdb.stats import bootstrap, correlation, ols
+
+COLUMNS = ['budget', 'revenue', 'runtime', 'vote_average']
+
+
+def _lstsq(df, y, x):
+    """Coefficients, standard errors and r2 of a least squares fit with numpy."""
+    design = np.column_stack([np.ones(len(df))] + [df[column].to_numpy(dtype=np.float64) for column in x])
+    target = df[y].to_numpy(dtype=np.float64)
+    coef = np.linalg.lstsq(design, target, rcond=None)[0]
+    residuals = target - design @ coef
+    sigma2 = residuals @ residuals / (len(df) - design.shape[1])
+    se = np.sqrt(sigma2 * np.diag(np.linalg.inv(design.T @ design)))
+    r2 = 1 - residuals @ residuals / ((target - target.mean()) @ (target - target.mean()))
+    return coef, se, r2
+
+
+@pytest.mark.parametrize('method', ['pearson', 'spearman'])
+def test_correlation_matches_pandas(cleaned, method):
+    pd.testing.assert_frame_equal(correlation(cleaned, COLUMNS, method), cleaned[COLUMNS].corr(method))
+    by_class = correlation(cleaned, COLUMNS, method, by='budget_class')
+    for name, group in cleaned.groupby('budget_class', observed=True):
+        pd.testing.assert_frame_equal(by_class.loc[name], group[COLUMNS].corr(method), check_names=False)
+
+
+def test_correlation_by_genre(cleaned):
+    result = correlation(cleaned, ['budget', 'revenue'], by='genre')
+    exploded = cleaned.assign(genre=cleaned['genres'].astype(object).str.split('|')).explode('genre')
+    for name, group in exploded.groupby('genre'):
+        expected = group['budget'].corr(group['revenue'])
+        assert result.loc[(name, 'budget'), 'revenue'] == pytest.approx(expected, nan_ok=True)
+
+
+def test_ols_matches_lstsq(cleaned):
+    result = ols(cleaned, 'revenue', ['budget', 'runtime'])
+    coef, se, r2 = _lstsq(cleaned, 'revenue', ['budget', 'runtime'])
+    np.testing.assert_allclose(result['coef'], coef, rtol=1e-6)
+    np.testing.assert_allclose(result['se'], se, rtol=1e-6)
+    np.testing.assert_allclose(result['r2'], r2)
+    assert (result['lower'] < result['coef']).all() and (result['coef'] < result['upper']).all()
+
+    by_year = ols(cleaned, 'revenue', 'budget', by='release_year')
+    for year, group in cleaned.groupby('release_year'):
+        if len(group) > 2:
+            np.testing.assert_allclose(by_year.loc[year, 'coef'], _lstsq(group, 'revenue', ['budget'])[0],
+                                       rtol=1e-6, atol=1e-9)
+        else:
+            assert by_year.loc[year, 'n'].iloc[0] == len(group)
+
+
+def test_bootstrap_is_reproducible_on_a_pool(cleaned):
+    serial = bootstrap(cleaned, 'revenue', 'budget', by='budget_class', resamples=40, processes=1, batch=15)
+    pooled = bootstrap(cleaned, 'revenue', 'budget', by='budget_class', resamples=40, processes=2, batch=15)
+    pd.testing.assert_frame_equal(serial, pooled)
+    pd.testing.assert_series_equal(serial['coef'], ols(cleaned, 'revenue', 'budget', by='budget_class')['coef'])
+    assert (serial['boot_lower'] <= serial['boot_upper']).all()
+    assert (serial['boot_se'] > 0).all()
+
+
+def test_correlation_rejects_unknown_methods(cleaned):
+    with pytest.raises(ValueError, match='unknown method'):
+        correlation(cleaned, COLUMNS, 'kendall')
@@ -0,0 +1,39 @@
+# coding: utf-8
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from tmdb import pipeline
+from tmdb.binning import quantile_edges
+from tmdb.streaming import stream_pipeline
+
+
+@pytest.mark.parametrize('keep', [None, 'latest'])
+def test_stream_matches_the_pipeline(path, tmp_path, keep):
+    output = str(tmp_path / 'movies.parquet')
+    stats = stream_pipeline(path, output, chunksize=400, keep=keep)
+    raw = pipeline.load(path)
+    conflicts = []
+    if keep is None:
+        # without keep the first row of an id stays:
+        cleaned = pipeline.clean(raw.drop_duplicates('id'), None)
+    else:
+        cleaned = pipeline.clean(raw, keep, conflicts=conflicts)
+        assert stats['conflicts']['id'].tolist() == conflicts[0]['id'].tolist()
+    # the classes use the approximate edges of the sketches:
+    expected = pipeline.classify(cleaned.copy(), edges=stats['edges'])
+
+    result = pd.read_parquet(output)
+    assert stats['rows_in'] == len(raw)
+    assert stats['rows_out'] == len(result) == len(expected)
+    pd.testing.assert_frame_equal(result.sort_values('id', ignore_index=True),
+                                  expected.sort_values('id', ignore_index=True),
+                                  check_dtype=False, check_categorical=False)
+
+    exact = quantile_edges(cleaned, list(pipeline.QUANTILE_CLASSES))
+    for column, edges in exact.items():
+        values = np.sort(cleaned[column].to_numpy())
+        assert stats['edges'][column][0] == edges[0] and stats['edges'][column][-1] == edges[-1]
+        ranks = np.searchsorted(values, stats['edges'][column][1:-1], side='right') / len(values)
+        assert np.abs(ranks - [0.25, 0.5, 0.75]).max() < 0.05
@@ -0,0 +1,32 @@
+# coding: utf-8
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from tmdb.topk import leaderboards, top_k
+
+
+def _exploded_means(df, column, measure):
+    names = df[column].astype(object).str.split('|')
+    return df[[measure]].assign(name=names).explode('name').groupby('name')[measure].mean()
+
+
+@pytest.mark.parametrize('by, column', [('genre', 'genres'), ('actor', 'cast'), ('company', 'production_companies')])
+def test_top_k_by_entity(cleaned, by, column):
+    result = top_k(cleaned, 'revenue', k=5, by=by)
+    expected = _exploded_means(cleaned, column, 'revenue').sort_values(ascending=False, kind='stable')
+    assert list(result.index) == list(expected.index[:5])
+    np.testing.assert_allclose(result.to_numpy(), expected.to_numpy()[:5])
+
+
+def test_leaderboards_by_entity_and_column(cleaned):
+    results = leaderboards(cleaned, {'top_actors': {'measure': 'budget', 'by': 'actor', 'stat': 'sum', 'k': 3},
+                                     'bottom_years': {'measure': 'runtime', 'by': 'release_year', 'largest': False},
+                                     'top_movies': {'measure': 'winnings', 'k': 4}})
+    actors = cleaned[['budget']].assign(name=cleaned['cast'].astype(object).str.split('|')).explode('name')
+    expected = actors.groupby('name')['budget'].sum().sort_values(ascending=False, kind='stable')
+    np.testing.assert_allclose(results['top_actors'].to_numpy(), expected.to_numpy()[:3])
+    years = cleaned.groupby('release_year')['runtime'].mean().sort_values(kind='stable')
+    pd.testing.assert_series_equal(results['bottom_years'], years.iloc[:10], check_names=False)
+    assert list(results['top_movies']['winnings']) == sorted(cleaned['winnings'], reverse=True)[:4]
@@ -0,0 +1,7 @@
+# coding: utf-8
+
+# Investigate The Movie Database (TMDB) data as an importable package.
+
+from tmdb.pipeline import load, clean, bin_edges, classify, aggregate, render, run
+
+__all__ = ['load', 'clean', 'bin_edges', 'classify', 'aggregate', 'render', 'run']
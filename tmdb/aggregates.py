@@ -0,0 +1,140 @@
+# coding: utf-8
+
+# Memoized aggregates over the cleaned dataset.
+#
+# Questions like "mean budget by release_year" and "mean revenue by
+# release_year" share the same grouping. The AggregateCache computes count,
+# sum, sum of squares, min and max of all numeric columns in one grouped pass
+# per (grouping key, filter) and derives every statistic from that table.
+# Both the grouped tables and the single results are kept in LRU caches.
+# Filters on the label classes and genres are answered by the bitmap index of
+# tmdb.bitmaps instead of evaluating them on the columns.
+
+import functools
+
+import numpy as np
+import pandas as pd
+
+STATISTICS = ['count', 'sum', 'mean', 'std', 'min', 'max']
+
+
+def statistic(table, measure, stat='mean'):
+    """Return one statistic of one measure from a table of count, sum, sum of squares, min and max."""
+    if stat not in STATISTICS:
+        raise ValueError('unknown statistic {!r}, use one of {}'.format(stat, STATISTICS))
+    count = table['count']
+    if stat == 'count':
+        result = count
+    elif stat == 'mean':
+        result = table['sum'][measure] / count
+    elif stat == 'std':
+        mean = table['sum'][measure] / count
+        variance = (table['sumsq'][measure] - count * mean ** 2) / (count - 1)
+        result = np.sqrt(variance.clip(lower=0))
+    else:
+        result = table[stat][measure]
+    return result.rename(measure)
+
+
+class AggregateCache:
+    """Answer (grouping key, measure, statistic, filter) questions from shared grouped passes.
+
+    by is either a column of df (like 'release_year' or 'budget_class') or an
+    entity of the bridge tables (like 'genre' or 'actor', see tmdb.bridges).
+    filter is None or a query string for DataFrame.query. bitmaps is the
+    BitmapIndex of the label classes and genres, built on first use. With a
+    tmdb.cube.Cube the groupings by its dimensions are roll-ups of the cube
+    and the measures are the ones of the cube.
+    """
+
+    def __init__(self, df, bridges=None, maxsize=128, cube=None):
+        self.df = df
+        self.bridges = bridges if bridges is not None else {}
+        self.cube = cube
+        if cube is not None:
+            self.measures = list(cube.measures)
+        else:
+            self.measures = [column for column in df.select_dtypes('number').columns if column != 'id']
+        self._table = functools.lru_cache(maxsize=maxsize)(self._grouped_table)
+        self.get = functools.lru_cache(maxsize=maxsize)(self._get)
+
+    @functools.cached_property
+    def bitmaps(self):
+        from tmdb.bitmaps import BitmapIndex
+        return BitmapIndex.build(self.df, self.bridges)
+
+    def _mask(self, filter):
+        if filter is None:
+            return None
+        from tmdb.bitmaps import CLASS_COLUMNS, ENTITIES
+        from tmdb.query import parse, predicate_columns
+        try:
+            predicate = parse(filter)
+        except ValueError:
+            predicate = None
+        if predicate is not None and set(predicate_columns(predicate)) <= set(CLASS_COLUMNS + ENTITIES):
+            return self.bitmaps.mask(predicate)
+        return self.df.eval(filter).to_numpy(dtype=bool)
+
+    def _grouped_table(self, by, filter):
+        """Return count, sum, sum of squares, min and max of all measures for one grouping."""
+        if self.cube is not None and filter is None and by in self.cube.dimensions:
+            table = self.cube.rollup(by).cells()
+            # the names of a bridge have no index name, see below:
+            return {stat: values.rename_axis(None) for stat, values in table.items()} if by in self.bridges else table
+        mask = self._mask(filter)
+        if by in self.bridges:
+            bridge = self.bridges[by] if mask is None else self.bridges[by].subset(mask)
+            counts, sums = bridge.group_sum(self.df, self.measures)
+            squares = bridge.incidence() @ np.square(self.df[self.measures].to_numpy(dtype=np.float64))
+            linked = counts > 0
+            values = pd.DataFrame(self.df[self.measures].to_numpy(dtype=np.float64)[bridge.rows],
+                                  columns=self.measures)
+            extremes = values.groupby(bridge.codes).agg(['min', 'max'])
+            extremes.index = bridge.names[extremes.index]
+            table = {'count': counts[linked],
+                     'sum': sums[linked],
+                     'sumsq': pd.DataFrame(squares, index=bridge.names, columns=self.measures)[linked],
+                     'min': extremes.xs('min', axis=1, level=1),
+                     'max': extremes.xs('max', axis=1, level=1)}
+        else:
+            df = self.df if mask is None else self.df[mask]
+            values = df[self.measures].astype(np.float64)
+            grouped = values.groupby(df[by], observed=True)
+            table = {'count': grouped.size(),
+                     'sum': grouped.sum(),
+                     'sumsq': np.square(values).groupby(df[by], observed=True).sum(),
+                     'min': grouped.min(),
+                     'max': grouped.max()}
+        return table
+
+    def _get(self, by, measure, stat='mean', filter=None):
+        """Return one statistic of one measure by the grouping key as Series."""
+        return statistic(self._table(by, filter), measure, stat)
+
+    def frame(self, by, measures, stat='mean', filter=None):
+        """Return one statistic of several measures by the grouping key as DataFrame."""
+        return pd.concat([self.get(by, measure, stat, filter) for measure in measures], axis=1)
+
+    def counts(self, by):
+        """Return the number of movies by the grouping key, sorted descending like value_counts."""
+        if self.cube is not None and by in self.cube.dimensions:
+            counts = self.cube.rollup(by).counts().sort_values(ascending=False, kind='stable')
+            return counts.rename_axis(None) if by in self.bridges else counts
+        if by in self.bridges:
+            return self.bridges[by].counts()
+        return self.df[by].value_counts()
+
+    def crosstab(self, index, columns):
+        """Return the number of movies for every pair of values of two label classes (or genres)."""
+        if self.cube is not None and index in self.cube.dimensions and columns in self.cube.dimensions:
+            return self.cube.crosstab(index, columns)
+        return self.bitmaps.crosstab(index, columns)
+
+    def cache_info(self):
+        """Return the cache statistics of the grouped tables and of the single results."""
+        return {'tables': self._table.cache_info(), 'results': self.get.cache_info()}
+
+    def clear(self):
+        self._table.cache_clear()
+        self.get.cache_clear()
@@ -0,0 +1,383 @@
+# coding: utf-8
+
+# Asynchronous client of the TMDB API to fill the missing numbers.
+#
+# About 54% of the movies have a budget of 0 and 55% a revenue of 0, the
+# cleaning drops all of them. The API of The Movie Database knows the numbers
+# of many of these movies. APIFiller fetches the details of every movie with a
+# budget, revenue or runtime of 0 and fills the zeros before they are dropped:
+#   clean(load(path), fill=APIFiller(api_key='...'))
+# The client only needs the standard library (asyncio streams):
+#   - a pool of keep-alive connections, which also limits the concurrency
+#   - a token bucket for the rate limit of the API, which halves its rate
+#     whenever the API answers 429 anyway and lets it grow back to the
+#     configured rate while no more 429 come
+#   - retries with exponential backoff (or Retry-After) for 429, 5xx and
+#     broken connections
+#   - a bounded queue of the ids for a fixed number of tasks, a movie which
+#     fails after all retries is recorded and does not stop the others
+#   - an on-disk cache of the responses, so a second run needs no requests
+# tmdb.api_server is a local stand-in of the API for offline runs.
+
+import asyncio
+import email.utils
+import hashlib
+import json
+import os
+import ssl
+import time
+import urllib.parse
+from datetime import datetime, timezone
+
+import numpy as np
+
+TMDB_API = 'https://api.themoviedb.org/3'
+
+# columns which are 0 if they are unknown, and the field of the movie details with their value:
+FILL_COLUMNS = {'budget': 'budget', 'revenue': 'revenue', 'runtime': 'runtime'}
+
+# errors of a connection which are worth another try:
+RETRY_ERRORS = (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError)
+
+
+def retry_after(value):
+    """Return the seconds to wait of a Retry-After header (seconds or HTTP-date), or None if it is invalid."""
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return max((date - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+class TokenBucket:
+    """Allow rate requests per second on average and bursts of up to capacity requests.
+
+    After throttle() the rate grows back linearly to the initial rate within
+    recovery seconds.
+    """
+
+    def __init__(self, rate, capacity=None, recovery=60):
+        self.rate = self.max_rate = rate
+        self.capacity = self.max_capacity = capacity if capacity is not None else max(rate, 1)
+        self.recovery = recovery
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Wait until a token is available and take it."""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                if self.rate < self.max_rate and self.tokens >= 0:
+                    # no pause any more, the rate recovers:
+                    self.rate = min(self.max_rate, self.rate + (now - self.updated) * self.max_rate / self.recovery)
+                    self.capacity = min(self.max_capacity, max(self.rate, 1))
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def throttle(self, seconds):
+        """Give no tokens for the next seconds and halve the rate, after the API answered 429.
+
+        The rate is halved only once for all 429 answers during one pause.
+        """
+        if self.tokens < 0:
+            return
+        self.rate = max(self.rate / 2, 1)
+        self.capacity = min(self.capacity, max(self.rate, 1))
+        self.tokens = min(self.tokens, -seconds * self.rate)
+
+
+class ConnectionPool:
+    """At most size keep-alive HTTP/1.1 connections to the host of base_url."""
+
+    def __init__(self, base_url, size=8, timeout=30):
+        url = urllib.parse.urlsplit(base_url)
+        self.host = url.hostname
+        self.https = url.scheme == 'https'
+        self.port = url.port or (443 if self.https else 80)
+        self.timeout = timeout
+        self._idle = []
+        self._slots = asyncio.Semaphore(size)
+
+    async def _connect(self):
+        context = ssl.create_default_context() if self.https else None
+        return await asyncio.wait_for(asyncio.open_connection(self.host, self.port, ssl=context), self.timeout)
+
+    async def _exchange(self, connection, target, headers):
+        """Send one request and return (status, headers, body, whether the connection can be reused)."""
+        reader, writer = connection
+        lines = ['GET {} HTTP/1.1'.format(target), 'Host: {}'.format(self.host), 'Connection: keep-alive']
+        lines += ['{}: {}'.format(name, value) for name, value in headers.items()]
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+        await writer.drain()
+
+        status = int((await reader.readuntil(b'\r\n')).split()[1])
+        response_headers = {}
+        while True:
+            line = await reader.readuntil(b'\r\n')
+            if line == b'\r\n':
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            response_headers[name.strip().lower()] = value.strip()
+
+        if response_headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await reader.readuntil(b'\r\n')).split(b';')[0], 16)
+                if size == 0:
+                    while await reader.readuntil(b'\r\n') != b'\r\n':
+                        pass
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+            body = b''.join(chunks)
+        elif 'content-length' in response_headers:
+            body = await reader.readexactly(int(response_headers['content-length']))
+        elif status in (204, 304) or status < 200:
+            body = b''
+        else:
+            # the server ends a body without length by closing the connection:
+            return status, response_headers, await reader.read(), False
+        return status, response_headers, body, response_headers.get('connection', '').lower() != 'close'
+
+    async def get(self, target, headers=None):
+        """Send a GET request for target (path and query) and return (status, headers, body)."""
+        async with self._slots:
+            connection = self._idle.pop() if self._idle else await self._connect()
+            try:
+                status, response_headers, body, reusable = await asyncio.wait_for(
+                    self._exchange(connection, target, headers or {}), self.timeout)
+            except BaseException:
+                connection[1].close()
+                raise
+            if reusable:
+                self._idle.append(connection)
+            else:
+                connection[1].close()
+            return status, response_headers, body
+
+    async def close(self):
+        while self._idle:
+            _, writer = self._idle.pop()
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+
+class ResponseCache:
+    """JSON responses on disk, one file per request path (without the api key)."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha256(key.encode()).hexdigest()[:32] + '.json')
+
+    def get(self, key):
+        """Return (True, response) if key is cached, otherwise (False, None)."""
+        try:
+            with open(self._path(key)) as f:
+                return True, json.load(f)['response']
+        except (OSError, ValueError, KeyError):
+            return False, None
+
+    def put(self, key, response):
+        path = self._path(key)
+        with open(path + '.tmp', 'w') as f:
+            json.dump({'key': key, 'response': response}, f)
+        os.replace(path + '.tmp', path)
+
+
+class TMDBClient:
+    """Asynchronous client of the TMDB API, use it with async with.
+
+    concurrency is the number of connections, rate the requests per second.
+    Responses with status 429 or 5xx and broken connections are retried up to
+    retries times. With cache_dir all answers (also 404) are kept on disk.
+    """
+
+    def __init__(self, base_url=TMDB_API, api_key=None, concurrency=8, rate=40, retries=3, backoff=0.5,
+                 cache_dir=None, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.api_key = api_key
+        self.concurrency = concurrency
+        self.rate = rate
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.cache = ResponseCache(cache_dir) if cache_dir is not None else None
+        self.requests = 0
+        # id -> error of the movies which movies() could not get:
+        self.failures = {}
+        self._pool = None
+        self._bucket = None
+
+    async def __aenter__(self):
+        self._pool = ConnectionPool(self.base_url, self.concurrency, self.timeout)
+        self._bucket = TokenBucket(self.rate)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self._pool.close()
+        return False
+
+    async def get(self, path, **params):
+        """Return the decoded JSON answer of path, or None if the API answers 404."""
+        key = path + ('?' + urllib.parse.urlencode(sorted(params.items())) if params else '')
+        if self.cache is not None:
+            cached, response = self.cache.get(key)
+            if cached:
+                return response
+        if self.api_key is not None:
+            params['api_key'] = self.api_key
+        target = urllib.parse.urlsplit(self.base_url).path + path
+        if params:
+            target += '?' + urllib.parse.urlencode(params)
+
+        for attempt in range(self.retries + 1):
+            wait = self.backoff * 2 ** attempt
+            await self._bucket.acquire()
+            self.requests += 1
+            try:
+                status, headers, body = await self._pool.get(target, {'Accept': 'application/json'})
+            except RETRY_ERRORS:
+                if attempt == self.retries:
+                    raise
+            else:
+                if status in (200, 404):
+                    response = json.loads(body) if status == 200 else None
+                    if self.cache is not None:
+                        self.cache.put(key, response)
+                    return response
+                if status != 429 and status < 500:
+                    raise ValueError('the TMDB API answered {} for {}: {}'.format(status, path, body[:200]))
+                if attempt == self.retries:
+                    raise ValueError('the TMDB API answered {} for {} after {} retries'
+                                     .format(status, path, self.retries))
+                # without a valid Retry-After the backoff applies:
+                seconds = retry_after(headers.get('retry-after', ''))
+                if seconds is not None:
+                    wait = seconds
+                if status == 429:
+                    # all requests wait, not only this one:
+                    self._bucket.throttle(wait)
+            await asyncio.sleep(wait)
+
+    async def movie(self, movie_id):
+        """Return the details of one movie, or None if the id is unknown."""
+        return await self.get('/movie/{}'.format(int(movie_id)))
+
+    async def movies(self, ids):
+        """Return a dict id -> details of the ids, concurrency tasks take the ids from a bounded queue.
+
+        The ids which still fail after all retries are left out of the result
+        and recorded with their error in failures.
+        """
+        queue = asyncio.Queue(maxsize=2 * self.concurrency)
+        details = {}
+
+        async def work():
+            while True:
+                movie_id = await queue.get()
+                try:
+                    if movie_id is None:
+                        return
+                    details[movie_id] = await self.movie(movie_id)
+                except (ValueError, *RETRY_ERRORS) as error:
+                    self.failures[movie_id] = '{}: {}'.format(type(error).__name__, error)
+                finally:
+                    queue.task_done()
+
+        async def feed():
+            for movie_id in ids:
+                await queue.put(int(movie_id))
+            # one stop signal for every task:
+            for _ in range(self.concurrency):
+                await queue.put(None)
+
+        tasks = [asyncio.create_task(feed())] + [asyncio.create_task(work()) for _ in range(self.concurrency)]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+        return details
+
+
+def missing_mask(df):
+    """Return a mask of the movies with a budget, revenue or runtime of 0."""
+    missing = np.zeros(len(df), dtype=bool)
+    for column in FILL_COLUMNS:
+        missing |= df[column].to_numpy() == 0
+    return missing
+
+
+def missing_ids(df):
+    """Return the ids of the movies with a budget, revenue or runtime of 0."""
+    return df['id'].to_numpy()[missing_mask(df)]
+
+
+def fill_missing(df, details):
+    """Replace the zeros of FILL_COLUMNS with the values of the movie details.
+
+    details maps id -> dict like the TMDB movie details (or None). Only
+    positive values replace zeros. Returns the filled DataFrame and the
+    number of movies which have no zero in FILL_COLUMNS any more.
+    """
+    df = df.copy()
+    missing = missing_mask(df)
+    positions = np.flatnonzero(missing)
+    answers = [details.get(int(movie_id)) or {} for movie_id in df['id'].to_numpy()[positions]]
+    for column, field in FILL_COLUMNS.items():
+        values = np.array([answer.get(field) or 0 for answer in answers], dtype=np.float64)
+        current = df[column].to_numpy()
+        fill = (current[positions] == 0) & (values > 0)
+        if fill.any():
+            filled = current.copy()
+            filled[positions[fill]] = values[fill].astype(filled.dtype)
+            df[column] = filled
+    return df, int((missing & ~missing_mask(df)).sum())
+
+
+class APIFiller:
+    """Fill the missing budgets, revenues and runtimes from the TMDB API, see pipeline.clean(fill=...).
+
+    The keyword arguments are passed to TMDBClient. After a call, stats has
+    the number of requested movies, answers and recovered movies.
+    """
+
+    def __init__(self, **client_options):
+        self.client_options = client_options
+        self.stats = {}
+
+    def __str__(self):
+        return 'api {}'.format(self.client_options.get('base_url', TMDB_API))
+
+    async def fetch(self, ids):
+        async with TMDBClient(**self.client_options) as client:
+            details = await client.movies(ids)
+            self.stats['requests'] = client.requests
+            self.stats['failures'] = client.failures
+        return details
+
+    def __call__(self, df):
+        ids = np.unique(missing_ids(df))
+        details = asyncio.run(self.fetch(ids)) if len(ids) else {}
+        df, recovered = fill_missing(df, details)
+        self.stats.update({'requested': len(ids), 'found': sum(value is not None for value in details.values()),
+                           'failed': len(self.stats.get('failures', {})), 'recovered': recovered})
+        return df
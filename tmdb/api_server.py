@@ -0,0 +1,155 @@
+# coding: utf-8
+
+# Local stand-in of the TMDB API for offline runs of tmdb.api.
+#
+# It answers GET /3/movie/<id> with the details of the given movies in the
+# JSON layout of TMDB (404 for unknown ids) over HTTP/1.1 with keep-alive,
+# using only http.server from the standard library. It can also behave like
+# a busy API: with rate_limit it answers 429 with Retry-After as soon as more
+# requests arrive in one second, with fail_every every n-th request fails
+# with 500. Started from the command line it serves a csv-file with the
+# columns id, budget, revenue and runtime:
+#   python -m tmdb.api_server details.csv --port 8000
+# and the client is pointed at it with --api http://127.0.0.1:8000/3.
+
+import argparse
+import json
+import re
+import sys
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MOVIE_PATH = re.compile(r'^/3/movie/(\d+)$')
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # headers and body in one write, otherwise Nagle and delayed acks cost 40 ms per request:
+    wbufsize = 1 << 16
+
+    def log_message(self, format, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        with self.server.tmdb._lock:
+            self.server.tmdb.connections += 1
+
+    def _send(self, status, body, headers=()):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json;charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        server = self.server.tmdb
+        url = urllib.parse.urlsplit(self.path)
+        status = server.admit(urllib.parse.parse_qs(url.query).get('api_key', [None])[0])
+        if status == 401:
+            return self._send(401, {'status_code': 7, 'status_message': 'Invalid API key: You must be granted '
+                                                                        'a valid key.'})
+        if status == 429:
+            return self._send(429, {'status_code': 25, 'status_message': 'Your request count is over the '
+                                                                         'allowed limit.'}, [('Retry-After', '1')])
+        if status == 500:
+            return self._send(500, {'status_code': 11, 'status_message': 'Internal error.'})
+        match = MOVIE_PATH.match(url.path)
+        details = server.movies.get(int(match.group(1))) if match else None
+        if details is None:
+            return self._send(404, {'status_code': 34, 'status_message': 'The resource you requested could not '
+                                                                         'be found.'})
+        self._send(200, details)
+
+
+class MockTMDBServer:
+    """The stand-in API in a background thread, use it with with; url is the base url for TMDBClient.
+
+    movies maps id -> details dict, or is a DataFrame with an id column and
+    the detail fields (budget, revenue, runtime, ...) as columns. requests
+    and connections count the requests and the accepted connections.
+    """
+
+    def __init__(self, movies, host='127.0.0.1', port=0, api_key=None, rate_limit=None, fail_every=None):
+        if hasattr(movies, 'to_dict'):
+            movies = {int(row['id']): row for row in movies.to_dict('records')}
+        self.movies = {movie_id: {key: (value.item() if hasattr(value, 'item') else value)
+                                  for key, value in details.items()} for movie_id, details in movies.items()}
+        self.api_key = api_key
+        self.rate_limit = rate_limit
+        self.fail_every = fail_every
+        self.requests = 0
+        self.connections = 0
+        self._window = (0, 0)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.tmdb = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return 'http://{}:{}/3'.format(host, port)
+
+    def admit(self, api_key):
+        """Count a request and return the status it gets before the movie is looked up."""
+        with self._lock:
+            self.requests += 1
+            if self.api_key is not None and api_key != self.api_key:
+                return 401
+            if self.fail_every and self.requests % self.fail_every == 0:
+                return 500
+            if self.rate_limit is not None:
+                second, count = self._window
+                now = int(time.monotonic())
+                count = count + 1 if now == second else 1
+                self._window = (now, count)
+                if count > self.rate_limit:
+                    return 429
+            return 200
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+        return False
+
+
+def main(argv=None):
+    import pandas as pd
+    parser = argparse.ArgumentParser(prog='tmdb.api_server', description='Serve movie details like the TMDB API.')
+    parser.add_argument('csv', help='csv-file with the columns id, budget, revenue and runtime')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--api-key', help='only accept requests with this api key')
+    parser.add_argument('--rate-limit', type=int, help='answer 429 above this number of requests per second')
+    args = parser.parse_args(argv)
+
+    server = MockTMDBServer(pd.read_csv(args.csv), port=args.port, api_key=args.api_key,
+                            rate_limit=args.rate_limit)
+    print('serving {} movies on {}'.format(len(server.movies), server.url))
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,113 @@
+# coding: utf-8
+
+# Quantile based bin edges for the label classes.
+#
+# quantile_edges() computes all quantiles of all classified columns with one
+# selection per column, instead of calling Series.quantile five times.
+# For data which does not fit into memory, KLLSketch is a small mergeable
+# quantile sketch (Karnin, Lang, Liberty 2016) which is fed chunk by chunk.
+# Its memory only depends on k, the normalized rank error of the edges is
+# roughly 1.7% for k=200 and shrinks proportional to 1/k.
+
+import numpy as np
+import pandas as pd
+
+QUARTILES = [0, 0.25, 0.5, 0.75, 1]
+
+
+def quantile_edges(df, columns, q=QUARTILES):
+    """Return a dict column -> list of the quantiles q of that column, computed in one pass each."""
+    return {column: [float(edge) for edge in df[column].quantile(q)] for column in columns}
+
+
+class KLLSketch:
+    """Approximate quantiles of a stream of numbers in memory bounded by k."""
+
+    def __init__(self, k=200, seed=None):
+        self.k = k
+        self.n = 0
+        self.min = np.inf
+        self.max = -np.inf
+        self.levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(2, int(np.ceil(self.k * (2 / 3) ** depth)))
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) > self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                items = np.sort(items)
+                # an odd item stays on its level, every second of the others moves up with double weight:
+                keep, items = items[len(items) - len(items) % 2:], items[:len(items) - len(items) % 2]
+                promoted = items[self._rng.integers(2)::2]
+                self.levels[level] = keep
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+            level += 1
+
+    def update(self, values):
+        """Add an array of values (NaN values are ignored)."""
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return self
+        self.n += len(values)
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+        return self
+
+    def merge(self, other):
+        """Add all values of another sketch, for example of another chunk or worker."""
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.n += other.n
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+        return self
+
+    def quantile(self, q):
+        """Return the approximate quantiles q, the 0 and 1 quantiles are exact."""
+        q = np.atleast_1d(np.asarray(q, dtype=np.float64))
+        if self.n == 0:
+            return np.full(len(q), np.nan)
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(level), 2.0 ** i) for i, level in enumerate(self.levels)])
+        order = np.argsort(items, kind='stable')
+        items, cumulative = items[order], np.cumsum(weights[order])
+        positions = np.searchsorted(cumulative, q * cumulative[-1], side='left')
+        result = items[np.clip(positions, 0, len(items) - 1)]
+        result[q <= 0] = self.min
+        result[q >= 1] = self.max
+        return result
+
+
+def sketch_edges(chunks, columns, q=QUARTILES, k=200, seed=None):
+    """Return approximate quantile edges for columns over an iterable of DataFrame chunks.
+
+    Every chunk is read once, so the whole dataset never has to be in memory.
+    """
+    sketches = {column: KLLSketch(k, seed) for column in columns}
+    for chunk in chunks:
+        for column in columns:
+            sketches[column].update(chunk[column].to_numpy())
+    return {column: [float(edge) for edge in sketch.quantile(q)] for column, sketch in sketches.items()}
+
+
+def apply_classes(df, edges, classes):
+    """Add the label classes to df.
+
+    classes maps column -> (class column, labels), edges maps column -> bin edges.
+    """
+    for column, (class_column, labels) in classes.items():
+        df[class_column] = pd.cut(df[column], edges[column], labels=labels, include_lowest=True)
+    return df
@@ -0,0 +1,182 @@
+# coding: utf-8
+
+# Bitmap indexes of the label classes and the genres.
+#
+# rating_class, vote_counts_class, runtime_class and budget_class have four
+# labels each and are compared again and again: in question 4.5, in the
+# filters of the AggregateCache and in the cross table of question 4.4. A
+# BitmapIndex keeps one bitmap per label (and per genre) with one bit per
+# movie, packed into 64-bit words with np.packbits. A combined filter is a
+# bitwise AND / OR of a few bitmaps and a count is the popcount of the result,
+# so one movie costs 1/8 byte per label instead of a scan over the columns:
+#   index = BitmapIndex.build(df, bridges)
+#   index.count(vote_counts_class='many', budget_class='premium')
+#   index.crosstab('vote_counts_class', 'rating_class')
+# Filter expressions like DataFrame.query takes them are evaluated on the
+# bitmaps with the parser of tmdb.query, genre == "Drama" selects the movies
+# with Drama among their genres.
+
+import numpy as np
+import pandas as pd
+
+from tmdb.schema import LABEL_DTYPES
+
+CLASS_COLUMNS = list(LABEL_DTYPES)
+
+# entities of the bridge tables with a bitmap per name:
+ENTITIES = ['genre']
+
+# number of set bits of every byte, if numpy has no bitwise_count:
+_BYTE_COUNTS = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1)
+
+
+def pack(mask):
+    """Pack boolean masks (..., n) into little-endian 64-bit words (..., ceil(n / 64))."""
+    packed = np.packbits(np.asarray(mask, dtype=bool), axis=-1, bitorder='little')
+    padding = -packed.shape[-1] % 8
+    if padding:
+        packed = np.concatenate([packed, np.zeros(packed.shape[:-1] + (padding,), dtype=np.uint8)], axis=-1)
+    return np.ascontiguousarray(packed).view('<u8')
+
+
+def unpack(words, n):
+    """Return the first n bits of packed words as boolean mask."""
+    bits = np.ascontiguousarray(words).view(np.uint8)
+    return np.unpackbits(bits, axis=-1, count=n, bitorder='little').astype(bool)
+
+
+def popcount(words, axis=None):
+    """Return the number of set bits of packed words, in total or along axis."""
+    if hasattr(np, 'bitwise_count'):
+        counts = np.bitwise_count(words)
+    else:
+        counts = _BYTE_COUNTS[np.ascontiguousarray(words).view(np.uint8)]
+    return counts.sum(axis=axis, dtype=np.int64)
+
+
+class BitmapIndex:
+    """Packed bitmaps of the movies of a DataFrame per label class value and per genre.
+
+    bitmaps maps column (or entity) -> (values, words) with one row of words
+    per value. Filters are given as expression (where) and / or as keyword
+    conditions column=value or column=[values], which are combined with AND.
+    """
+
+    def __init__(self, bitmaps, n_rows):
+        self.bitmaps = bitmaps
+        self.n_rows = n_rows
+        self._all = pack(np.ones(n_rows, dtype=bool))
+        # value -> row of its bitmap, a dict lookup is much faster than Index.get_indexer:
+        self._positions = {column: {value: i for i, value in enumerate(values)}
+                           for column, (values, _) in bitmaps.items()}
+
+    @classmethod
+    def build(cls, df, bridges=None, columns=CLASS_COLUMNS, entities=ENTITIES):
+        """Build the bitmaps of the class columns and of the entities of df.
+
+        The entities are taken from bridges (see tmdb.bridges) or split from
+        their columns.
+        """
+        from tmdb.bridges import LIST_COLUMNS, Bridge
+        bitmaps = {}
+        for column in columns:
+            if column not in df:
+                continue
+            if isinstance(df[column].dtype, pd.CategoricalDtype):
+                # the values keep the order of the classes, like the index of a groupby:
+                codes = df[column].cat.codes.to_numpy()
+                values = pd.CategoricalIndex(df[column].cat.categories, dtype=df[column].dtype, name=column)
+            else:
+                codes, values = pd.factorize(df[column], sort=True)
+                values = pd.Index(values, name=column)
+            bitmaps[column] = (values, pack(codes[None, :] == np.arange(len(values))[:, None]))
+        for entity in entities:
+            if bridges is not None and entity in bridges:
+                bridge = bridges[entity]
+            elif LIST_COLUMNS[entity] in df:
+                bridge = Bridge.from_column(df[LIST_COLUMNS[entity]])
+            else:
+                continue
+            offsets, rows = bridge.postings()
+            words = np.empty((len(bridge.names), -(-len(df) // 64)), dtype='<u8')
+            mask = np.zeros(len(df), dtype=bool)
+            for code in range(len(bridge.names)):
+                mask[:] = False
+                mask[rows[offsets[code]:offsets[code + 1]]] = True
+                words[code] = pack(mask)
+            bitmaps[entity] = (pd.Index(bridge.names, name=entity), words)
+        return cls(bitmaps, len(df))
+
+    def values(self, column):
+        """Return the values of a column (or entity) which have a bitmap."""
+        return self._bitmaps(column)[0]
+
+    def _bitmaps(self, column):
+        if column not in self.bitmaps:
+            raise ValueError('no bitmap index of {}, indexed are {}'.format(column, ', '.join(self.bitmaps)))
+        return self.bitmaps[column]
+
+    def _any(self, column, values):
+        """Return the OR of the bitmaps of the values of a column, unknown names of an entity match nothing."""
+        words = self._bitmaps(column)[1]
+        positions = [self._positions[column][value] for value in values if value in self._positions[column]]
+        if len(positions) == 1:
+            return words[positions[0]]
+        return np.bitwise_or.reduce(words[positions], axis=0) if positions else np.zeros_like(self._all)
+
+    def _evaluate(self, node):
+        from tmdb.query import class_labels, negate
+        if node[0] in ('and', 'or'):
+            combine = np.bitwise_and if node[0] == 'and' else np.bitwise_or
+            return combine.reduce([self._evaluate(child) for child in node[1]])
+        _, column, op, value = node
+        if op in ('!=', 'not in'):
+            # movies without a value are part of the complement, like in pandas:
+            return self._all & ~self._evaluate(negate(node))
+        if column in LABEL_DTYPES:
+            values = class_labels(column, op, value)
+        elif op in ('==', 'in'):
+            values = value if isinstance(value, list) else [value]
+        else:
+            raise ValueError('{} has no order, only == != in and not in work'.format(column))
+        return self._any(column, values)
+
+    def select(self, where=None, **conditions):
+        """Return the packed bitmap of the movies which satisfy the expression where and the conditions."""
+        from tmdb.query import parse
+        words = self._all.copy()
+        if where is not None:
+            words &= self._evaluate(parse(where) if isinstance(where, str) else where)
+        for column, value in conditions.items():
+            words &= self._evaluate(('cmp', column, 'in' if isinstance(value, list) else '==', value))
+        return words
+
+    def mask(self, where=None, **conditions):
+        """Return the boolean mask of the movies which satisfy the filter."""
+        return unpack(self.select(where, **conditions), self.n_rows)
+
+    def rows(self, where=None, **conditions):
+        """Return the row positions of the movies which satisfy the filter."""
+        return np.flatnonzero(self.mask(where, **conditions))
+
+    def count(self, where=None, **conditions):
+        """Return the number of movies which satisfy the filter."""
+        return int(popcount(self.select(where, **conditions)))
+
+    def counts(self, column, where=None, **conditions):
+        """Return the number of movies for every value of column among the movies which satisfy the filter."""
+        index, words = self._bitmaps(column)
+        selected = self.select(where, **conditions)
+        return pd.Series(popcount(words & selected, axis=-1), index=index, name='count')
+
+    def crosstab(self, index, columns, where=None, **conditions):
+        """Return the number of movies for every pair of values of two columns as DataFrame."""
+        index_values, index_words = self._bitmaps(index)
+        column_values, column_words = self._bitmaps(columns)
+        selected = index_words & self.select(where, **conditions)
+        counts = popcount(selected[:, None, :] & column_words[None, :, :], axis=-1)
+        return pd.DataFrame(counts, index=index_values, columns=column_values)
+
+    def memory_usage(self):
+        """Return the bytes of the bitmaps of every column."""
+        return pd.Series({column: words.nbytes for column, (_, words) in self.bitmaps.items()})
@@ -0,0 +1,135 @@
+# coding: utf-8
+
+# Long-form bridge tables between movies and the pipe-delimited columns.
+#
+# Instead of exploding the whole DataFrame once per question (which copies
+# every column once per genre, actor, ...), each pipe-delimited column is
+# split a single time into two integer arrays:
+#   rows  - position of the movie in the DataFrame
+#   codes - integer code of the genre, actor, company or keyword
+# together with the names belonging to the codes. The memory is proportional
+# to the number of links and all per-entity questions reuse the same tables.
+#
+# For aggregates a bridge can also be turned into a sparse entity x movie
+# incidence matrix (CSR, needs scipy). Sums, counts and means of all numeric
+# columns for all entities then come from one sparse-dense matrix product.
+
+import numpy as np
+import pandas as pd
+
+
+# name of the entity -> pipe-delimited column of the cleaned dataset:
+LIST_COLUMNS = {'genre': 'genres', 'actor': 'cast', 'company': 'production_companies', 'keyword': 'keywords',
+                'director': 'director'}
+
+
+class Bridge:
+    """Links between the movies of a DataFrame and the values of one pipe-delimited column."""
+
+    def __init__(self, rows, codes, names, movie_ids=None, n_movies=None):
+        self.rows = rows
+        self.codes = codes
+        self.names = names
+        self.movie_ids = movie_ids
+        self.n_movies = n_movies if n_movies is not None else (int(rows.max()) + 1 if len(rows) else 0)
+        self._incidence = None
+        self._postings = None
+
+    @classmethod
+    def from_column(cls, column, movie_ids=None, sep='|'):
+        """Split a pipe-delimited column once and encode the values as integers (see tmdb.counting)."""
+        from tmdb.counting import encode_tokens
+        rows, codes, names = encode_tokens(column, sep)
+        return cls(rows, codes, names, movie_ids, len(column))
+
+    def __len__(self):
+        return len(self.codes)
+
+    def frame(self):
+        """Return the bridge as long-form DataFrame with movie_id and integer code."""
+        movie_ids = self.movie_ids[self.rows] if self.movie_ids is not None else self.rows
+        return pd.DataFrame({'movie_id': movie_ids, 'code': self.codes})
+
+    def counts(self, k=None):
+        """Return the number of movies for each name, sorted descending.
+
+        With k only the k names with the most movies are selected (see tmdb.topk).
+        """
+        counts = pd.Series(np.bincount(self.codes, minlength=len(self.names)), index=self.names, name='count')
+        if k is not None:
+            from tmdb.topk import top_k_positions
+            return counts.iloc[top_k_positions(counts.to_numpy(), k)]
+        return counts.sort_values(ascending=False, kind='stable')
+
+    def postings(self):
+        """Return the inverted index as (offsets, rows).
+
+        The rows of the movies linked with code i are rows[offsets[i]:offsets[i + 1]],
+        in the order of the DataFrame. The index is built once and kept with the bridge.
+        """
+        if self._postings is None:
+            order = np.argsort(self.codes, kind='stable')
+            offsets = np.zeros(len(self.names) + 1, dtype=np.int64)
+            np.cumsum(np.bincount(self.codes, minlength=len(self.names)), out=offsets[1:])
+            self._postings = (offsets, self.rows[order])
+        return self._postings
+
+    def rows_of(self, name):
+        """Return the row positions of all movies linked with name."""
+        if name not in self.names:
+            return np.array([], dtype=np.int32)
+        code = self.names.get_loc(name)
+        offsets, rows = self.postings()
+        return rows[offsets[code]:offsets[code + 1]]
+
+    def subset(self, mask):
+        """Return the bridge restricted to the movies where the boolean mask is True."""
+        keep = np.asarray(mask)[self.rows]
+        return Bridge(self.rows[keep], self.codes[keep], self.names, self.movie_ids, self.n_movies)
+
+    def incidence(self):
+        """Return the sparse entity x movie incidence matrix in CSR format.
+
+        Entry (i, j) is the number of times name i is linked with the movie in
+        row j. The matrix is built once and kept with the bridge.
+        """
+        if self._incidence is None:
+            from scipy import sparse
+            data = np.ones(len(self.codes), dtype=np.float64)
+            self._incidence = sparse.csr_matrix((data, (self.codes, self.rows)),
+                                                shape=(len(self.names), self.n_movies))
+        return self._incidence
+
+    def group_sum(self, df, columns):
+        """Return the number of links and the sums of the columns of df for each name.
+
+        Both come from a single product of the incidence matrix with the numeric
+        columns plus a column of ones.
+        """
+        values = np.ones((len(df), len(columns) + 1), dtype=np.float64)
+        values[:, 1:] = df[columns].to_numpy(dtype=np.float64)
+        product = self.incidence() @ values
+        counts = pd.Series(product[:, 0], index=self.names, name='count')
+        sums = pd.DataFrame(product[:, 1:], index=self.names, columns=columns)
+        return counts, sums
+
+    def group_mean(self, df, columns):
+        """Return the mean of the columns of df for each name linked with at least one movie."""
+        counts, sums = self.group_sum(df, columns)
+        linked = counts > 0
+        return sums[linked].div(counts[linked], axis=0)
+
+
+def build_bridges(df, columns=LIST_COLUMNS):
+    """Build one Bridge for each entity in columns, which maps entity name -> column name."""
+    from tmdb.profiling import stage
+    movie_ids = df['id'].to_numpy() if 'id' in df else None
+    bridges = {}
+    for entity, column in columns.items():
+        if column not in df:
+            continue
+        # the bridge replaces exploding the column, rows_out is the number of links:
+        with stage('explode.' + column, len(df)) as record:
+            bridges[entity] = Bridge.from_column(df[column], movie_ids)
+            record['rows_out'] = len(bridges[entity])
+    return bridges
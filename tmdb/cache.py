@@ -0,0 +1,190 @@
+# coding: utf-8
+
+# On-disk cache of the cleaned and classified dataset.
+#
+# The final reordered DataFrame of the Data Wrangling section is written as an
+# uncompressed Feather (Arrow IPC) file, so it can be memory-mapped on the next
+# run. The file name contains a hash of the source csv-file and of all cleaning
+# parameters, so the cache is rebuilt as soon as one of them changes, and it
+# starts with the name and a hash of the path of the csv-file, so csv-files of
+# the same name in other directories have files of their own.
+
+import hashlib
+import json
+import os
+import re
+
+import pandas as pd
+
+from tmdb import pipeline
+
+CACHE_VERSION = 1
+
+
+def cleaning_parameters(keep=pipeline.DEDUP_KEEP, fill=None):
+    """Return all parameters which have an influence on the cleaned dataset.
+
+    Of a fill function only the name (str) is known, changes of its source
+    are not detected.
+    """
+    return {
+        'dedup_keep': keep,
+        'fill': None if fill is None else str(fill),
+        'version': CACHE_VERSION,
+        'not_relevant': pipeline.NOT_RELEVANT,
+        'use_columns': pipeline.USE_COLUMNS,
+        'dtypes': pipeline.DTYPES,
+        'date_format': pipeline.DATE_FORMAT,
+        'labels': [pipeline.BIN_LABELS_RATING, pipeline.BIN_LABELS_VOTING,
+                   pipeline.BIN_LABELS_RUNTIME, pipeline.BIN_LABELS_BUDGET],
+        'quantile_classes': pipeline.QUANTILE_CLASSES,
+        'runtime_edges': pipeline.RUNTIME_EDGES,
+        'columns': pipeline.COLUMNS_REORDERED,
+        'million': pipeline.MILLION,
+    }
+
+
+def file_hash(path, block_size=1 << 20):
+    """Return the sha256 hex digest of a file, read in blocks of block_size bytes."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cache_key(path, params=None):
+    """Return the cache key of a source csv-file together with the cleaning parameters."""
+    if params is None:
+        params = cleaning_parameters()
+    digest = hashlib.sha256(file_hash(path).encode())
+    digest.update(json.dumps(params, sort_keys=True).encode())
+    return digest.hexdigest()[:16]
+
+
+def cache_stem(path):
+    """Return the start of the names of the cache files of a csv-file: its name and a hash of its absolute path."""
+    digest = hashlib.sha256(os.path.abspath(path).encode()).hexdigest()[:8]
+    return '{}-{}'.format(os.path.splitext(os.path.basename(path))[0], digest)
+
+
+def cache_path(path, cache_dir, params=None, extension='.feather'):
+    return os.path.join(cache_dir, '{}.{}{}'.format(cache_stem(path), cache_key(path, params), extension))
+
+
+def _remove_stale(path, keep):
+    """Remove the cache files of the csv-file path of the same kind as keep, which were written for other keys."""
+    cache_dir, current = os.path.split(keep)
+    stem = cache_stem(path)
+    extension = current[len(stem) + 17:]
+    pattern = re.compile(r'{}\.[0-9a-f]{{16}}{}\Z'.format(re.escape(stem), re.escape(extension)))
+    for name in os.listdir(cache_dir or '.'):
+        if name != current and pattern.match(name):
+            os.remove(os.path.join(cache_dir, name))
+
+
+def read_cache(path, compact=True):
+    """Read a cached dataset memory-mapped from disk, with the compact schema of tmdb.schema.
+
+    The numbers and strings of a file written by write_cache() are views of
+    the mapped pages, not private copies. compact=False keeps the dtypes of
+    the file.
+    """
+    from pyarrow import feather
+    df = feather.read_table(path, memory_map=True).to_pandas()
+    if compact:
+        from tmdb.schema import compact as compact_schema
+        df = compact_schema(df)
+    return df
+
+
+def write_cache(df, path):
+    """Write a dataset uncompressed into the cache, so it can be memory-mapped later."""
+    from pyarrow import feather
+    tmp_path = path + '.tmp'
+    # one record batch, columns of several batches would be concatenated into a copy when read:
+    feather.write_feather(df, tmp_path, compression='uncompressed', chunksize=max(len(df), 1))
+    os.replace(tmp_path, path)
+
+
+def write_bridges(bridges, directory):
+    """Write the links and the names of the bridge tables (see tmdb.bridges) uncompressed into directory."""
+    import pyarrow as pa
+    from pyarrow import feather
+    for entity, bridge in bridges.items():
+        path = os.path.join(directory, 'bridge.{}'.format(entity))
+        feather.write_feather(pa.table({'rows': bridge.rows, 'codes': bridge.codes}), path + '.feather',
+                              compression='uncompressed', chunksize=max(len(bridge), 1))
+        feather.write_feather(pa.table({'names': pa.array(bridge.names, type=pa.string())}),
+                              path + '.names.feather', compression='uncompressed',
+                              chunksize=max(len(bridge.names), 1))
+
+
+def read_bridges(directory, df, entities):
+    """Read the bridge tables of entities of the movies df memory-mapped from directory."""
+    from pyarrow import feather
+    from tmdb.bridges import Bridge
+    movie_ids = df['id'].to_numpy() if 'id' in df else None
+    bridges = {}
+    for entity in entities:
+        path = os.path.join(directory, 'bridge.{}'.format(entity))
+        links = feather.read_table(path + '.feather', memory_map=True)
+        names = feather.read_table(path + '.names.feather', memory_map=True).column('names').to_pandas().array
+        bridges[entity] = Bridge(links.column('rows').to_numpy(), links.column('codes').to_numpy(),
+                                 pd.Index(names), movie_ids, len(df))
+    return bridges
+
+
+def load_cleaned(path='tmdb-movies.csv', cache_dir='.tmdb_cache', keep=pipeline.DEDUP_KEEP, fill=None,
+                 conflicts=None):
+    """Return the cleaned and classified dataset of a csv-file.
+
+    The dataset is taken from cache_dir if the csv-file and the cleaning
+    parameters are unchanged, otherwise it is built with load, clean and
+    classify and written into the cache. keep, fill and conflicts are passed
+    to pipeline.clean(), the conflict report is cached next to the dataset.
+    Needs pyarrow.
+    """
+    from tmdb.profiling import stage
+    parameters = cleaning_parameters(keep, fill)
+    target = cache_path(path, cache_dir, parameters)
+    report_path = cache_path(path, cache_dir, parameters, '.conflicts.feather')
+    if os.path.exists(target) and (conflicts is None or keep is None or os.path.exists(report_path)):
+        with stage('cache.read') as record:
+            df = read_cache(target)
+            if conflicts is not None and keep is not None:
+                report = read_cache(report_path, compact=False)
+                conflicts.append(report.assign(differing_columns=report['differing_columns'].map(list)))
+            record['rows_out'] = len(df)
+        return df
+
+    reports = []
+    df = pipeline.classify(pipeline.clean(pipeline.load(path, usecols=pipeline.fill_columns(fill)), keep, fill,
+                                          reports))
+    os.makedirs(cache_dir, exist_ok=True)
+    with stage('cache.write', len(df)):
+        write_cache(df, target)
+        if reports:
+            write_cache(reports[0], report_path)
+    _remove_stale(path, target)
+    _remove_stale(path, report_path)
+    if conflicts is not None:
+        conflicts.extend(reports)
+    return df
+
+
+def load_store(path='tmdb-movies.csv', cache_dir='.tmdb_cache', keep=pipeline.DEDUP_KEEP, fill=None):
+    """Return a tmdb.query.Store of the cleaned and classified dataset of a csv-file.
+
+    The Parquet store is kept in cache_dir next to the Feather file of
+    load_cleaned() and rebuilt under the same conditions.
+    """
+    from tmdb.profiling import stage
+    from tmdb.query import Store, write_store
+    target = cache_path(path, cache_dir, cleaning_parameters(keep, fill), '.parquet')
+    if not os.path.exists(target):
+        df = load_cleaned(path, cache_dir, keep, fill)
+        with stage('cache.write_store', len(df)):
+            write_store(df, target)
+        _remove_stale(path, target)
+    return Store(target)
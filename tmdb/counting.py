@@ -0,0 +1,115 @@
+# coding: utf-8
+
+# Tokenizing of the pipe-delimited columns straight into integer codes.
+#
+# The notebook counts the actors with
+#   pd.Series(df['cast'].str.cat(sep='|').split('|')).value_counts()
+# which builds one giant string and a Python str object for every credit.
+# Here the column is processed in batches of Arrow string arrays: split,
+# flatten and dictionary-encode run inside Arrow, and only the dictionary of
+# each batch (the distinct names) becomes Python objects to map the batch
+# codes onto one global vocabulary. Categorical columns are even cheaper,
+# only their categories are split. Without pyarrow, a pandas fallback is used.
+
+import numpy as np
+import pandas as pd
+
+
+class Vocabulary:
+    """Global mapping name -> integer code, in the order the names were first seen."""
+
+    def __init__(self):
+        self.codes = {}
+
+    def lookup(self, names):
+        """Return the codes of the names, new names get the next free codes."""
+        codes = self.codes
+        return np.fromiter((codes.setdefault(name, len(codes)) for name in names), dtype=np.int32, count=len(names))
+
+    def names(self):
+        return pd.Index(list(self.codes))
+
+
+def _split(values, sep):
+    """Split an array of strings into (lengths, codes, names) of their tokens.
+
+    With pyarrow the strings are split and dictionary-encoded inside Arrow and
+    only the distinct names become Python objects.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.compute as pc
+    except ImportError:
+        splitted = pd.Series(values, dtype=object).str.split(sep)
+        lengths = splitted.str.len().fillna(0).to_numpy(dtype=np.int64)
+        codes, names = pd.factorize(splitted.explode().dropna().to_numpy())
+        return lengths, codes, list(names)
+    lists = pc.split_pattern(pa.array(values, type=pa.string(), from_pandas=True), sep)
+    lengths = pc.list_value_length(lists).fill_null(0).to_numpy().astype(np.int64)
+    encoded = pc.list_flatten(lists).dictionary_encode()
+    return lengths, encoded.indices.to_numpy(), encoded.dictionary.to_pylist()
+
+
+def _encode_categorical(column, sep, vocabulary):
+    """Encode a categorical column by splitting every used category only once."""
+    column = column.cat.remove_unused_categories()
+    if len(column.cat.categories) == 0:
+        return np.array([], dtype=np.int32), np.array([], dtype=np.int32)
+    cat_lengths, token_codes, tokens = _split(column.cat.categories.array, sep)
+    cat_offsets = np.zeros(len(cat_lengths) + 1, dtype=np.int64)
+    np.cumsum(cat_lengths, out=cat_offsets[1:])
+    cat_codes = vocabulary.lookup(tokens)[token_codes]
+
+    row_categories = column.cat.codes.to_numpy()
+    lengths = np.where(row_categories >= 0, cat_lengths[row_categories], 0)
+    rows = np.repeat(np.arange(len(column), dtype=np.int32), lengths)
+    # position of every link inside the tokens of its category:
+    ends = np.cumsum(lengths)
+    intra = np.arange(ends[-1] if len(ends) else 0) - np.repeat(ends - lengths, lengths)
+    codes = cat_codes[np.repeat(cat_offsets[row_categories.clip(0)], lengths) + intra]
+    return rows, codes
+
+
+def iter_encoded(column, sep='|', batch_size=100000, vocabulary=None):
+    """Yield (rows, codes) of the links of a pipe-delimited column batch by batch.
+
+    rows are the positions in column, codes refer to vocabulary, which is
+    shared between all batches.
+    """
+    if vocabulary is None:
+        vocabulary = Vocabulary()
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        yield _encode_categorical(column, sep, vocabulary)
+        return
+
+    for start in range(0, len(column), batch_size):
+        lengths, batch_codes, batch_names = _split(column.iloc[start:start + batch_size].array, sep)
+        rows = np.repeat(np.arange(start, start + len(lengths), dtype=np.int32), lengths)
+        yield rows, vocabulary.lookup(batch_names)[batch_codes]
+
+
+def encode_tokens(column, sep='|', batch_size=100000):
+    """Return (rows, codes, names) of all links of a pipe-delimited column."""
+    vocabulary = Vocabulary()
+    rows, codes = [], []
+    for batch_rows, batch_codes in iter_encoded(column, sep, batch_size, vocabulary):
+        rows.append(batch_rows)
+        codes.append(batch_codes)
+    if not rows:
+        return np.array([], dtype=np.int32), np.array([], dtype=np.int32), pd.Index([])
+    return np.concatenate(rows), np.concatenate(codes), vocabulary.names()
+
+
+def count_tokens(column, sep='|', batch_size=100000):
+    """Return how often every name of a pipe-delimited column occurs, sorted descending.
+
+    Only the counts are kept between the batches, so the peak memory does
+    not grow with the number of credits.
+    """
+    vocabulary = Vocabulary()
+    counts = np.zeros(0, dtype=np.int64)
+    for rows, codes in iter_encoded(column, sep, batch_size, vocabulary):
+        batch_counts = np.bincount(codes, minlength=len(vocabulary.codes))
+        batch_counts[:len(counts)] += counts
+        counts = batch_counts
+    return pd.Series(counts, index=vocabulary.names(), name='count').sort_values(ascending=False, kind='stable')
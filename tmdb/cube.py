@@ -0,0 +1,230 @@
+# coding: utf-8
+
+# Materialized OLAP cube of the numeric columns over the fixed dimensions of
+# the investigation.
+#
+# The questions group the same movies again and again by release year, genre
+# and the label classes. A Cube keeps count, sum, sum of squares, min and max
+# of the MEASURES for every non-empty cell of
+#   release_year x genre x budget_class x rating_class x vote_counts_class x runtime_class
+# Every coarser grouping is a roll-up of the cells (sums of the counts, sums
+# and sums of squares, min of the mins, max of the maxes), so the yearly
+# means, genre means, class distributions and cross tables of questions 1 to
+# 4 come from the table of cells instead of the movies.
+#
+# A movie has several genres, so the genre dimension has the extra member
+# ALL_GENRES in which every movie counts once. Rolling up the genres selects
+# that member instead of summing over the genres, the results of get(),
+# counts() and crosstab() leave it out.
+#
+# Cubes of disjoint sets of movies are merged like cells are rolled up, so
+# build_cube() builds the cubes of shards of the movies (or of the row groups
+# of a Parquet store, see tmdb.query) on a process pool and merges them.
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from tmdb.aggregates import statistic
+
+DIMENSIONS = ['release_year', 'genre', 'budget_class', 'rating_class', 'vote_counts_class', 'runtime_class']
+
+MEASURES = ['budget', 'revenue', 'winnings', 'runtime', 'vote_average', 'vote_count']
+
+# how the statistics of the cells are combined by a roll-up or a merge:
+COMBINE = {'count': 'sum', 'sum': 'sum', 'sumsq': 'sum', 'min': 'min', 'max': 'max'}
+
+ALL_GENRES = '(all)'
+
+
+def _combine(tables, dimensions):
+    """Combine the cells of tables with the same values of dimensions, with one grouping for all statistics."""
+    wide = pd.concat({stat: table.to_frame('count') if stat == 'count' else table for stat, table in tables.items()},
+                     axis=1)
+    grouped = wide.groupby(level=dimensions, observed=True, sort=True)
+    combined = {}
+    for how in ('sum', 'min', 'max'):
+        stats = [stat for stat in tables if COMBINE[stat] == how]
+        result = getattr(grouped[[column for column in wide.columns if column[0] in stats]], how)()
+        combined.update({stat: result[stat] for stat in stats})
+    combined['count'] = combined['count']['count'].astype(np.int64)
+    return {stat: combined[stat] for stat in tables}
+
+
+class Cube:
+    """count, sum, sum of squares, min and max of the measures for every non-empty cell of the dimensions.
+
+    tables maps the statistic to a Series (count) or DataFrame (the others,
+    one column per measure), all indexed by the cells.
+    """
+
+    def __init__(self, tables, dimensions):
+        self.tables = tables
+        self.dimensions = list(dimensions)
+        self.measures = list(tables['sum'].columns)
+
+    @classmethod
+    def build(cls, df, bridges=None, dimensions=DIMENSIONS, measures=MEASURES):
+        """Build the cube of the movies of df; the genres are taken from bridges or split from their column."""
+        rows = np.arange(len(df))
+        genres = None
+        if 'genre' in dimensions:
+            from tmdb.bridges import Bridge
+            bridge = bridges['genre'] if bridges is not None and 'genre' in bridges else \
+                Bridge.from_column(df['genres'])
+            # every movie once per genre and once in ALL_GENRES:
+            rows = np.concatenate([bridge.rows, rows])
+            genres = pd.Series(np.concatenate([np.asarray(bridge.names, dtype=object)[bridge.codes],
+                                               np.full(len(df), ALL_GENRES, dtype=object)]), name='genre')
+        keys = []
+        for dimension in dimensions:
+            if dimension == 'genre':
+                keys.append(genres)
+            elif dimension in df:
+                keys.append(pd.Series(df[dimension].array.take(rows), name=dimension))
+            else:
+                raise ValueError('unknown dimension {!r}, the columns are {}'.format(dimension, list(df.columns)))
+
+        values = df[measures].to_numpy(dtype=np.float64)[rows]
+        wide = pd.DataFrame(np.hstack([values, np.square(values)]),
+                            columns=pd.MultiIndex.from_product([['sum', 'sumsq'], measures]))
+        grouped = wide.groupby(keys, observed=True, sort=True)
+        sums = grouped.sum()
+        tables = {'count': grouped.size().rename('count'),
+                  'sum': sums['sum'],
+                  'sumsq': sums['sumsq'],
+                  'min': grouped[[('sum', measure) for measure in measures]].min()['sum'],
+                  'max': grouped[[('sum', measure) for measure in measures]].max()['sum']}
+        return cls(tables, dimensions)
+
+    def __len__(self):
+        return len(self.tables['count'])
+
+    def merge(self, *others):
+        """Return the cube of the movies of this and the other cubes, which must have disjoint movies."""
+        for other in others:
+            if other.dimensions != self.dimensions or other.measures != self.measures:
+                raise ValueError('only cubes with the same dimensions and measures can be merged')
+        tables = {stat: pd.concat([self.tables[stat]] + [other.tables[stat] for other in others])
+                  for stat in self.tables}
+        return Cube(_combine(tables, self.dimensions), self.dimensions)
+
+    def _check(self, dimensions):
+        unknown = [dimension for dimension in dimensions if dimension not in self.dimensions]
+        if unknown:
+            raise ValueError('unknown dimension {}, the cube has {}'.format(', '.join(unknown),
+                                                                            ', '.join(self.dimensions)))
+
+    def rollup(self, *dimensions):
+        """Return the cube of the given dimensions, aggregated over all other dimensions."""
+        self._check(dimensions)
+        tables = self.tables
+        if 'genre' in self.dimensions and 'genre' not in dimensions:
+            genres = tables['count'].index.get_level_values('genre')
+            if len(genres) and not (genres == ALL_GENRES).any():
+                raise ValueError('a slice of several genres can not be rolled up, every movie would count once '
+                                 'per genre')
+            tables = {stat: table[genres == ALL_GENRES] for stat, table in tables.items()}
+        dimensions = [dimension for dimension in self.dimensions if dimension in dimensions]
+        if dimensions == self.dimensions:
+            return Cube(tables, dimensions)
+        if not dimensions:
+            raise ValueError('roll up to at least one dimension')
+        return Cube(_combine(tables, dimensions), dimensions)
+
+    def slice(self, **conditions):
+        """Return the cells where every dimension has the given value or one of the given values (a list).
+
+        A dimension with a single value is removed from the cube.
+        """
+        self._check(conditions)
+        index = self.tables['count'].index
+        keep = np.ones(len(index), dtype=bool)
+        for dimension, value in conditions.items():
+            values = value if isinstance(value, list) else [value]
+            keep &= index.get_level_values(dimension).isin(values)
+        tables = {stat: table[keep] for stat, table in self.tables.items()}
+        single = [dimension for dimension, value in conditions.items() if not isinstance(value, list)]
+        dimensions = [dimension for dimension in self.dimensions if dimension not in single]
+        if single and dimensions:
+            tables = {stat: table.droplevel(single) for stat, table in tables.items()}
+        return Cube(tables, dimensions)
+
+    def cells(self):
+        """Return the tables of the cells without the ALL_GENRES member."""
+        if 'genre' not in self.dimensions:
+            return self.tables
+        genres = self.tables['count'].index.get_level_values('genre')
+        return {stat: table[genres != ALL_GENRES] for stat, table in self.tables.items()}
+
+    def get(self, measure, stat='mean'):
+        """Return one statistic (see tmdb.aggregates.STATISTICS) of one measure for every cell as Series."""
+        return statistic(self.cells(), measure, stat)
+
+    def frame(self, measures, stat='mean'):
+        """Return one statistic of several measures for every cell as DataFrame."""
+        return pd.concat([self.get(measure, stat) for measure in measures], axis=1)
+
+    def counts(self):
+        """Return the number of movies in every cell, including the empty label classes."""
+        counts = self.cells()['count']
+        if len(self.dimensions) == 1 and isinstance(counts.index, pd.CategoricalIndex):
+            full = pd.CategoricalIndex(counts.index.categories, dtype=counts.index.dtype, name=self.dimensions[0])
+            counts = counts.reindex(full, fill_value=0)
+        return counts
+
+    def crosstab(self, index, columns):
+        """Return the number of movies for every pair of values of two dimensions as DataFrame."""
+        counts = self.rollup(index, columns).counts().unstack(columns, fill_value=0)
+        for axis, dimension in (('index', index), ('columns', columns)):
+            level = getattr(counts, axis)
+            if isinstance(level, pd.CategoricalIndex):
+                full = pd.CategoricalIndex(level.categories, dtype=level.dtype, name=dimension)
+                counts = counts.reindex(full, axis=axis, fill_value=0)
+        return counts.astype(np.int64)
+
+
+def _build_shard(task):
+    source, part, dimensions, measures = task
+    if isinstance(source, str):
+        import pyarrow.parquet as pq
+        columns = [column for column in dimensions if column != 'genre'] + measures
+        if 'genre' in dimensions:
+            columns.append('genres')
+        from tmdb.schema import compact
+        part = compact(pq.ParquetFile(source).read_row_groups(part, columns=columns).to_pandas())
+    return Cube.build(part, dimensions=dimensions, measures=measures)
+
+
+def build_cube(df=None, path=None, processes=None, shards=None, dimensions=DIMENSIONS, measures=MEASURES):
+    """Build the cube of the cleaned dataset df, or of the Parquet store at path, in shards and merge them.
+
+    df is split into shards (default: processes or the number of CPUs) row
+    ranges, a store into shards sets of row groups. The shards are built on
+    a process pool of processes workers, with processes=1 in this process.
+    """
+    import os
+    if shards is None:
+        shards = processes or os.cpu_count() or 1
+    if path is not None:
+        import pyarrow.parquet as pq
+        groups = np.array_split(np.arange(pq.ParquetFile(path).num_row_groups), shards)
+        tasks = [(path, list(map(int, part)), dimensions, measures) for part in groups if len(part)]
+    else:
+        columns = [column for column in dimensions if column != 'genre'] + measures
+        if 'genre' in dimensions:
+            columns.append('genres')
+        bounds = np.linspace(0, len(df), shards + 1).astype(np.int64)
+        tasks = [(None, df[columns].iloc[start:stop], dimensions, measures)
+                 for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start]
+    if not tasks:
+        raise ValueError('no movies to build a cube of')
+
+    if processes == 1 or len(tasks) == 1:
+        cubes = [_build_shard(task) for task in tasks]
+    else:
+        from tmdb.profiling import init_worker
+        with ProcessPoolExecutor(max_workers=processes, initializer=init_worker) as pool:
+            cubes = list(pool.map(_build_shard, tasks))
+    return cubes[0].merge(*cubes[1:]) if len(cubes) > 1 else cubes[0]
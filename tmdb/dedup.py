@@ -0,0 +1,184 @@
+# coding: utf-8
+
+# Deduplication of the movies by id.
+#
+# df.drop_duplicates() compares whole rows, so two rows of the same movie
+# which differ in one field (e.g. from two sources or two exports) both stay.
+# Here every row is reduced to its id, a 64 bit hash of all other columns
+# (see row_hashes) and its vote_count. Rows with the same id and
+# the same hash are exact duplicates, rows with the same id and different
+# hashes are versions of a movie in conflict. Per id one version is kept:
+#   'latest'     - the version which appears last in the data
+#   'most_votes' - the version with the highest vote_count (then the latest)
+# The kept version stays at the position of its first occurrence, so data
+# without conflicts gives the same rows in the same order as drop_duplicates().
+#
+# Only the small key arrays are needed to decide which rows to keep, so the
+# chunked mode (ChunkedDeduplicator) reads the chunks twice: once to collect
+# the keys and once to filter the rows.
+
+import numpy as np
+import pandas as pd
+
+KEEP = ['latest', 'most_votes']
+
+REPORT_COLUMNS = ['id', 'rows', 'versions', 'kept_row', 'differing_columns']
+
+
+# multiplier for combining the hashes of the columns:
+_PRIME = np.uint64(1000003)
+
+
+def column_hash(column):
+    """Return the uint64 hash of every value of a column, missing values get the hash 0.
+
+    Categorical columns hash only their categories and take the hashes by
+    code, unless there are fewer values than categories. The default
+    categorize=True of pd.util.hash_pandas_object factorizes every text
+    column first, which is slower than hashing it for mostly unique values
+    like the titles.
+    """
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        if len(column) >= len(column.cat.categories):
+            categories = pd.util.hash_array(column.cat.categories.to_numpy(dtype=object), categorize=False)
+            codes = column.cat.codes.to_numpy()
+            return np.where(codes >= 0, categories[codes], np.uint64(0))
+        column = column.astype(object)
+    if column.dtype.kind in 'OSUT' or pd.api.types.is_string_dtype(column.dtype):
+        hashes = pd.util.hash_array(column.to_numpy(dtype=object), categorize=False)
+        return np.where(column.isna().to_numpy(), np.uint64(0), hashes)
+    return pd.util.hash_pandas_object(column, index=False, categorize=False).to_numpy()
+
+
+def row_hashes(df, key='id'):
+    """Return the uint64 hash of every row over all columns except key."""
+    hashes = np.zeros(len(df), dtype=np.uint64)
+    for column in df.columns:
+        if column != key:
+            hashes = hashes * _PRIME ^ column_hash(df[column])
+    return hashes
+
+
+def _votes(df):
+    if 'vote_count' in df:
+        return df['vote_count'].to_numpy(dtype=np.int64)
+    return np.zeros(len(df), dtype=np.int64)
+
+
+def resolve(ids, hashes, votes, keep='latest'):
+    """Decide which rows to keep from the key arrays of all rows.
+
+    Only the hashes of rows whose id occurs more than once are used.
+    Returns the sorted positions of the kept rows and a DataFrame with one
+    row per conflicting id (id, rows, versions, kept_row).
+    """
+    if keep not in KEEP:
+        raise ValueError('unknown conflict resolution {!r}, use one of {}'.format(keep, ', '.join(KEEP)))
+    repeated = pd.Series(ids).duplicated(keep=False).to_numpy()
+    positions = np.flatnonzero(repeated)
+    keys = pd.DataFrame({'id': ids[positions], 'hash': hashes[positions], 'votes': votes[positions],
+                         'position': positions})
+    versions = keys.groupby(['id', 'hash'], sort=False).agg(first=('position', 'min'), last=('position', 'max'),
+                                                            votes=('votes', 'max'), rows=('position', 'size'))
+    versions = versions.reset_index()
+
+    # the kept version of an id is the last one in this order:
+    if keep == 'latest':
+        order = np.lexsort((versions['last'].to_numpy(), versions['id'].to_numpy()))
+    else:
+        order = np.lexsort((versions['last'].to_numpy(), versions['votes'].to_numpy(), versions['id'].to_numpy()))
+    versions = versions.iloc[order]
+    kept = versions.drop_duplicates('id', keep='last')
+
+    per_id = versions.groupby('id', sort=False).agg(rows=('rows', 'sum'), versions=('hash', 'size'))
+    conflicts = per_id[per_id['versions'] > 1]
+    report = conflicts.assign(kept_row=kept.set_index('id')['first'].reindex(conflicts.index)).reset_index()
+    kept_rows = np.sort(np.concatenate([np.flatnonzero(~repeated), kept['first'].to_numpy()]))
+    return kept_rows, report
+
+
+def _differing_columns(rows, report, key='id'):
+    """Add the names of the columns whose values differ between the versions of an id."""
+    if len(report) == 0:
+        return report.assign(differing_columns=pd.Series(dtype=object))
+    columns = [column for column in rows.columns if column != key]
+    hashes = pd.DataFrame({column: column_hash(rows[column]) for column in columns})
+    hashes[key] = rows[key].to_numpy()
+    differs = hashes.groupby(key).nunique() > 1
+    names = differs.apply(lambda row: [column for column in columns if row[column]], axis=1)
+    return report.assign(differing_columns=names.reindex(report[key]).to_numpy())
+
+
+def deduplicate(df, keep='latest', key='id'):
+    """Return df with one row per id and the conflict report.
+
+    The report has one row per id with different versions: the number of
+    rows and versions, the position of the kept row in df and the columns
+    whose values differ.
+    """
+    ids = df[key].to_numpy()
+    # rows with a unique id are kept anyway, only the others are hashed:
+    repeated = pd.Series(ids).duplicated(keep=False).to_numpy()
+    hashes = np.zeros(len(df), dtype=np.uint64)
+    hashes[repeated] = row_hashes(df[repeated], key)
+    positions, report = resolve(ids, hashes, _votes(df), keep)
+    conflicting = df[df[key].isin(report[key])]
+    report = _differing_columns(conflicting, report, key)[REPORT_COLUMNS]
+    return df.iloc[positions], report
+
+
+class ChunkedDeduplicator:
+    """Deduplication by id in two passes over the same chunks.
+
+    1. pass: add() every chunk, only the ids, hashes and vote counts are kept
+    2. pass: filter() every chunk in the same order to get the kept rows
+    Unlike deduplicate(), all rows are hashed, because a repeated id may
+    only show up in a later chunk.
+    The rows of conflicting ids are collected in the second pass for report().
+    """
+
+    def __init__(self, keep='latest', key='id'):
+        if keep not in KEEP:
+            raise ValueError('unknown conflict resolution {!r}, use one of {}'.format(keep, ', '.join(KEEP)))
+        self.keep = keep
+        self.key = key
+        self._keys = []
+        self._mask = None
+        self._conflicts = None
+        self._conflicting_rows = []
+        self._offset = 0
+
+    def add(self, chunk):
+        """Collect the keys of the next chunk of the first pass."""
+        if self._mask is not None:
+            raise ValueError('the rows to keep are already resolved, add() belongs to the first pass')
+        self._keys.append((chunk[self.key].to_numpy(), row_hashes(chunk, self.key), _votes(chunk)))
+
+    def _resolve(self):
+        ids, hashes, votes = (np.concatenate(arrays) for arrays in zip(*self._keys))
+        positions, self._conflicts = resolve(ids, hashes, votes, self.keep)
+        self._mask = np.zeros(len(ids), dtype=bool)
+        self._mask[positions] = True
+        self._keys = []
+
+    def filter(self, chunk):
+        """Return the kept rows of the next chunk of the second pass."""
+        if self._mask is None:
+            self._resolve()
+        mask = self._mask[self._offset:self._offset + len(chunk)]
+        if len(mask) != len(chunk):
+            raise ValueError('the second pass has more rows than the first one')
+        self._offset += len(chunk)
+        conflicting = chunk[self.key].isin(self._conflicts[self.key])
+        if conflicting.any():
+            self._conflicting_rows.append(chunk[conflicting])
+        return chunk[mask]
+
+    def report(self):
+        """Return the conflict report like deduplicate(), complete after the second pass."""
+        if self._mask is None:
+            self._resolve()
+        rows = pd.concat(self._conflicting_rows) if self._conflicting_rows else None
+        if rows is None:
+            return self._conflicts.assign(differing_columns=None)[REPORT_COLUMNS]
+        return _differing_columns(rows, self._conflicts, self.key)[REPORT_COLUMNS]
@@ -0,0 +1,81 @@
+# coding: utf-8
+
+# Binned density grids for the scatter plots of question 1.
+#
+# plt.scatter draws one marker per movie, with millions of movies it is slow
+# and the points melt into one blob. Here the points are counted in a grid
+# of bins x bins cells in one vectorized pass (np.bincount over the flat cell
+# index) and report.py draws the grid as an image, so the time to render
+# depends on the size of the grid, not on the number of movies. The most
+# extreme movies (like "The Warrior's Way") are kept separately, so they can
+# still be drawn as single points over the image.
+
+import numpy as np
+import pandas as pd
+
+# pairs of columns of the scatter plots of question 1 (x, y):
+MONEY_PAIRS = [('revenue', 'budget'), ('budget', 'winnings'), ('revenue', 'winnings')]
+
+DENSITY_BINS = 200
+
+
+def _edges(values, bins):
+    low, high = (float(values.min()), float(values.max())) if len(values) else (0.0, 1.0)
+    if high <= low:
+        high = low + 1
+    return np.linspace(low, high, bins + 1)
+
+
+def _bin(values, edges):
+    bins = len(edges) - 1
+    cells = ((values - edges[0]) / (edges[-1] - edges[0]) * bins).astype(np.int64)
+    return np.minimum(cells, bins - 1)
+
+
+def density_grid(x, y, bins=DENSITY_BINS):
+    """Count the points (x, y) in a grid of bins x bins cells of equal size.
+
+    Returns a DataFrame with the counts, the index holds the left edges of the
+    x bins and the columns the left edges of the y bins. Points with a NaN
+    coordinate are skipped.
+    """
+    x_values = np.asarray(x, dtype=np.float64)
+    y_values = np.asarray(y, dtype=np.float64)
+    valid = np.isfinite(x_values) & np.isfinite(y_values)
+    x_values, y_values = x_values[valid], y_values[valid]
+    x_edges, y_edges = _edges(x_values, bins), _edges(y_values, bins)
+    cells = _bin(x_values, x_edges) * bins + _bin(y_values, y_edges)
+    counts = np.bincount(cells, minlength=bins * bins).reshape(bins, bins)
+    return pd.DataFrame(counts, index=pd.Index(x_edges[:-1], name=getattr(x, 'name', None)),
+                        columns=pd.Index(y_edges[:-1], name=getattr(y, 'name', None)))
+
+
+def grid_extent(grid):
+    """Return (left, right, bottom, top) of a grid from density_grid(), like plt.imshow expects it."""
+    x_edges, y_edges = grid.index.to_numpy(), grid.columns.to_numpy()
+    x_width = x_edges[1] - x_edges[0] if len(x_edges) > 1 else 1
+    y_width = y_edges[1] - y_edges[0] if len(y_edges) > 1 else 1
+    return x_edges[0], x_edges[-1] + x_width, y_edges[0], y_edges[-1] + y_width
+
+
+def outliers(df, columns, k=5):
+    """Return the k movies which are the farthest from the median in any of the columns.
+
+    The distance is measured in median absolute deviations, so a few huge
+    revenues do not hide a huge loss.
+    """
+    from tmdb.topk import top_k_positions
+    score = np.zeros(len(df))
+    for column in columns:
+        values = df[column].to_numpy(dtype=np.float64)
+        median = np.nanmedian(values) if len(values) else 0
+        deviation = np.nanmedian(np.abs(values - median)) if len(values) else 0
+        score = np.fmax(score, np.abs(values - median) / (deviation or 1))
+    return df.iloc[top_k_positions(score, k)][['title'] + list(columns)]
+
+
+def money_densities(df, bins=DENSITY_BINS, k=5):
+    """Return the density grids of the MONEY_PAIRS and the k outliers, keyed like the results of question 1."""
+    results = {'density_{}_{}'.format(x, y): density_grid(df[x], df[y], bins) for x, y in MONEY_PAIRS}
+    results['money_outliers'] = outliers(df, ['budget', 'revenue', 'winnings'], k)
+    return results
@@ -0,0 +1,163 @@
+# coding: utf-8
+
+# Enrichment of the raw movies with a supplementary file.
+#
+# Instead of dropping every movie with a budget, revenue or runtime of 0
+# (about 65% of tmdb-movies.csv), the zeros and the missing values are filled
+# from a reference file (csv or Parquet) keyed by id or imdb_id:
+#   filler = JoinFiller('reference.parquet', key='imdb_id')
+#   clean(load(path, usecols=fill_columns(filler)), fill=filler)
+# The reference file is never loaded as a whole. It is read batch by batch
+# (csv chunks or Parquet record batches with only the needed columns) and
+# every batch is probed against a hash index of the keys of the movies which
+# miss a value, a partitioned hash join whose build side is the small set of
+# incomplete movies. The memory is bounded by the batch size and the matches,
+# so a reference file with 50 million rows works like a small one. If a key
+# occurs more than once in the reference file, its last row wins.
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from tmdb.api import missing_mask
+
+# columns where 0 means unknown:
+ZERO_COLUMNS = ['budget', 'revenue', 'runtime']
+
+# columns which are filled if the reference file has them:
+FILL_COLUMNS = ZERO_COLUMNS + ['director', 'cast', 'genres', 'production_companies', 'keywords', 'vote_count',
+                               'vote_average']
+
+KEYS = ['id', 'imdb_id']
+
+
+def _reference_columns(path):
+    if path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        return pq.ParquetFile(path).schema_arrow.names
+    return list(pd.read_csv(path, nrows=0).columns)
+
+
+def read_batches(path, columns, batch_size=1000000):
+    """Yield the columns of a csv or Parquet file in DataFrames of batch_size rows."""
+    if path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size, columns=columns):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, usecols=columns, chunksize=batch_size)
+
+
+def _missing_values(df, columns):
+    """Return a mask of rows x columns with the values which should be filled."""
+    missing = np.zeros((len(df), len(columns)), dtype=bool)
+    for i, column in enumerate(columns):
+        missing[:, i] = df[column].isna().to_numpy()
+        if column in ZERO_COLUMNS:
+            missing[:, i] |= df[column].to_numpy() == 0
+    return missing
+
+
+def hash_join(keys, path, key, columns, batch_size=1000000):
+    """Return the rows of the reference file whose key is in keys, indexed by the key.
+
+    keys is probed with every batch of the reference file, so only the
+    matching rows are kept in memory.
+    """
+    index = pd.Index(pd.unique(keys))
+    matches = []
+    for batch in read_batches(path, [key] + columns, batch_size):
+        found = index.get_indexer(batch[key]) >= 0
+        if found.any():
+            matches.append(batch[found])
+    if not matches:
+        return pd.DataFrame(columns=columns, index=pd.Index([], name=key))
+    matched = pd.concat(matches, ignore_index=True)
+    return matched.drop_duplicates(key, keep='last').set_index(key)
+
+
+def _fill_column(column, positions, values):
+    """Return column with the values at positions, categorical columns get new categories by code."""
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        categories = column.cat.categories
+        new = pd.Index(pd.unique(values)).difference(categories)
+        categories = categories.append(new) if len(new) else categories
+        codes = column.cat.codes.to_numpy().copy()
+        codes[positions] = categories.get_indexer(values)
+        dtype = pd.CategoricalDtype(categories, ordered=column.cat.ordered)
+        return pd.Series(pd.Categorical.from_codes(codes, dtype=dtype), index=column.index, name=column.name)
+    filled = column.to_numpy().copy()
+    filled[positions] = np.asarray(values).astype(filled.dtype)
+    return pd.Series(filled, index=column.index, name=column.name)
+
+
+def enrich(df, path, key='id', columns=None, batch_size=1000000):
+    """Fill the zeros and missing values of df from the reference file at path.
+
+    Only movies with a missing value in columns (default: FILL_COLUMNS) are
+    joined, columns which the reference file does not have are skipped.
+    Zeros are only replaced by positive values. Returns the filled DataFrame
+    and a dict with the number of incomplete and matched movies, the filled
+    values per column and the recovered movies, which had a zero budget,
+    revenue or runtime before and have none afterwards.
+    """
+    if key not in KEYS:
+        raise ValueError('unknown key {!r}, use one of {}'.format(key, ', '.join(KEYS)))
+    available = _reference_columns(path)
+    if key not in available:
+        raise ValueError('the reference file {} has no column {}'.format(path, key))
+    columns = [column for column in (FILL_COLUMNS if columns is None else columns)
+               if column in available and column in df and column != key]
+
+    missing = _missing_values(df, columns)
+    incomplete = np.flatnonzero(missing.any(axis=1) & df[key].notna().to_numpy())
+    keys = df[key].to_numpy()[incomplete]
+    reference = hash_join(keys, path, key, columns, batch_size)
+
+    stats = {'incomplete': len(incomplete), 'matched': 0, 'filled': {}, 'recovered': 0}
+    lookup = reference.index.get_indexer(keys)
+    matched = lookup >= 0
+    stats['matched'] = int(matched.sum())
+    zero_before = missing_mask(df) if set(ZERO_COLUMNS) <= set(df.columns) else None
+
+    df = df.copy()
+    for i, column in enumerate(columns):
+        rows = incomplete[matched & missing[incomplete, i]]
+        values = reference[column].to_numpy()[lookup[matched & missing[incomplete, i]]]
+        usable = ~pd.isna(values)
+        if column in ZERO_COLUMNS:
+            usable &= np.asarray(values, dtype=np.float64) > 0
+        stats['filled'][column] = int(usable.sum())
+        if usable.any():
+            df[column] = _fill_column(df[column], rows[usable], values[usable])
+    if zero_before is not None:
+        stats['recovered'] = int((zero_before & ~missing_mask(df)).sum())
+    return df, stats
+
+
+class JoinFiller:
+    """Fill the missing values from a reference file, see pipeline.clean(fill=...).
+
+    required_columns are the columns pipeline.clean() keeps until the fill,
+    imdb_id is otherwise dropped as not relevant. After a call, stats has the
+    numbers of enrich().
+    """
+
+    def __init__(self, path, key='id', columns=None, batch_size=1000000):
+        if key not in KEYS:
+            raise ValueError('unknown key {!r}, use one of {}'.format(key, ', '.join(KEYS)))
+        self.path = path
+        self.key = key
+        self.columns = columns
+        self.batch_size = batch_size
+        self.required_columns = [key]
+        self.stats = {}
+
+    def __str__(self):
+        status = os.stat(self.path)
+        return 'join {} {} {} {} {}'.format(self.path, self.key, self.columns, status.st_size, status.st_mtime_ns)
+
+    def __call__(self, df):
+        df, self.stats = enrich(df, self.path, self.key, self.columns, self.batch_size)
+        return df
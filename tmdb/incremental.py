@@ -0,0 +1,217 @@
+# coding: utf-8
+
+# Incremental updates of the cleaned dataset with the daily TMDB change sets.
+#
+# An IncrementalStore keeps the cleaned and classified movies by id together
+# with mergeable aggregates (count and sums) by release year, genre and
+# actor. apply_changes() only cleans (with pipeline.clean, so the change set
+# is deduplicated by tmdb.dedup) and classifies the changed rows, writes the
+# changed movies into their rows and updates the aggregates of the touched
+# years, genres and actors by subtracting the old and adding the new
+# contributions. The frame is only copied to add or remove movies.
+#
+# The quantile edges of the label classes are computed again only if a
+# changed value falls outside the outer edges or the movies changed since the
+# last check make up more than the tolerance of all movies; all movies are
+# classified again only if an edge moved by more than the tolerance. The
+# outer edges are moved to changed values below the smallest or above the
+# largest edge, pd.cut would not classify them.
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from tmdb import pipeline
+from tmdb.binning import apply_classes, quantile_edges
+from tmdb.bridges import LIST_COLUMNS, Bridge
+from tmdb.dedup import KEEP
+
+# measures of the mergeable aggregates:
+MEASURES = ['budget', 'revenue', 'winnings', 'runtime', 'vote_average']
+
+# aggregate key -> grouped column, the entities of tmdb.bridges are split with a Bridge:
+AGGREGATE_KEYS = {'release_year': 'release_year', 'genre': 'genres', 'actor': 'cast'}
+
+
+def clean_changes(changes, keep=pipeline.DEDUP_KEEP, conflicts=None):
+    """Apply the cleaning rules of pipeline.clean() to the changed rows only.
+
+    Returns the cleaned rows and the ids of the changed rows which are
+    dropped by the cleaning (budget, revenue or runtime of 0). Several rows
+    of an id are resolved with keep like by pipeline.clean(), the conflict
+    report is appended to the list conflicts, if one is given.
+    """
+    if keep is None:
+        raise ValueError('the rows of a change set are deduplicated by id, use keep {}'
+                         .format(' or '.join(repr(keep) for keep in KEEP)))
+    cleaned = pipeline.clean(changes, keep, conflicts=conflicts)
+    # the store keeps the text columns as plain strings, see IncrementalStore:
+    for column in cleaned.columns:
+        if isinstance(cleaned[column].dtype, pd.CategoricalDtype):
+            cleaned[column] = cleaned[column].astype(object)
+    ids = changes['id'].drop_duplicates()
+    return cleaned, ids[~ids.isin(cleaned['id'])].to_numpy()
+
+
+def contributions(df):
+    """Return the count and the sums of the MEASURES of df for every aggregate key."""
+    result = {}
+    for key, column in AGGREGATE_KEYS.items():
+        if key in LIST_COLUMNS:
+            counts, sums = Bridge.from_column(df[column]).group_sum(df, MEASURES)
+            result[key] = sums.assign(count=counts)
+        else:
+            grouped = df[MEASURES].astype(np.float64).groupby(df[column])
+            result[key] = grouped.sum().assign(count=grouped.size().astype(np.float64))
+    return result
+
+
+class IncrementalStore:
+    """The cleaned and classified dataset by id with mergeable aggregates.
+
+    The aggregates keep the years, genres and actors whose movies were all
+    removed with a count of 0, aggregate() leaves them out.
+    """
+
+    def __init__(self, df, edges=None, tolerance=0.01, keep=pipeline.DEDUP_KEEP):
+        df = df.copy()
+        for column in df.columns:
+            if isinstance(df[column].dtype, pd.CategoricalDtype) and not column.endswith('_class'):
+                df[column] = df[column].astype(object)
+        self.df = df.set_index('id', drop=False)
+        self.tolerance = tolerance
+        self.keep = keep
+        self.edges = dict(edges) if edges is not None else self.current_edges()
+        self.sums = contributions(self.df)
+        # number of movies changed since the edges were computed:
+        self.changed = 0
+
+    @classmethod
+    def from_csv(cls, path, tolerance=0.01):
+        """Build the store with a full run of load, clean and classify."""
+        return cls(pipeline.classify(pipeline.clean(pipeline.load(path))), tolerance=tolerance)
+
+    def current_edges(self):
+        """Return the class edges of the movies in the store (budget in dollars, like classify)."""
+        raw = pd.DataFrame({column: self.df[column] for column in pipeline.QUANTILE_CLASSES})
+        raw['budget'] = np.round(raw['budget'] * pipeline.MILLION)
+        edges = quantile_edges(raw, list(pipeline.QUANTILE_CLASSES))
+        edges['runtime'] = pipeline.RUNTIME_EDGES + [int(self.df['runtime'].max())]
+        return edges
+
+    def drifted(self, edges):
+        """Return True if any edge differs from the edges in use by more than the tolerance."""
+        for column, old in self.edges.items():
+            old, new = np.asarray(old, dtype=np.float64), np.asarray(edges[column], dtype=np.float64)
+            if np.any(np.abs(new - old) > self.tolerance * np.maximum(np.abs(old), 1)):
+                return True
+        return False
+
+    def _widen(self, df):
+        """Move the outer edges in use to the smallest and largest values of the cleaned rows df.
+
+        Returns True if an edge was moved.
+        """
+        widened = False
+        for column, edges in self.edges.items():
+            values = df[column].dropna()
+            if len(values) and (values.min() < edges[0] or values.max() > edges[-1]):
+                edges = list(edges)
+                edges[0], edges[-1] = min(edges[0], float(values.min())), max(edges[-1], float(values.max()))
+                self.edges[column] = edges
+                widened = True
+        return widened
+
+    def _add(self, df, sign):
+        """Add (sign 1) or subtract (sign -1) the contributions of the movies df, only their groups are touched."""
+        for key, values in contributions(df).items():
+            sums = self.sums[key]
+            # the hash table of the index finds the groups, Index.isin would scan all names:
+            positions = sums.index.get_indexer(values.index)
+            known = positions >= 0
+            sums.iloc[positions[known]] += sign * values[sums.columns].to_numpy()[known]
+            if not known.all():
+                self.sums[key] = pd.concat([sums, sign * values[~known]])
+
+    def apply_changes(self, changes, deleted_ids=(), conflicts=None):
+        """Upsert the raw changed rows and delete the deleted ids.
+
+        Returns a dict with the number of upserted and removed movies, the
+        number of conflicting ids in the change set and whether all movies
+        were classified again. The conflict report is appended to the list
+        conflicts, if one is given.
+        """
+        reports = []
+        cleaned, dropped_ids = clean_changes(changes, self.keep, reports)
+        if conflicts is not None:
+            conflicts.extend(reports)
+        widened = self._widen(cleaned)
+        classified = pipeline.classify(cleaned, edges=self.edges).set_index('id', drop=False)
+        classified = classified.astype(self.df.dtypes[classified.columns].to_dict())
+
+        known = classified.index.isin(self.df.index)
+        # an id which is deleted and upserted in the same change set stays:
+        remove = self.df.index.intersection(np.concatenate([dropped_ids, np.asarray(deleted_ids, dtype=np.int64)]))
+        remove = remove.difference(classified.index)
+        self._add(self.df.loc[np.concatenate([classified.index[known], remove])], -1)
+        self._add(classified, 1)
+        # changed movies are written into their rows, only new and removed movies copy the frame:
+        self.df.loc[classified.index[known], classified.columns] = classified[known]
+        if len(remove):
+            self.df = self.df.drop(index=remove)
+        if not known.all():
+            self.df = pd.concat([self.df, classified[~known]])
+
+        self.changed += len(classified) + len(remove)
+        reclassified = False
+        if widened or self.changed > self.tolerance * len(self.df):
+            edges = self.current_edges()
+            self.changed = 0
+            reclassified = self.drifted(edges)
+            if reclassified:
+                self.edges = edges
+                self._reclassify()
+        return {'upserted': len(classified), 'removed': len(remove), 'conflicts': len(reports[0]),
+                'reclassified': reclassified}
+
+    def _reclassify(self):
+        raw = self.df.assign(budget=np.round(self.df['budget'] * pipeline.MILLION))
+        classes = apply_classes(raw[list(pipeline.QUANTILE_CLASSES)].copy(), self.edges, pipeline.QUANTILE_CLASSES)
+        for column, (class_column, labels) in pipeline.QUANTILE_CLASSES.items():
+            self.df[class_column] = classes[class_column]
+        self.df['runtime_class'] = pd.cut(self.df['runtime'], self.edges['runtime'],
+                                          labels=pipeline.BIN_LABELS_RUNTIME, include_lowest=True)
+
+    def aggregate(self, key, stat='mean'):
+        """Return the count, sums or means of the MEASURES by release_year, genre or actor."""
+        sums = self.sums[key]
+        sums = sums[sums['count'] > 0]
+        if stat == 'count':
+            return sums['count']
+        if stat == 'sum':
+            return sums[MEASURES]
+        if stat == 'mean':
+            return sums[MEASURES].div(sums['count'], axis=0)
+        raise ValueError('unknown statistic {!r}, use count, sum or mean'.format(stat))
+
+    def frame(self):
+        """Return the cleaned and classified dataset like pipeline.classify(), sorted by id."""
+        return self.df.sort_index().reset_index(drop=True)[pipeline.COLUMNS_REORDERED]
+
+    def save(self, directory):
+        """Write the movies and the edges in use into directory (needs pyarrow)."""
+        from tmdb.cache import write_cache
+        os.makedirs(directory, exist_ok=True)
+        write_cache(self.frame(), os.path.join(directory, 'movies.feather'))
+        with open(os.path.join(directory, 'edges.json'), 'w') as f:
+            json.dump({'edges': self.edges, 'tolerance': self.tolerance}, f)
+
+    @classmethod
+    def load(cls, directory):
+        """Read a store written with save(), the aggregates are built in one pass."""
+        from tmdb.cache import read_cache
+        with open(os.path.join(directory, 'edges.json')) as f:
+            state = json.load(f)
+        return cls(read_cache(os.path.join(directory, 'movies.feather')), state['edges'], state['tolerance'])
@@ -0,0 +1,495 @@
+# coding: utf-8
+
+# Headless version of the TMDB investigation.
+#
+# The steps of the notebook are split into five functions:
+#   load -> clean -> classify -> aggregate -> render
+# Only pandas and numpy are imported at module level. Seaborn and matplotlib
+# are imported inside render(), so batch runs that only need the numbers
+# never pay for the plotting libraries.
+
+import argparse
+import os
+import sys
+
+import pandas as pd
+
+from tmdb.binning import apply_classes, quantile_edges
+from tmdb.profiling import stage
+
+
+# columns which are not relevant for the investigation (see section "Data Cleaning"):
+NOT_RELEVANT = ['imdb_id', 'popularity', 'homepage', 'tagline', 'overview', 'revenue_adj', 'budget_adj']
+
+# labels for the classes created with pd.cut:
+BIN_LABELS_RATING = ['very low', 'low', 'medium', 'high']
+BIN_LABELS_VOTING = ['not relevant', 'few', 'middle', 'many']
+BIN_LABELS_RUNTIME = ['short film', 'medium-length film', 'feature-length film', 'over-length film']
+BIN_LABELS_BUDGET = ['low', 'middle', 'higher', 'premium']
+
+# column -> (class column, labels) of the classes with quantiles as bin edges:
+QUANTILE_CLASSES = {'vote_average': ('rating_class', BIN_LABELS_RATING),
+                    'vote_count': ('vote_counts_class', BIN_LABELS_VOTING),
+                    'budget': ('budget_class', BIN_LABELS_BUDGET)}
+
+# runtime categories from source: https://de.wikipedia.org/wiki/Filml%C3%A4nge
+RUNTIME_EDGES = [0, 30, 60, 120]
+
+COLUMNS_REORDERED = ['id', 'title', 'release_year', 'release_date', 'runtime', 'runtime_class',
+                     'director', 'cast', 'genres', 'vote_average', 'rating_class', 'vote_count',
+                     'vote_counts_class', 'revenue', 'budget', 'winnings', 'budget_class',
+                     'production_companies', 'keywords']
+
+MILLION = 1000000
+
+# columns which are read from the csv-file, the not relevant ones are never parsed:
+USE_COLUMNS = ['id', 'budget', 'revenue', 'original_title', 'cast', 'director', 'keywords', 'runtime',
+               'genres', 'production_companies', 'release_date', 'vote_count', 'vote_average', 'release_year']
+
+# explicit dtypes instead of the inferred int64/float64/object.
+# budget and revenue stay int64, because revenues like Avatar's do not fit into int32.
+DTYPES = {'id': 'int32', 'budget': 'int64', 'revenue': 'int64', 'runtime': 'int16',
+          'vote_count': 'int32', 'vote_average': 'float32', 'release_year': 'int16',
+          'director': 'category', 'genres': 'category', 'production_companies': 'category',
+          'cast': 'category', 'keywords': 'category'}
+
+# release_date is stored like 6/9/15 in tmdb-movies.csv:
+DATE_FORMAT = '%m/%d/%y'
+
+# which row of a movie with several different rows is kept, see tmdb.dedup:
+DEDUP_KEEP = 'latest'
+
+
+def load(path='tmdb-movies.csv', usecols=USE_COLUMNS, dtype=DTYPES, date_format=DATE_FORMAT):
+    """Read the TMDB csv-file into a DataFrame.
+
+    Only the columns in usecols are parsed, with the given dtypes, and
+    release_date is parsed into a datetime while reading. Pass usecols=None
+    and dtype=None to get the raw file with all 21 columns. The multithreaded
+    pyarrow parser is used if pyarrow is installed, it is several times
+    faster for the typed and categorical columns than the default parser.
+    """
+    with stage('load') as record:
+        if usecols is None:
+            df = pd.read_csv(path, dtype=dtype)
+        else:
+            dtype = {column: kind for column, kind in (dtype or {}).items() if column in usecols}
+            df = pd.read_csv(path, usecols=usecols, dtype=dtype, parse_dates=['release_date'],
+                             date_format=date_format, engine=_csv_engine())
+        record['rows_out'] = len(df)
+    return df
+
+
+def _csv_engine():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return 'c'
+    return 'pyarrow'
+
+
+def _fill_categorical(column, value):
+    # rebuilding from the codes is much faster than cat.add_categories + fillna,
+    # which hashes all categories again:
+    categories = column.cat.categories
+    if value in categories:
+        code = categories.get_loc(value)
+    else:
+        code = len(categories)
+        categories = categories.append(pd.Index([value]))
+    codes = column.cat.codes.to_numpy().copy()
+    codes[codes < 0] = code
+    dtype = pd.CategoricalDtype(categories, ordered=column.cat.ordered)
+    return pd.Series(pd.Categorical.from_codes(codes, dtype=dtype), index=column.index, name=column.name)
+
+
+def fill_unknown(df):
+    """Fill the missing values with 'Unknown', also in categorical columns."""
+    for column in df.columns[df.isnull().any()]:
+        if isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = _fill_categorical(df[column], 'Unknown')
+    return df.fillna('Unknown')
+
+
+def clean(df, keep=DEDUP_KEEP, fill=None, conflicts=None):
+    """Apply the data cleaning steps of the notebook and return a new DataFrame.
+
+    Drops the not relevant columns and the duplicated rows, casts release_date
+    into a datetime, fills the missing values with 'Unknown' and removes all
+    movies with a budget, revenue or runtime of 0. Duplicates are found by id
+    and keep ('latest' or 'most_votes') decides which of several different
+    rows of a movie is kept (see tmdb.dedup); keep=None compares whole rows
+    like the notebook. fill is an optional function which takes the DataFrame
+    and returns it with some of the zeros and missing values filled from
+    another source before they are replaced or dropped, e.g. a
+    tmdb.api.APIFiller or a tmdb.enrich.JoinFiller. The not relevant columns
+    in its attribute required_columns are kept until then. The conflict report
+    of the deduplication (see tmdb.dedup.deduplicate) is appended to the
+    list conflicts, if one is given.
+    """
+    required = [column for column in getattr(fill, 'required_columns', []) if column in NOT_RELEVANT]
+    # the steps are numbered like in the notebook, each one is a stage of tmdb.profiling:
+    with stage('clean.1_drop_columns', len(df)) as record:
+        df = df.drop(columns=[column for column in NOT_RELEVANT if column not in required], errors='ignore')
+        record['rows_out'] = len(df)
+    with stage('clean.2_drop_duplicates', len(df)) as record:
+        if keep is None:
+            df = df.drop_duplicates()
+        else:
+            from tmdb.dedup import deduplicate
+            df, report = deduplicate(df, keep)
+            record['conflicts'] = len(report)
+            if conflicts is not None:
+                conflicts.append(report)
+        record['rows_out'] = len(df)
+    with stage('clean.3_release_date', len(df)) as record:
+        if not pd.api.types.is_datetime64_any_dtype(df['release_date']):
+            df['release_date'] = pd.to_datetime(df['release_date'], format=DATE_FORMAT)
+        record['rows_out'] = len(df)
+    if fill is not None:
+        with stage('clean.4_fill_missing', len(df)) as record:
+            df = fill(df).drop(columns=required)
+            record['rows_out'] = len(df)
+            record.update(getattr(fill, 'stats', {}))
+    with stage('clean.4_fill_unknown', len(df)) as record:
+        df = fill_unknown(df)
+        record['rows_out'] = len(df)
+    with stage('clean.5_drop_zero', len(df)) as record:
+        df = df.drop(df[(df.budget == 0) | (df.revenue == 0) | (df.runtime == 0)].index)
+        df = df.reset_index(drop=True)
+        record['rows_out'] = len(df)
+    return df
+
+
+def bin_edges(df, column_name):
+    """Return the 0%, 25%, 50%, 75% and 100% quantiles of a column as bin edges."""
+    return quantile_edges(df, [column_name])[column_name]
+
+
+def classify(df, edges=None):
+    """Add winnings and the four label classes, scale money to millions and reorder the columns.
+
+    edges maps the columns of QUANTILE_CLASSES to their bin edges. By default
+    all of them are computed in one pass with tmdb.binning.quantile_edges, an
+    approximation from tmdb.binning.sketch_edges can be passed instead. The
+    optional key 'runtime' replaces the runtime edges, which otherwise end at
+    the longest runtime of df.
+    """
+    with stage('clean.6_rename_and_winnings', len(df)) as record:
+        df = df.rename(columns={'original_title': 'title'})
+        df['winnings'] = df['revenue'] - df['budget']
+        record['rows_out'] = len(df)
+
+    with stage('classify', len(df)) as record:
+        if edges is None:
+            edges = quantile_edges(df, list(QUANTILE_CLASSES))
+        df = apply_classes(df, edges, QUANTILE_CLASSES)
+        runtime_edges = edges.get('runtime', RUNTIME_EDGES + [df['runtime'].max()])
+        df['runtime_class'] = pd.cut(df['runtime'], runtime_edges,
+                                     labels=BIN_LABELS_RUNTIME, include_lowest=True)
+        record['rows_out'] = len(df)
+
+    # show budget, revenue and winnings in millions:
+    with stage('clean.7_millions', len(df)) as record:
+        for column in ['budget', 'revenue', 'winnings']:
+            df[column] = df[column] / MILLION
+        record['rows_out'] = len(df)
+
+    with stage('clean.8_reorder_columns', len(df)) as record:
+        df = df.reindex(columns=COLUMNS_REORDERED)
+        record['rows_out'] = len(df)
+    return df
+
+
+def question_1(df, bridges, aggregates, actor):
+    """Budgets, revenues and winnings: top 10 lists, the means by years, the correlations and the fits.
+
+    The data of the scatter plots comes from chart_data().
+    """
+    from tmdb.density import MONEY_PAIRS
+    from tmdb.stats import correlation, pairwise_ols
+    from tmdb.topk import leaderboards
+    results = leaderboards(df, {
+        'top10_budget': {'measure': 'budget'},
+        'top10_revenue': {'measure': 'revenue'},
+        'top10_winnings': {'measure': 'winnings'},
+        'bottom10_winnings': {'measure': 'winnings', 'largest': False,
+                              'columns': ['title', 'winnings', 'budget', 'revenue']},
+    }, aggregates)
+    results['years_mean'] = aggregates.frame('release_year', ['budget', 'revenue', 'winnings'])
+    results['money_correlation'] = correlation(df, ['budget', 'revenue', 'winnings'])
+    results['money_fits'] = pairwise_ols(df, MONEY_PAIRS)
+    return results
+
+
+def question_2(df, bridges, aggregates, actor):
+    """Runtimes by years and by genres, and the distribution of the genres."""
+    results = {}
+    results['years_runtime'] = aggregates.get('release_year', 'runtime')
+    results['genres_count'] = aggregates.counts('genre')
+    results['genres_runtime'] = aggregates.get('genre', 'runtime').sort_values(ascending=False)
+    return results
+
+
+def question_3(df, bridges, aggregates, actor):
+    """Budgets, revenues and winnings by genres, and the fit of the revenue on the budget per genre."""
+    from tmdb.stats import ols
+    results = {}
+    genres_mean = aggregates.frame('genre', ['revenue', 'budget', 'winnings'])
+    results['genres_budget'] = genres_mean['budget'].sort_values(ascending=False)
+    results['genres_revenue'] = genres_mean['revenue'].sort_values(ascending=False)
+    results['genres_mean'] = genres_mean.sort_values(by=['revenue'], ascending=False)
+    results['genres_fit'] = ols(df, 'revenue', 'budget', by='genre', bridges=bridges).xs('budget', level='term')
+    return results
+
+
+def question_4_1(df, bridges, aggregates, actor):
+    """The top 10 actors and the profile of one actor."""
+    from tmdb.profiles import person_profile
+    profile = person_profile(df, actor, 'cast', bridges)
+    results = {}
+    results['top10_actors'] = bridges['actor'].counts(10)
+    results['actor_movies'] = profile['filmography']
+    results['actor_budget_classes'] = profile['budget_classes']
+    results['actor_budget_percentages'] = profile['budget_percentages']
+    results['actor_votes'] = profile['votes'][['min', 'mean', 'max']]
+    results['actor_votes_by_budget'] = profile['votes_by_budget']
+    return results
+
+
+def question_4_2_to_4_4(df, bridges, aggregates, actor):
+    """Distributions of the runtime, rating and vote count classes."""
+    results = {}
+    results['runtime_class_counts'] = aggregates.counts('runtime_class')
+    results['rating_class_counts'] = aggregates.counts('rating_class')
+    ratings_by_votes = aggregates.crosstab('vote_counts_class', 'rating_class').stack()
+    results['ratings_by_votes'] = ratings_by_votes.to_frame('title')
+    return results
+
+
+def question_4_5(df, bridges, aggregates, actor):
+    """The top 20 production companies of movies with many votes and a premium budget."""
+    many_premium = aggregates.bitmaps.mask(vote_counts_class='many', budget_class='premium')
+    return {'top20_companies_many_premium': bridges['company'].subset(many_premium).counts(20)}
+
+
+# the questions are independent of each other once the cleaned dataset exists:
+QUESTIONS = {'1': question_1, '2': question_2, '3': question_3,
+             '4.1': question_4_1, '4.2-4.4': question_4_2_to_4_4, '4.5': question_4_5}
+
+# entities of the bridge tables (see tmdb.bridges) which every question needs:
+QUESTION_ENTITIES = {'1': [], '2': ['genre'], '3': ['genre'], '4.1': ['actor'], '4.2-4.4': [], '4.5': ['company']}
+
+
+def aggregate(df, actor='Robert De Niro', bridges=None, aggregates=None, cube=None):
+    """Answer the questions of the investigation and return the results in a dict.
+
+    The keys are named after the questions, every value is a pandas object.
+    The genre, actor and company questions use the bridge tables of
+    tmdb.bridges and the grouped means come from a tmdb.aggregates.AggregateCache.
+    Both are built once if they are not given, with a tmdb.cube.Cube the
+    aggregate cache serves the groupings from the cube. See tmdb.scheduler
+    for answering the QUESTIONS in parallel.
+    """
+    from tmdb.aggregates import AggregateCache
+    from tmdb.bridges import LIST_COLUMNS, build_bridges
+    if bridges is None:
+        entities = {entity for name in QUESTIONS for entity in QUESTION_ENTITIES[name]}
+        bridges = build_bridges(df, {entity: column for entity, column in LIST_COLUMNS.items() if entity in entities})
+    if aggregates is None:
+        aggregates = AggregateCache(df, bridges, cube=cube)
+    results = {}
+    for name, question in QUESTIONS.items():
+        with stage('question.' + name, len(df)) as record:
+            answers = question(df, bridges, aggregates, actor)
+            record['rows_out'] = sum(len(value) for value in answers.values())
+        results.update(answers)
+    return results
+
+
+def chart_data(df, density=False):
+    """Return the data of the scatter plots of question 1, which is not part of the answers of aggregate().
+
+    These are the budgets, revenues and winnings of all movies, with density
+    only the density grids and the outliers of tmdb.density.
+    """
+    if density:
+        from tmdb.density import money_densities
+        return money_densities(df)
+    return {'money': df[['budget', 'revenue', 'winnings']]}
+
+
+def render(results, output_dir='figures', fmt='png', actor='Robert De Niro', processes=1, density=False):
+    """Draw the charts of the investigation and save them into output_dir.
+
+    results are the answers of aggregate() together with the chart_data()
+    of the same density. fmt is one file format or a list of them. The
+    charts are drawn by tmdb.report with the Agg backend, so no display is
+    needed; seaborn and matplotlib are only imported there. With processes
+    other than 1 they are drawn on a process pool. With density the scatter
+    plots of question 1 are drawn as density images with the outliers on
+    top. Returns the list of written files.
+    """
+    from tmdb.report import render_report
+    formats = [fmt] if isinstance(fmt, str) else list(fmt)
+    with stage('render') as record:
+        files = render_report(results, output_dir, formats=formats, actor=actor, processes=processes,
+                              density=density)
+        record['rows_out'] = len(files)
+    return files
+
+
+def fill_columns(fill):
+    """Return USE_COLUMNS and the columns which fill needs (see clean)."""
+    required = getattr(fill, 'required_columns', [])
+    return USE_COLUMNS + [column for column in required if column not in USE_COLUMNS]
+
+
+def run(path='tmdb-movies.csv', output_dir=None, fmt='png', actor='Robert De Niro', cache_dir=None,
+        processes=None, keep=DEDUP_KEEP, fill=None, density=False, cube=False, memory_budget=None,
+        conflicts=None):
+    """Run the whole investigation. Figures are only drawn if output_dir is given.
+
+    With a cache_dir the cleaned dataset is read from and written to the
+    columnar cache (see tmdb.cache). With processes the questions are answered
+    on a process pool of that size (see tmdb.scheduler) and the charts are
+    drawn on a process pool as well (see tmdb.report). keep decides which row
+    of a movie with several different rows is kept and fill fills missing
+    numbers from another source (see clean), the conflict report of the
+    deduplication is appended to the list conflicts. density is passed to render.
+    With cube the yearly, genre and class aggregates are served from an OLAP
+    cube built in shards (see tmdb.cube). The memory of the cleaned dataset is
+    recorded as stage 'memory', with memory_budget (bytes) a
+    tmdb.schema.MemoryBudgetError is raised if it needs more.
+    """
+    if cache_dir is not None:
+        from tmdb.cache import load_cleaned
+        df = load_cleaned(path, cache_dir, keep, fill, conflicts)
+    else:
+        df = classify(clean(load(path, usecols=fill_columns(fill)), keep, fill, conflicts))
+    with stage('memory', len(df)) as record:
+        from tmdb.schema import check_memory_budget, memory_usage
+        record['memory_bytes'] = int(memory_usage(df).sum())
+        record['rows_out'] = len(df)
+        if memory_budget is not None:
+            check_memory_budget(df, memory_budget)
+    if cube:
+        from tmdb.cube import build_cube
+        with stage('cube', len(df)) as record:
+            cube = build_cube(df, processes=1 if processes is None else processes)
+            record['rows_out'] = len(cube)
+    else:
+        cube = None
+    if processes is not None:
+        from tmdb.scheduler import run_parallel
+        # the stages inside the worker processes are not recorded, only the whole pool:
+        with stage('question.parallel', len(df)) as record:
+            results = run_parallel(df, actor=actor, processes=processes, cube=cube)
+            record['rows_out'] = len(results)
+    else:
+        results = aggregate(df, actor=actor, cube=cube)
+    if output_dir is not None:
+        results.update(chart_data(df, density))
+        results['figures'] = render(results, output_dir, fmt=fmt, actor=actor,
+                                    processes=1 if processes is None else processes, density=density)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='tmdb', description='Investigate The Movie Database (TMDB) data.')
+    parser.add_argument('csv', nargs='?', default='tmdb-movies.csv', help='path to tmdb-movies.csv')
+    parser.add_argument('--figures', metavar='DIR', help='render all charts into DIR (needs matplotlib and seaborn)')
+    parser.add_argument('--format', nargs='+', default=['png'], choices=['png', 'svg', 'pdf'],
+                        help='file formats of the charts')
+    parser.add_argument('--density', action='store_true',
+                        help='draw the scatter plots of question 1 as density images, for millions of movies')
+    parser.add_argument('--cube', action='store_true',
+                        help='serve the yearly, genre and class aggregates from an OLAP cube built in shards')
+    parser.add_argument('--actor', default='Robert De Niro', help='actor for the bonus question 4.1')
+    parser.add_argument('--cache', metavar='DIR', help='cache the cleaned dataset in DIR (needs pyarrow)')
+    parser.add_argument('--stream', metavar='PARQUET', help='only clean and classify the csv-file chunk by chunk '
+                                                            'into PARQUET, for files larger than the memory')
+    parser.add_argument('--chunksize', type=int, default=100000, help='rows per chunk for --stream')
+    parser.add_argument('--processes', type=int, metavar='N', help='answer the questions on N worker processes')
+    parser.add_argument('--memory-budget', type=float, metavar='MIB',
+                        help='stop if the cleaned dataset needs more than MIB mebibytes')
+    parser.add_argument('--dedup', default=DEDUP_KEEP, choices=['latest', 'most_votes'],
+                        help='which of several different rows with the same id is kept')
+    parser.add_argument('--conflicts', metavar='CSV', help='write the ids with different rows into CSV')
+    # both fill the same missing numbers, only one source can be used:
+    sources = parser.add_mutually_exclusive_group()
+    sources.add_argument('--api', metavar='URL', nargs='?', const='https://api.themoviedb.org/3',
+                         help='fill missing budgets, revenues and runtimes from the TMDB API (or a stand-in at URL, '
+                              'see tmdb.api_server) before they are dropped, the key is read from TMDB_API_KEY')
+    parser.add_argument('--api-cache', metavar='DIR', default='.tmdb_api_cache', help='cache of the API answers')
+    parser.add_argument('--api-rate', metavar='N', type=float, default=40,
+                        help='at most N requests per second to the API (default: %(default)s, below the limit of '
+                             'TMDB; raise it for a local stand-in)')
+    parser.add_argument('--api-concurrency', metavar='N', type=int, default=8,
+                        help='at most N requests at the same time (default: %(default)s)')
+    sources.add_argument('--enrich', metavar='FILE', help='fill zeros and missing values from a csv or Parquet file '
+                                                          'keyed by id or imdb_id before they are dropped')
+    parser.add_argument('--enrich-key', default='id', choices=['id', 'imdb_id'], help='key column of --enrich')
+    parser.add_argument('--trace', metavar='JSON', help='write the time, rows and memory of every stage as Chrome '
+                                                        'trace into JSON (open it in chrome://tracing or Perfetto)')
+    parser.add_argument('--profile', metavar='DIR', help='profile every stage with cProfile into DIR/<stage>.prof')
+    args = parser.parse_args(argv)
+    if args.api_rate <= 0 or args.api_concurrency < 1:
+        parser.error('--api-rate and --api-concurrency must be positive')
+
+    if args.trace or args.profile:
+        from tmdb.profiling import ChromeTraceHook, Profiler
+        hooks = [ChromeTraceHook(args.trace)] if args.trace else []
+        with Profiler(hooks, cprofile_dir=args.profile):
+            return _main(args)
+    return _main(args)
+
+
+def _main(args):
+
+    if args.stream:
+        from tmdb.streaming import stream_pipeline
+        stats = stream_pipeline(args.csv, args.stream, chunksize=args.chunksize, keep=args.dedup)
+        print('{} rows read, {} duplicated ids, {} ids with different rows, {} rows written to {}'.format(
+            stats['rows_in'], stats['duplicates'], len(stats['conflicts']), stats['rows_out'], args.stream))
+        if args.conflicts:
+            stats['conflicts'].to_csv(args.conflicts, index=False)
+        return 0
+
+    fill = None
+    if args.api:
+        from tmdb.api import APIFiller
+        fill = APIFiller(base_url=args.api, api_key=os.environ.get('TMDB_API_KEY'), cache_dir=args.api_cache,
+                         rate=args.api_rate, concurrency=args.api_concurrency)
+    if args.enrich:
+        from tmdb.enrich import JoinFiller
+        fill = JoinFiller(args.enrich, key=args.enrich_key)
+    from tmdb.schema import MemoryBudgetError
+    memory_budget = None if args.memory_budget is None else int(args.memory_budget * 2 ** 20)
+    conflicts = []
+    try:
+        results = run(args.csv, output_dir=args.figures, fmt=args.format, actor=args.actor, cache_dir=args.cache,
+                      processes=args.processes, keep=args.dedup, fill=fill, density=args.density,
+                      cube=args.cube, memory_budget=memory_budget, conflicts=conflicts)
+    except MemoryBudgetError as error:
+        print('tmdb: {}'.format(error), file=sys.stderr)
+        return 1
+    if args.conflicts:
+        conflicts[0].to_csv(args.conflicts, index=False)
+    if args.api and fill.stats:
+        print('{requested} movies with missing numbers requested, {found} found, {failed} failed, {recovered} '
+              'recovered\n'.format(**fill.stats))
+    if args.enrich and fill.stats:
+        print('{incomplete} incomplete movies, {matched} found in {file}, {recovered} recovered\n'
+              .format(file=args.enrich, **fill.stats))
+    for key, value in results.items():
+        if key in ('money', 'money_outliers', 'actor_movies', 'figures') or key.startswith('density_'):
+            continue
+        print('{}:\n{}\n'.format(key, value))
+    if 'figures' in results:
+        print('{} files written to {}, unchanged charts were skipped'.format(len(results['figures']), args.figures))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
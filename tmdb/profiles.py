@@ -0,0 +1,52 @@
+# coding: utf-8
+
+# Profiles of actors and directors, like the one of Robert De Niro in the
+# bonus question 4.1 of the investigation.
+#
+# The movies of a person are looked up in the inverted index of the bridge
+# tables (see tmdb.bridges), so a profile costs O(number of his movies) and
+# not a scan over all movies. Build the bridges once and pass them to every
+# call when serving many profiles; without the bridge of the role only that
+# one is built.
+
+import numpy as np
+
+from tmdb.bridges import LIST_COLUMNS, build_bridges
+from tmdb.pipeline import BIN_LABELS_BUDGET
+
+# role -> entity of the bridge tables:
+ROLES = {'cast': 'actor', 'director': 'director'}
+
+FILMOGRAPHY_COLUMNS = ['id', 'title', 'release_date', 'budget', 'budget_class', 'vote_average']
+
+
+def person_movies(df, name, bridge):
+    """Return all movies where name is linked in the bridge once each, in the order of df."""
+    return df.iloc[np.unique(bridge.rows_of(name))]
+
+
+def person_profile(df, name, role='cast', bridges=None):
+    """Return the profile of an actor (role='cast') or a director (role='director').
+
+    The profile is a dict with the filmography, the number and the percentage
+    of movies in each budget class, the min/mean/max of the average votes and
+    the mean average votes by budget class. bridges may lack the bridge of
+    the role, then it is built from df.
+    """
+    if role not in ROLES:
+        raise ValueError('unknown role {!r}, use one of {}'.format(role, list(ROLES)))
+    entity = ROLES[role]
+    if bridges is None or entity not in bridges:
+        bridges = build_bridges(df, {entity: LIST_COLUMNS[entity]})
+
+    movies = person_movies(df, name, bridges[entity])
+    budget_classes = movies['budget_class'].value_counts().reindex(BIN_LABELS_BUDGET, fill_value=0)
+    return {
+        'name': name,
+        'role': role,
+        'filmography': movies[[column for column in FILMOGRAPHY_COLUMNS if column in movies]],
+        'budget_classes': budget_classes,
+        'budget_percentages': (budget_classes * 100 / max(len(movies), 1)).round(2),
+        'votes': movies['vote_average'].agg(['count', 'min', 'mean', 'max']),
+        'votes_by_budget': movies.groupby('budget_class', observed=False)['vote_average'].mean(),
+    }
@@ -0,0 +1,194 @@
+# coding: utf-8
+
+# Per-stage instrumentation of the pipeline.
+#
+# The stages of the pipeline (load, the eight numbered cleaning steps of the
+# notebook, the classification, the bridge tables and every question) are
+# wrapped in stage(). Without an active Profiler this costs nothing. Inside
+#   with Profiler(hooks=[ChromeTraceHook('trace.json')]):
+#       run('tmdb-movies.csv')
+# every stage is measured (wall time, CPU time, rows in and out, peak RSS)
+# and the record is passed to all hooks. On Linux the high-water mark of the
+# RSS is reset at the start of every stage (/proc/self/clear_refs), so the
+# peak is the one of the stage and not of the process so far; elsewhere only
+# the growth of the process peak during the stage is known. A hook is any callable taking the
+# record dict; if it has a close() method, it is called at the end.
+# With cprofile_dir every stage is also profiled with cProfile and written
+# as <stage>.prof, which snakeviz, gprof2dot or pstats can read.
+# Worker processes of a pool must not record into the profilers they
+# inherited from their parent, their initializers run through init_worker().
+
+import contextlib
+import cProfile
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+# stack of the active profilers, the innermost one records:
+_active = []
+
+
+def init_worker(initializer=None, *args):
+    """Initializer of a pool worker: stop the profilers inherited by fork, then call initializer(*args)."""
+    _active.clear()
+    if initializer is not None:
+        initializer(*args)
+
+
+def peak_rss():
+    """Return the peak resident set size of this process in bytes, or None if unknown."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere:
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _high_water_mark():
+    """Return the peak RSS since the last reset_peak_rss() in bytes (Linux only, else None)."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def reset_peak_rss():
+    """Reset the peak RSS of this process to the current RSS, return False if that is not possible."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        return False
+    return True
+
+
+class Profiler:
+    """Collects a record for every stage and passes it to the hooks."""
+
+    def __init__(self, hooks=(), cprofile_dir=None):
+        self.hooks = list(hooks)
+        self.cprofile_dir = cprofile_dir
+        self.records = []
+        # peak RSS of every open stage, from its start until the last reset:
+        self._peaks = []
+
+    def __enter__(self):
+        _active.append(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        _active.remove(self)
+        for hook in self.hooks:
+            if hasattr(hook, 'close'):
+                hook.close()
+        return False
+
+    @contextlib.contextmanager
+    def stage(self, name, rows_in=None):
+        """Measure the stage name, set record['rows_out'] inside the with-block."""
+        record = {'stage': name, 'rows_in': rows_in, 'rows_out': None, 'pid': os.getpid(),
+                  'thread': threading.get_ident(), 'start': time.time()}
+        profile = None
+        if self.cprofile_dir is not None:
+            profile = cProfile.Profile()
+            profile.enable()
+        mark = _high_water_mark()
+        self._peaks = [_max(peak, mark) for peak in self._peaks]
+        resettable = reset_peak_rss()
+        self._peaks.append(_high_water_mark() if resettable else None)
+        start_peak = None if resettable else peak_rss()
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield record
+        finally:
+            record['wall_s'] = time.perf_counter() - wall
+            record['cpu_s'] = time.process_time() - cpu
+            # the peak of an inner stage is part of the peaks of the outer ones:
+            peak = self._peaks.pop()
+            if peak is not None:
+                peak = _max(peak, _high_water_mark())
+                self._peaks = [_max(outer, peak) for outer in self._peaks]
+            record['peak_rss_bytes'] = peak
+            if start_peak is not None:
+                # without a reset only the growth of the peak of the process is known:
+                record['peak_rss_growth_bytes'] = peak_rss() - start_peak
+            if profile is not None:
+                profile.disable()
+                os.makedirs(self.cprofile_dir, exist_ok=True)
+                path = os.path.join(self.cprofile_dir, '{}.prof'.format(name))
+                profile.dump_stats(path)
+                record['cprofile'] = path
+            self.records.append(record)
+            for hook in self.hooks:
+                hook(record)
+
+
+def _max(a, b):
+    return a if b is None else b if a is None else max(a, b)
+
+
+@contextlib.contextmanager
+def stage(name, rows_in=None):
+    """Measure a stage with the active Profiler, or do nothing if there is none."""
+    if not _active:
+        yield {}
+        return
+    with _active[-1].stage(name, rows_in) as record:
+        yield record
+
+
+class JSONLinesHook:
+    """Write every record as one line of JSON to a file."""
+
+    def __init__(self, path):
+        self.file = open(path, 'a')
+
+    def __call__(self, record):
+        self.file.write(json.dumps(record) + '\n')
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class LoggingHook:
+    """Log every record with the standard logging module."""
+
+    def __init__(self, logger=None, level=logging.INFO):
+        self.logger = logger or logging.getLogger('tmdb.profiling')
+        self.level = level
+
+    def __call__(self, record):
+        self.logger.log(self.level, '%s: %.3fs wall, %.3fs cpu, rows %s -> %s', record['stage'],
+                        record['wall_s'], record['cpu_s'], record['rows_in'], record['rows_out'])
+
+
+class ChromeTraceHook:
+    """Write all records as Chrome trace (chrome://tracing, Perfetto) when the profiler ends."""
+
+    def __init__(self, path):
+        self.path = path
+        self.events = []
+
+    def __call__(self, record):
+        args = {key: value for key, value in record.items()
+                if key not in ('stage', 'pid', 'thread', 'start', 'wall_s')}
+        self.events.append({'name': record['stage'], 'cat': record['stage'].split('.')[0], 'ph': 'X',
+                            'ts': record['start'] * 1e6, 'dur': record['wall_s'] * 1e6,
+                            'pid': record['pid'], 'tid': record['thread'], 'args': args})
+
+    def close(self):
+        with open(self.path, 'w') as f:
+            json.dump({'traceEvents': self.events, 'displayTimeUnit': 'ms'}, f)
@@ -0,0 +1,299 @@
+# coding: utf-8
+
+# Queries of the cleaned dataset in a Parquet store with predicate pushdown.
+#
+# Question 4.5 and the ad-hoc segment questions of the analysts filter the
+# movies by label classes, years and numeric ranges, like
+#   vote_counts_class == "many" & budget_class == "premium" & release_year >= 2000
+# Instead of loading the whole dataset, a Store answers such a query from a
+# Parquet file (written by write_store() or by --stream):
+#   - the expression is parsed with ast into comparisons of a column with
+#     constants combined with & | ~ (or and, or, not); negations are pushed
+#     down to the comparisons
+#   - every row group whose min/max statistics can not satisfy the predicate
+#     is skipped, the labels are compared in the order of their classes
+#   - only the columns of the predicate and the requested columns are read,
+#     the predicate is evaluated with pyarrow.compute and only the matching
+#     rows are converted to pandas
+# write_store() sorts the movies by budget class, vote count class and year,
+# so the row groups of one segment are next to each other and the
+# statistics skip most of them. Needs pyarrow.
+
+import argparse
+import ast
+import io
+import operator
+import sys
+import tokenize
+
+import pandas as pd
+
+from tmdb.schema import LABEL_DTYPES
+
+# order of the movies in a store, the first columns prune best:
+SORT_COLUMNS = ['budget_class', 'vote_counts_class', 'release_year']
+
+ROW_GROUP_SIZE = 1 << 14
+
+_COMPARISONS = {ast.Eq: '==', ast.NotEq: '!=', ast.Lt: '<', ast.LtE: '<=', ast.Gt: '>', ast.GtE: '>=',
+                ast.In: 'in', ast.NotIn: 'not in'}
+_NEGATED = {'==': '!=', '!=': '==', '<': '>=', '<=': '>', '>': '<=', '>=': '<', 'in': 'not in', 'not in': 'in'}
+# the operator if the column is on the right side, 2000 <= release_year:
+_MIRRORED = {'==': '==', '!=': '!=', '<': '>', '<=': '>=', '>': '<', '>=': '<='}
+# & | ~ bind weaker than the comparisons, like in df.query():
+_LOGICAL = {'&': 'and', '|': 'or', '~': 'not'}
+_OPERATORS = {'==': operator.eq, '!=': operator.ne, '<': operator.lt, '<=': operator.le, '>': operator.gt,
+              '>=': operator.ge}
+
+
+# expressions:
+
+def _constant(node, expression):
+    if isinstance(node, ast.Constant) and not isinstance(node.value, bytes):
+        return node.value
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub) and isinstance(node.operand, ast.Constant):
+        if isinstance(node.operand.value, bool) or not isinstance(node.operand.value, (int, float)):
+            raise ValueError('only numbers can be negated in {!r}'.format(expression))
+        return -node.operand.value
+    if isinstance(node, (ast.List, ast.Tuple, ast.Set)):
+        return [_constant(element, expression) for element in node.elts]
+    raise ValueError('only constants can be compared with a column in {!r}'.format(expression))
+
+
+def _comparison(left, op, right, expression):
+    if isinstance(left, ast.Name) and not isinstance(right, ast.Name):
+        column, value = left.id, _constant(right, expression)
+    elif isinstance(right, ast.Name) and not isinstance(left, ast.Name) and op in _MIRRORED:
+        column, value, op = right.id, _constant(left, expression), _MIRRORED[op]
+    else:
+        raise ValueError('every comparison needs one column and one constant in {!r}'.format(expression))
+    if (op in ('in', 'not in')) != isinstance(value, list):
+        raise ValueError('in and not in need a list, the other comparisons a single value in {!r}'
+                         .format(expression))
+    return ('cmp', column, op, value)
+
+
+def negate(node):
+    """Return the negation of a parsed predicate, with the not pushed down to the comparisons."""
+    if node[0] == 'cmp':
+        return ('cmp', node[1], _NEGATED[node[2]], node[3])
+    return ('or' if node[0] == 'and' else 'and', [negate(child) for child in node[1]])
+
+
+def _predicate(node, expression):
+    if isinstance(node, ast.BoolOp):
+        kind = 'and' if isinstance(node.op, ast.And) else 'or'
+        return (kind, [_predicate(value, expression) for value in node.values])
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+        return negate(_predicate(node.operand, expression))
+    if isinstance(node, ast.Compare):
+        operands = [node.left] + node.comparators
+        parts = [_comparison(operands[i], _COMPARISONS[type(op)], operands[i + 1], expression)
+                 for i, op in enumerate(node.ops)]
+        return parts[0] if len(parts) == 1 else ('and', parts)
+    raise ValueError('unsupported expression {!r}, use comparisons of columns with constants and & | ~'
+                     .format(expression))
+
+
+def parse(expression):
+    """Parse a filter expression like df.query() takes it into a predicate tree.
+
+    The tree consists of ('and', [...]), ('or', [...]) and
+    ('cmp', column, op, value) with op one of == != < <= > >= in, not in.
+    """
+    try:
+        tokens = [(tokenize.NAME, _LOGICAL[token.string]) if token.string in _LOGICAL else token[:2]
+                  for token in tokenize.generate_tokens(io.StringIO(expression.strip()).readline)]
+        tree = ast.parse(tokenize.untokenize(tokens), mode='eval')
+    except (SyntaxError, tokenize.TokenError) as error:
+        raise ValueError('invalid expression {!r}: {}'.format(expression, error.args[0])) from None
+    return _predicate(tree.body, expression)
+
+
+def predicate_columns(node):
+    """Return the columns used in a predicate tree, in the order of their first use."""
+    if node[0] == 'cmp':
+        return [node[1]]
+    columns = []
+    for child in node[1]:
+        columns += [column for column in predicate_columns(child) if column not in columns]
+    return columns
+
+
+def class_labels(column, op, value):
+    """Return the labels of a class column which satisfy column op value."""
+    labels = list(LABEL_DTYPES[column].categories)
+    values = value if isinstance(value, list) else [value]
+    unknown = [label for label in values if label not in labels]
+    if unknown:
+        raise ValueError('unknown {} {}, the classes are {}'.format(column, ', '.join(map(repr, unknown)),
+                                                                    ', '.join(labels)))
+    if op in ('in', 'not in'):
+        return [label for label in labels if (label in values) == (op == 'in')]
+    position = labels.index(value)
+    return [label for i, label in enumerate(labels) if _OPERATORS[op](i, position)]
+
+
+# pruning and evaluation:
+
+def _may_match(node, statistics):
+    """Return False if no row with the min/max statistics {column: (min, max)} can satisfy the predicate."""
+    if node[0] == 'and':
+        return all(_may_match(child, statistics) for child in node[1])
+    if node[0] == 'or':
+        return any(_may_match(child, statistics) for child in node[1])
+    _, column, op, value = node
+    if column not in statistics:
+        return True
+    low, high = statistics[column]
+    try:
+        if column in LABEL_DTYPES:
+            # the statistics of the labels are the smallest and largest strings:
+            return any(low <= label <= high for label in class_labels(column, op, value))
+        if op == '==':
+            return low <= value <= high
+        if op == '!=':
+            return not low == high == value
+        if op in ('<', '<='):
+            return _OPERATORS[op](low, value)
+        if op in ('>', '>='):
+            return _OPERATORS[op](high, value)
+        if op == 'in':
+            return any(low <= element <= high for element in value)
+        return not (low == high and low in value)
+    except TypeError:
+        return True
+
+
+def _expression(node):
+    """Return the pyarrow.compute expression of a predicate tree."""
+    import pyarrow.compute as pc
+    if node[0] in ('and', 'or'):
+        children = [_expression(child) for child in node[1]]
+        combined = children[0]
+        for child in children[1:]:
+            combined = combined & child if node[0] == 'and' else combined | child
+        return combined
+    _, column, op, value = node
+    field = pc.field(column)
+    if column in LABEL_DTYPES:
+        return field.isin(class_labels(column, op, value))
+    if op == 'in':
+        return field.isin(value)
+    if op == 'not in':
+        return ~field.isin(value)
+    return _OPERATORS[op](field, value)
+
+
+class Store:
+    """A Parquet file of the cleaned dataset which answers filter queries with predicate pushdown.
+
+    The min/max statistics of all row groups are read once from the footer.
+    """
+
+    def __init__(self, path):
+        import pyarrow.parquet as pq
+        self.path = path
+        self.file = pq.ParquetFile(path)
+        self.columns = self.file.schema_arrow.names
+        self.num_rows = self.file.metadata.num_rows
+        self.statistics = [self._row_group_statistics(i) for i in range(self.file.num_row_groups)]
+
+    def _row_group_statistics(self, i):
+        row_group = self.file.metadata.row_group(i)
+        statistics = {}
+        for j in range(row_group.num_columns):
+            column = row_group.column(j)
+            if column.statistics is not None and column.statistics.has_min_max:
+                statistics[column.path_in_schema] = (column.statistics.min, column.statistics.max)
+        return statistics
+
+    def _check(self, columns):
+        unknown = [column for column in columns if column not in self.columns]
+        if unknown:
+            raise ValueError('unknown column {}, the store has {}'.format(', '.join(unknown),
+                                                                          ', '.join(self.columns)))
+
+    def plan(self, where=None, columns=None):
+        """Return the predicate, the row groups and the columns which a query has to read."""
+        predicate = parse(where) if isinstance(where, str) else where
+        columns = list(self.columns if columns is None else columns)
+        needed = list(columns)
+        if predicate is not None:
+            needed += [column for column in predicate_columns(predicate) if column not in needed]
+        self._check(needed)
+        row_groups = [i for i, statistics in enumerate(self.statistics)
+                      if predicate is None or _may_match(predicate, statistics)]
+        return {'predicate': predicate, 'row_groups': row_groups, 'columns': columns, 'read': needed}
+
+    def _read(self, plan):
+        table = self.file.read_row_groups(plan['row_groups'], columns=plan['read'])
+        if plan['predicate'] is not None:
+            table = table.filter(_expression(plan['predicate']))
+        return table
+
+    def select(self, where=None, columns=None):
+        """Return the movies which satisfy the expression where, with the given columns (default: all)."""
+        from tmdb.schema import compact
+        plan = self.plan(where, columns)
+        if not plan['row_groups']:
+            return compact(self.file.schema_arrow.empty_table().select(plan['columns']).to_pandas())
+        return compact(self._read(plan).select(plan['columns']).to_pandas())
+
+    def count(self, where=None):
+        """Return the number of movies which satisfy the expression where."""
+        plan = self.plan(where, columns=[])
+        if plan['predicate'] is None:
+            return self.num_rows
+        return self._read(plan).num_rows if plan['row_groups'] else 0
+
+    def explain(self, where=None, columns=None):
+        """Describe which row groups and columns a query reads."""
+        plan = self.plan(where, columns)
+        return '{} of {} row groups, columns {}'.format(len(plan['row_groups']), len(self.statistics),
+                                                        ', '.join(plan['read']))
+
+
+def write_store(df, path, row_group_size=ROW_GROUP_SIZE, sort=SORT_COLUMNS):
+    """Write the cleaned and classified dataset as a Parquet store sorted by the columns sort."""
+    import os
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    sort = [column for column in sort if column in df]
+    if sort:
+        df = df.sort_values(sort, kind='stable')
+    tmp_path = path + '.tmp'
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), tmp_path, row_group_size=row_group_size)
+    os.replace(tmp_path, path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='tmdb.query', description='Filter the cleaned movies of a store.')
+    parser.add_argument('source', help='Parquet store, or csv-file whose store is built in --cache')
+    parser.add_argument('where', nargs='?', help='filter like vote_counts_class == "many" & budget_class == '
+                                                 '"premium"')
+    parser.add_argument('--columns', help='comma separated columns of the result (default: all)')
+    parser.add_argument('--count', action='store_true', help='only print the number of movies')
+    parser.add_argument('--cache', metavar='DIR', default='.tmdb_cache', help='cache of the store of a csv-file')
+    args = parser.parse_args(argv)
+
+    if args.source.endswith('.csv'):
+        from tmdb.cache import load_store
+        store = load_store(args.source, args.cache)
+    else:
+        store = Store(args.source)
+    columns = args.columns.split(',') if args.columns else None
+    try:
+        print(store.explain(args.where, [] if args.count else columns))
+        if args.count:
+            print(store.count(args.where))
+        else:
+            with pd.option_context('display.width', 200, 'display.max_columns', 20):
+                print(store.select(args.where, columns))
+    except ValueError as error:
+        parser.error(str(error))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,352 @@
+# coding: utf-8
+
+# Rendering of the charts of the investigation.
+#
+# Every chart is a small function which draws one figure from the results of
+# pipeline.aggregate(). render_report() draws them with the Agg backend in
+# worker processes and saves each one in all requested formats. With
+# density=True the scatter plots of question 1 are drawn as binned density
+# images (see tmdb.density) instead of one marker per movie. A manifest
+# in the output directory remembers a hash of the data of every chart, so
+# charts whose data has not changed since the last render are skipped.
+
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+MANIFEST = '.manifest.json'
+# increase to render all charts again, for example after changing their style:
+CHARTS_VERSION = 1
+
+
+def _add_value_label(plt, y_list):
+    for i in range(len(y_list)):
+        plt.text(i, y_list.iloc[i], y_list.iloc[i], ha='center')
+
+
+# question 1:
+
+def years_budget_revenue_winnings(plt, results, actor):
+    years = results['years_mean']
+    x_axis = np.arange(years.index.min(), years.index.max() + 1, 5)
+    years['budget'].plot(color='black', xticks=x_axis, figsize=(16, 6))
+    years['revenue'].plot(color='blue')
+    years['winnings'].plot(color='green')
+    plt.title('Average budgets, revenues and winnings by years', fontsize=15)
+    plt.xlabel('Years', fontsize=15)
+    plt.ylabel('Average amount [millions]', fontsize=15)
+    plt.legend()
+
+
+def _money_scatter(x, y):
+    def chart(plt, results, actor):
+        money = results['money']
+        plt.figure(figsize=(7, 7))
+        plt.scatter(money[x], money[y], color='blue', alpha=0.5)
+        plt.title('Comparison of {}s & {}'.format(x, y), fontsize=15)
+        plt.xlabel('{} [million]'.format(x.capitalize()), fontsize=12)
+        plt.ylabel('{} [million]'.format(y.capitalize()), fontsize=12)
+    return chart
+
+
+def _money_density(x, y):
+    def chart(plt, results, actor):
+        from tmdb.density import grid_extent
+        grid = results['density_{}_{}'.format(x, y)]
+        plt.figure(figsize=(7, 7))
+        plt.imshow(np.log1p(grid.to_numpy().T), origin='lower', extent=grid_extent(grid), aspect='auto',
+                   cmap='Blues', interpolation='nearest')
+        plt.colorbar(label='Movies per cell [log(1 + count)]')
+        plt.grid(False)
+        outliers = results.get('money_outliers')
+        if outliers is not None:
+            plt.scatter(outliers[x], outliers[y], color='red', s=12)
+            for _, movie in outliers.iterrows():
+                plt.annotate(movie['title'], (movie[x], movie[y]), fontsize=8, xytext=(4, 4),
+                             textcoords='offset points')
+        plt.title('Comparison of {}s & {}'.format(x, y), fontsize=15)
+        plt.xlabel('{} [million]'.format(x.capitalize()), fontsize=12)
+        plt.ylabel('{} [million]'.format(y.capitalize()), fontsize=12)
+    return chart
+
+
+# question 2:
+
+def years_runtime(plt, results, actor):
+    runtime = results['years_runtime']
+    x_axis = np.arange(runtime.index.min(), runtime.index.max() + 1, 5)
+    runtime.plot(kind='line', xticks=x_axis, figsize=(16, 6))
+    plt.title('The mean runtime of movies by years', fontsize=15)
+    plt.xlabel('Years', fontsize=12)
+    plt.ylabel('Runtime [minutes]', fontsize=12)
+
+
+def genres_count(plt, results, actor):
+    results['genres_count'].sort_values(ascending=False).plot(kind='bar', figsize=(16, 8))
+    plt.title('The counted values of genres regarding to the movies', fontsize=15)
+    plt.xlabel('Genres', fontsize=12)
+    plt.ylabel('Amount', fontsize=12)
+
+
+def _genres_bar(key, title, ylabel):
+    def chart(plt, results, actor):
+        results[key].plot(kind='bar', figsize=(16, 8))
+        plt.title(title, fontsize=15)
+        plt.xlabel('Genres', fontsize=12)
+        plt.ylabel(ylabel, fontsize=12)
+    return chart
+
+
+# question 3:
+
+def genres_revenue_budget(plt, results, actor):
+    genres_mean = results['genres_mean']
+    genres_mean['revenue'].plot(kind='bar', alpha=0.7, color='black', label='Revenue', figsize=(16, 8))
+    genres_mean['budget'].plot(kind='bar', alpha=0.6, color='red', label='Budget', figsize=(16, 8))
+    plt.title('The revenues and budgets of movies by genres', fontsize=15)
+    plt.xlabel('Genres', fontsize=12)
+    plt.ylabel('Revenues and budgets [millions]', fontsize=12)
+    plt.legend()
+
+
+def genres_revenue_winnings(plt, results, actor):
+    genres_mean = results['genres_mean']
+    genres_mean['revenue'].plot(kind='bar', alpha=0.6, color='black', label='Revenue', figsize=(16, 8))
+    genres_mean['winnings'].plot(kind='bar', alpha=0.7, color='green', label='Winning', figsize=(16, 8))
+    plt.title('The revenues and winnings of movies by genres', fontsize=15)
+    plt.xlabel('Genres', fontsize=12)
+    plt.ylabel('Revenues and winnings [millions]', fontsize=12)
+    plt.legend()
+
+
+def genres_revenue_winnings_budget(plt, results, actor):
+    results['genres_mean'][['revenue', 'winnings', 'budget']].plot(
+        kind='bar', alpha=0.6, color=['black', 'green', 'red'], figsize=(16, 8))
+    plt.title('The revenues, winnings and budgets movies by genres', fontsize=15)
+    plt.xlabel('Genres', fontsize=12)
+    plt.ylabel('Revenues, winnings, budgets [millions]', fontsize=12)
+    plt.legend(['Reveneue', 'Winning', 'Budget'])
+
+
+def genres_scatter_revenue_winnings(plt, results, actor):
+    genres_mean = results['genres_mean']
+    plt.figure(figsize=(7, 7))
+    plt.scatter(genres_mean['revenue'], genres_mean['winnings'], color='blue', alpha=0.5)
+    plt.title('Comparison of revenues & winnings', fontsize=15)
+    plt.xlabel('Revenues [million]', fontsize=12)
+    plt.ylabel('Winnings [million]', fontsize=12)
+
+
+# question 4.1:
+
+def actor_budgets(plt, results, actor):
+    actor_movies = results['actor_movies']
+    plt.figure(figsize=(15, 7))
+    plt.scatter(actor_movies['release_date'], actor_movies['budget'])
+    plt.title('All budgets of movies with {} during the years'.format(actor), fontsize=15)
+    plt.xlabel('Years', fontsize=12)
+    plt.ylabel('Budgets [million]', fontsize=12)
+
+
+def actor_budget_classes_bar(plt, results, actor):
+    percentages = results['actor_budget_percentages']
+    plt.bar(percentages.index.astype(str), percentages.values)
+    plt.title('Distribution in percentages of different movie budget classes for {}:'.format(actor), fontsize=15)
+    plt.xlabel('Movie budget classes', fontsize=12)
+    plt.ylabel('Percentage [%]', fontsize=12)
+
+
+def actor_budget_classes_pie(plt, results, actor):
+    percentages = results['actor_budget_percentages']
+    if percentages.sum() == 0:
+        return False
+    plt.pie(percentages.values, autopct='%1.2f%%',
+            colors=['lightcoral', 'darkorange', 'lightseagreen', 'springgreen'],
+            explode=(0.05, 0.05, 0.05, 0.05), textprops={'color': 'black'})
+    plt.title('Distribution in percentages of different movie budget classes for {}:'.format(actor), fontsize=15)
+    plt.legend(title='Budget classes:', loc='right', labels=list(percentages.index), bbox_to_anchor=(1, 0, 0.5, 1))
+
+
+def actor_votes(plt, results, actor):
+    results['actor_movies']['vote_average'].hist(figsize=(10, 10))
+    plt.title('Average votes for movies with actor {}'.format(actor), fontsize=15)
+    plt.xlabel('Average votes', fontsize=15)
+    plt.ylabel('Amount of votes', fontsize=15)
+
+
+def actor_votes_by_budget(plt, results, actor):
+    results['actor_votes_by_budget'].plot(kind='bar', figsize=(15, 5))
+    plt.title('Mean average votings for {} by different budget classes of movies'.format(actor), fontsize=15)
+    plt.xticks(rotation=0)
+    plt.xlabel('Movie budget classes', fontsize=12)
+    plt.ylabel('Average votings', fontsize=12)
+
+
+# question 4.2 - 4.4:
+
+def runtime_classes(plt, results, actor):
+    runtime_counts = results['runtime_class_counts']
+    runtime_counts.plot(kind='bar', figsize=(15, 10))
+    plt.title('Distribution of movie runtimes by their runtime labels', fontsize=15)
+    plt.xlabel('Runtime labels', fontsize=12)
+    plt.ylabel('Amount of labels', fontsize=12)
+    _add_value_label(plt, runtime_counts)
+
+
+def rating_classes(plt, results, actor):
+    rating_counts = results['rating_class_counts']
+    plt.bar(rating_counts.index.astype(str), rating_counts.values, width=0.5)
+    plt.title('Distribution of movie by ratings classes', fontsize=15)
+    plt.xticks(rotation=60)
+    plt.xlabel('Rating labels', fontsize=12)
+    plt.ylabel('Amount of labels', fontsize=12)
+    _add_value_label(plt, rating_counts)
+
+
+def ratings_by_votes(plt, results, actor):
+    results['ratings_by_votes'].plot(kind='bar', legend=None, figsize=(15, 10))
+    plt.title('Distribution of rating classes groupby counted votes', fontsize=15)
+    plt.xlabel('Rating classes & counted votes', fontsize=12)
+    plt.ylabel('Amount of labels', fontsize=12)
+
+
+# chart name -> (function, keys of the results the chart is drawn from):
+CHARTS = {
+    'years_budget_revenue_winnings': (years_budget_revenue_winnings, ['years_mean']),
+    'scatter_revenue_budget': (_money_scatter('revenue', 'budget'), ['money']),
+    'scatter_budget_winnings': (_money_scatter('budget', 'winnings'), ['money']),
+    'scatter_revenue_winnings': (_money_scatter('revenue', 'winnings'), ['money']),
+    'years_runtime': (years_runtime, ['years_runtime']),
+    'genres_count': (genres_count, ['genres_count']),
+    'genres_runtime': (_genres_bar('genres_runtime', 'The mean runtime of movies by genres', 'Runtime [minutes]'),
+                       ['genres_runtime']),
+    'genres_budget': (_genres_bar('genres_budget', 'The budgets of movies by genres', 'Budget [millions]'),
+                      ['genres_budget']),
+    'genres_revenue': (_genres_bar('genres_revenue', 'The revenues of movies by genres', 'Revenues [millions]'),
+                       ['genres_revenue']),
+    'genres_revenue_budget': (genres_revenue_budget, ['genres_mean']),
+    'genres_revenue_winnings': (genres_revenue_winnings, ['genres_mean']),
+    'genres_revenue_winnings_budget': (genres_revenue_winnings_budget, ['genres_mean']),
+    'genres_scatter_revenue_winnings': (genres_scatter_revenue_winnings, ['genres_mean']),
+    'actor_budgets': (actor_budgets, ['actor_movies']),
+    'actor_budget_classes_bar': (actor_budget_classes_bar, ['actor_budget_percentages']),
+    'actor_budget_classes_pie': (actor_budget_classes_pie, ['actor_budget_percentages']),
+    'actor_votes': (actor_votes, ['actor_movies']),
+    'actor_votes_by_budget': (actor_votes_by_budget, ['actor_votes_by_budget']),
+    'runtime_classes': (runtime_classes, ['runtime_class_counts']),
+    'rating_classes': (rating_classes, ['rating_class_counts']),
+    'ratings_by_votes': (ratings_by_votes, ['ratings_by_votes']),
+}
+
+# replacements of the scatter plots in density mode, the outliers are only drawn if requested:
+DENSITY_CHARTS = {
+    'scatter_revenue_budget': (_money_density('revenue', 'budget'), ['density_revenue_budget']),
+    'scatter_budget_winnings': (_money_density('budget', 'winnings'), ['density_budget_winnings']),
+    'scatter_revenue_winnings': (_money_density('revenue', 'winnings'), ['density_revenue_winnings']),
+}
+
+# charts with the name of the actor in their title:
+ACTOR_CHARTS = ['actor_budgets', 'actor_budget_classes_bar', 'actor_budget_classes_pie', 'actor_votes',
+                'actor_votes_by_budget']
+
+
+def fingerprint(name, data, actor, formats):
+    """Return a hash of everything a chart depends on."""
+    if name not in ACTOR_CHARTS:
+        actor = None
+    digest = hashlib.sha256(json.dumps([name, actor, list(formats), CHARTS_VERSION]).encode())
+    for key in sorted(data):
+        value = data[key]
+        digest.update(key.encode())
+        digest.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+        if isinstance(value, pd.DataFrame):
+            digest.update(repr(list(value.columns)).encode())
+    return digest.hexdigest()
+
+
+def _init_worker():
+    import matplotlib
+    matplotlib.use('Agg')
+    import seaborn as sns
+    sns.set()
+
+
+def _charts(density=False, outliers=True):
+    charts = dict(CHARTS)
+    if density:
+        for name, (chart, keys) in DENSITY_CHARTS.items():
+            charts[name] = (chart, keys + ['money_outliers'] if outliers else keys)
+    return charts
+
+
+def draw_chart(name, data, actor, output_dir, formats, density=False):
+    """Draw one chart and save it in all formats. Returns the written paths."""
+    import matplotlib.pyplot as plt
+    chart, keys = _charts(density)[name]
+    written = []
+    try:
+        if chart(plt, data, actor) is False:
+            return written
+        for fmt in formats:
+            path = os.path.join(output_dir, '{}.{}'.format(name, fmt))
+            plt.savefig(path, bbox_inches='tight')
+            written.append(path)
+    finally:
+        plt.close('all')
+    return written
+
+
+def _read_manifest(output_dir):
+    try:
+        with open(os.path.join(output_dir, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def render_report(results, output_dir='figures', formats=('png',), actor='Robert De Niro', processes=None,
+                  force=False, density=False, outliers=True):
+    """Render all charts into output_dir and return the paths of the written files.
+
+    The charts are drawn on a process pool with processes workers (all CPUs
+    by default, 1 draws them in this process). Charts whose data did not
+    change since the last call with the same output_dir are skipped, unless
+    force is True. With density the scatter plots of question 1 are drawn as
+    density images, with outliers the most extreme movies are drawn over them.
+    """
+    formats = list(formats)
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = _read_manifest(output_dir)
+
+    todo = {}
+    for name, (chart, keys) in _charts(density, outliers).items():
+        data = {key: results[key] for key in keys}
+        digest = fingerprint(name, data, actor, formats)
+        files = [os.path.join(output_dir, '{}.{}'.format(name, fmt)) for fmt in formats]
+        if not force and manifest.get(name) == digest and all(os.path.exists(path) for path in files):
+            continue
+        todo[name] = (data, digest)
+
+    written = []
+    if processes == 1:
+        _init_worker()
+        for name, (data, digest) in todo.items():
+            written.extend(draw_chart(name, data, actor, output_dir, formats, density))
+            manifest[name] = digest
+    elif todo:
+        from tmdb.profiling import init_worker
+        with ProcessPoolExecutor(max_workers=processes, initializer=init_worker,
+                                 initargs=(_init_worker,)) as pool:
+            futures = {name: pool.submit(draw_chart, name, data, actor, output_dir, formats, density)
+                       for name, (data, digest) in todo.items()}
+            for name, future in futures.items():
+                written.extend(future.result())
+                manifest[name] = todo[name][1]
+
+    with open(os.path.join(output_dir, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    return written
@@ -0,0 +1,84 @@
+# coding: utf-8
+
+# Parallel execution of the questions of the investigation.
+#
+# The cleaned dataset is written once as an uncompressed Feather file, and
+# the bridge tables which the questions need (see
+# pipeline.QUESTION_ENTITIES) are built once and written next to it. Every
+# worker process memory-maps these files in its initializer: the numbers,
+# strings and bridge arrays are views of the mapped pages, which all workers
+# share through the page cache instead of holding a private copy each. That
+# is why the entity columns are written as plain strings, a categorical with
+# about one category per movie (cast, keywords, companies) would be converted
+# into private memory by every worker. After that each question of
+# pipeline.QUESTIONS runs as its own task on the process pool and the results
+# are gathered into one dict, like pipeline.aggregate() returns.
+
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from tmdb import pipeline
+from tmdb.cache import read_bridges, read_cache, write_bridges, write_cache
+from tmdb.profiling import init_worker
+
+# state of a worker process, set by _init_worker:
+_worker = {}
+
+
+def _init_worker(path, bridges_dir, entities, cube=None):
+    from tmdb.aggregates import AggregateCache
+    # the entity columns stay strings, see above:
+    df = read_cache(path, compact=False)
+    bridges = read_bridges(bridges_dir, df, entities)
+    _worker.update(df=df, bridges=bridges, aggregates=AggregateCache(df, bridges, cube=cube))
+
+
+def _run_question(name, actor):
+    question = pipeline.QUESTIONS[name]
+    return name, question(_worker['df'], _worker['bridges'], _worker['aggregates'], actor)
+
+
+def _shared(df):
+    """Return df with the categorical entity columns as strings, see above."""
+    from tmdb.schema import ENTITY_COLUMNS
+    return df.astype({column: 'str' for column in ENTITY_COLUMNS
+                      if column in df and isinstance(df[column].dtype, pd.CategoricalDtype)})
+
+
+def run_parallel(df=None, path=None, actor='Robert De Niro', processes=None, questions=None, cube=None):
+    """Answer the questions on a process pool and return the gathered results.
+
+    Either the cleaned dataset df or the path of a cached Feather file of it
+    (see tmdb.cache) must be given. processes defaults to the number of CPUs,
+    questions to all keys of pipeline.QUESTIONS. A tmdb.cube.Cube is sent to
+    every worker for its aggregate cache.
+    """
+    from tmdb.bridges import LIST_COLUMNS, build_bridges
+    if questions is None:
+        questions = list(pipeline.QUESTIONS)
+    entities = [entity for entity in LIST_COLUMNS
+                if any(entity in pipeline.QUESTION_ENTITIES[name] for name in questions)]
+    tmp_dir = tempfile.TemporaryDirectory(prefix='tmdb-')
+    try:
+        if df is None:
+            df = read_cache(path)
+        else:
+            path = os.path.join(tmp_dir.name, 'cleaned.feather')
+            write_cache(_shared(df), path)
+        # the bridges are built from the original columns, so the names are in the same order as in aggregate():
+        write_bridges(build_bridges(df, {entity: LIST_COLUMNS[entity] for entity in entities}), tmp_dir.name)
+        with ProcessPoolExecutor(max_workers=processes, initializer=init_worker,
+                                 initargs=(_init_worker, path, tmp_dir.name, entities, cube)) as pool:
+            futures = [pool.submit(_run_question, name, actor) for name in questions]
+            answers = dict(future.result() for future in futures)
+    finally:
+        tmp_dir.cleanup()
+
+    # keep the order of the questions, like pipeline.aggregate():
+    results = {}
+    for name in questions:
+        results.update(answers[name])
+    return results
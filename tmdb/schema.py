@@ -0,0 +1,63 @@
+# coding: utf-8
+
+# Compact in-memory schema of the cleaned dataset.
+#
+# All entity columns (director, genres, production companies, cast and
+# keywords) are stored dictionary-encoded as categoricals, so repeated
+# values like 'Unknown' or the same genre combination are kept only once.
+# The label classes get fixed, ordered categorical dtypes instead of the ones
+# pd.cut happens to create, and the numbers use the smallest fitting dtypes.
+# The single names inside the pipe-delimited lists are integer codes in the
+# bridge tables (see tmdb.bridges). memory_usage() measures all of it.
+# The Feather cache, the Parquet stores and the shards of the cube are read
+# back with compact(), pipeline.run() records the memory of the dataset and
+# checks it against the budget of --memory-budget.
+
+import pandas as pd
+
+from tmdb import pipeline
+
+ENTITY_COLUMNS = ['director', 'genres', 'production_companies', 'cast', 'keywords']
+
+LABEL_DTYPES = {
+    'rating_class': pd.CategoricalDtype(pipeline.BIN_LABELS_RATING, ordered=True),
+    'vote_counts_class': pd.CategoricalDtype(pipeline.BIN_LABELS_VOTING, ordered=True),
+    'runtime_class': pd.CategoricalDtype(pipeline.BIN_LABELS_RUNTIME, ordered=True),
+    'budget_class': pd.CategoricalDtype(pipeline.BIN_LABELS_BUDGET, ordered=True),
+}
+
+# budget, revenue and winnings stay float64, in float32 the millions would be
+# rounded to about 100 dollars for the biggest revenues.
+NUMBER_DTYPES = {'id': 'int32', 'release_year': 'int16', 'runtime': 'int16', 'vote_count': 'int32',
+                 'vote_average': 'float32'}
+
+
+def compact(df):
+    """Return the cleaned dataset with the compact schema."""
+    dtypes = {column: 'category' for column in ENTITY_COLUMNS}
+    dtypes.update(LABEL_DTYPES)
+    dtypes.update(NUMBER_DTYPES)
+    return df.astype({column: dtype for column, dtype in dtypes.items() if column in df})
+
+
+def memory_usage(df, bridges=None):
+    """Return the measured memory in bytes of every column and of every bridge table."""
+    usage = df.memory_usage(deep=True, index=True)
+    if bridges is not None:
+        for entity, bridge in bridges.items():
+            usage['bridge ' + entity] = (bridge.rows.nbytes + bridge.codes.nbytes
+                                         + bridge.names.memory_usage(deep=True))
+    return usage
+
+
+class MemoryBudgetError(ValueError):
+    """The dataset needs more memory than the budget."""
+
+
+def check_memory_budget(df, budget, bridges=None):
+    """Return the total memory of df (and the bridges) and raise a MemoryBudgetError if it exceeds budget bytes."""
+    total = int(memory_usage(df, bridges).sum())
+    if total > budget:
+        raise MemoryBudgetError('the dataset needs {:,} bytes, which is more than the memory budget of {:,} bytes'
+                                .format(total, budget))
+    return total
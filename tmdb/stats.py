@@ -0,0 +1,239 @@
+# coding: utf-8
+
+# Correlations and least squares fits of the numeric columns.
+#
+# The notebook only looks at the scatter plots of budgets, revenues and
+# winnings and leaves the regression out. Here everything is computed from the
+# cross products Z'Z of the columns (plus a column of ones) per group: the
+# rows are sorted by group once and np.add.reduceat sums all products of a
+# column with all other columns for all groups at once, so there is no Python
+# loop over the groups. From the stacked G x m x m cross products follow
+#   - Pearson correlation matrices (and Spearman, on ranks within the groups)
+#   - OLS fits for every group with np.linalg.pinv on the stack of X'X,
+#     standard errors and t confidence intervals
+# Groups are a column (release_year, budget_class, ...) or a bridge entity
+# like 'genre', where a movie belongs to all of its genres. bootstrap()
+# resamples within the groups on a process pool for percentile intervals.
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+NUMERIC_COLUMNS = ['budget', 'revenue', 'winnings', 'runtime', 'vote_average', 'vote_count', 'release_year']
+
+# state of a bootstrap worker process, set by _init_worker:
+_worker = {}
+
+
+def _groups(df, by, bridges=None):
+    """Return (rows, codes, names): the rows of df in every group, the group codes and the group names."""
+    if by is None:
+        return np.arange(len(df)), np.zeros(len(df), dtype=np.int64), pd.Index(['all'])
+    from tmdb.bridges import LIST_COLUMNS
+    if by in LIST_COLUMNS:
+        if bridges is None or by not in bridges:
+            from tmdb.bridges import Bridge
+            bridge = Bridge.from_column(df[LIST_COLUMNS[by]])
+        else:
+            bridge = bridges[by]
+        return bridge.rows, bridge.codes.astype(np.int64), pd.Index(bridge.names, name=by)
+    codes, names = pd.factorize(df[by], sort=True)
+    present = codes >= 0
+    return np.flatnonzero(present), codes[present].astype(np.int64), pd.Index(names, name=by)
+
+
+def _data(df, columns, by, bridges):
+    """Return the values of the columns in the rows of all groups, without rows with NaN."""
+    rows, codes, names = _groups(df, by, bridges)
+    values = df[columns].to_numpy(dtype=np.float64)[rows]
+    complete = ~np.isnan(values).any(axis=1)
+    return values[complete], codes[complete], names
+
+
+def cross_products(values, codes, n_groups):
+    """Return the G x m x m stack of Z'Z of the rows of every group, Z = [1, values].
+
+    [g, 0, 0] is the number of rows of group g, [g, 0, 1:] the sums.
+    """
+    z = np.empty((len(values), values.shape[1] + 1))
+    z[:, 0] = 1
+    z[:, 1:] = values
+    order = np.argsort(codes, kind='stable')
+    z, codes = z[order], codes[order]
+    present, starts = np.unique(codes, return_index=True)
+    result = np.zeros((n_groups, z.shape[1], z.shape[1]))
+    if len(z) == 0:
+        return result
+    for i in range(z.shape[1]):
+        result[present, i, :] = np.add.reduceat(z * z[:, i:i + 1], starts, axis=0)
+    return result
+
+
+def _pearson(cross):
+    n = cross[:, 0, 0]
+    sums = cross[:, 0, 1:]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        covariance = cross[:, 1:, 1:] - sums[:, :, None] * sums[:, None, :] / n[:, None, None]
+        std = np.sqrt(np.diagonal(covariance, axis1=1, axis2=2))
+        return covariance / (std[:, :, None] * std[:, None, :])
+
+
+def group_ranks(values, codes):
+    """Return the average ranks (1 for the smallest, ties share their mean rank) within every group.
+
+    All columns of values are ranked, each with one lexsort over all groups.
+    """
+    ranks = np.empty_like(values, dtype=np.float64)
+    for j in range(values.shape[1]):
+        order = np.lexsort((values[:, j], codes))
+        sorted_values, sorted_codes = values[order, j], codes[order]
+        position = np.arange(len(order))
+        # a block of ties starts where the group or the value changes:
+        new_group = np.r_[True, sorted_codes[1:] != sorted_codes[:-1]]
+        new_block = new_group | np.r_[True, sorted_values[1:] != sorted_values[:-1]]
+        group_start = np.maximum.accumulate(np.where(new_group, position, 0))
+        block_id = np.cumsum(new_block) - 1
+        block_start = position[new_block]
+        block_end = np.r_[block_start[1:], len(order)] - 1
+        average = (block_start + block_end)[block_id] / 2 - group_start + 1
+        ranks[order, j] = average
+    return ranks
+
+
+def correlation(df, columns=None, method='pearson', by=None, bridges=None):
+    """Return the correlation matrix of the columns, for the whole DataFrame or for every group of by.
+
+    method is 'pearson' or 'spearman'. With by the result has a MultiIndex
+    (group, column), groups with less than two movies get NaN.
+    """
+    if method not in ('pearson', 'spearman'):
+        raise ValueError('unknown method {!r}, use pearson or spearman'.format(method))
+    columns = list(columns or [column for column in NUMERIC_COLUMNS if column in df])
+    values, codes, names = _data(df, columns, by, bridges)
+    if method == 'spearman':
+        values = group_ranks(values, codes)
+    else:
+        # centering does not change the correlations, but keeps the cross products small:
+        values = values - values.mean(axis=0) if len(values) else values
+    matrices = _pearson(cross_products(values, codes, len(names)))
+    if by is None:
+        return pd.DataFrame(matrices[0], index=columns, columns=columns)
+    index = pd.MultiIndex.from_product([names, columns], names=[by, None])
+    return pd.DataFrame(matrices.reshape(-1, len(columns)), index=index, columns=columns)
+
+
+def _t_quantile(q, dof):
+    try:
+        from scipy import stats
+    except ImportError:
+        # normal approximation without scipy:
+        from statistics import NormalDist
+        return np.full(np.shape(dof), NormalDist().inv_cdf(q))
+    return stats.t.ppf(q, dof)
+
+
+def _solve(cross):
+    """Return the coefficients, the residual sum of squares and the inverse of X'X of every group.
+
+    cross is the stack of Z'Z for Z = [1, x..., y].
+    """
+    xtx = cross[:, :-1, :-1]
+    xty = cross[:, :-1, -1]
+    inverse = np.linalg.pinv(xtx)
+    coef = np.einsum('gij,gj->gi', inverse, xty)
+    rss = cross[:, -1, -1] - np.einsum('gi,gi->g', coef, xty)
+    # groups with fewer movies than coefficients have no fit:
+    coef[cross[:, 0, 0] < xtx.shape[1]] = np.nan
+    return coef, np.maximum(rss, 0), inverse
+
+
+def ols(df, y, x, by=None, bridges=None, alpha=0.05):
+    """Fit y = intercept + x @ slopes by least squares, for the whole DataFrame or for every group of by.
+
+    x is a column or a list of columns. Returns a DataFrame with one row per
+    (group,) term: coef, se, lower and upper bound of the 1 - alpha
+    confidence interval, and the number of movies n and r2 of the fit.
+    """
+    x = [x] if isinstance(x, str) else list(x)
+    values, codes, names = _data(df, x + [y], by, bridges)
+    cross = cross_products(values, codes, len(names))
+    coef, rss, inverse = _solve(cross)
+
+    n = cross[:, 0, 0]
+    k = len(x) + 1
+    dof = n - k
+    with np.errstate(invalid='ignore', divide='ignore'):
+        sigma2 = np.where(dof > 0, rss / dof, np.nan)
+        se = np.sqrt(sigma2[:, None] * np.diagonal(inverse, axis1=1, axis2=2))
+        tss = cross[:, -1, -1] - cross[:, 0, -1] ** 2 / n
+        r2 = 1 - rss / tss
+    margin = _t_quantile(1 - alpha / 2, np.maximum(dof, 1))[:, None] * se
+
+    terms = ['intercept'] + x
+    result = pd.DataFrame({'coef': coef.ravel(), 'se': se.ravel(), 'lower': (coef - margin).ravel(),
+                           'upper': (coef + margin).ravel(), 'n': np.repeat(n, k).astype(np.int64),
+                           'r2': np.repeat(r2, k)},
+                          index=pd.MultiIndex.from_product([names, terms], names=[by, 'term']))
+    return result.droplevel(0) if by is None else result
+
+
+def pairwise_ols(df, pairs, by=None, bridges=None, alpha=0.05):
+    """Return the simple fits y = intercept + slope * x of all (x, y) pairs in one table."""
+    fits = {'{} ~ {}'.format(y, x): ols(df, y, x, by, bridges, alpha) for x, y in pairs}
+    return pd.concat(fits, names=['fit'])
+
+
+# bootstrap:
+
+def _init_worker(values, codes, n_groups):
+    order = np.argsort(codes, kind='stable')
+    values, codes = values[order], codes[order]
+    sizes = np.bincount(codes, minlength=n_groups)
+    starts = np.r_[0, np.cumsum(sizes)[:-1]]
+    _worker.update(values=values, codes=codes, n_groups=n_groups, sizes=sizes, starts=starts)
+
+
+def _resample_fits(seed, count):
+    """Fit count resamples drawn within every group and return the count x G x k coefficients."""
+    rng = np.random.default_rng(seed)
+    values, codes = _worker['values'], _worker['codes']
+    sizes, starts = _worker['sizes'][codes], _worker['starts'][codes]
+    fits = []
+    for _ in range(count):
+        # the i-th row of a group is replaced by a random row of the same group:
+        picks = starts + (rng.random(len(codes)) * sizes).astype(np.int64)
+        fits.append(_solve(cross_products(values[picks], codes, _worker['n_groups']))[0])
+    return np.stack(fits)
+
+
+def bootstrap(df, y, x, by=None, bridges=None, resamples=1000, alpha=0.05, processes=None, seed=0, batch=50):
+    """Return percentile bootstrap intervals of the coefficients of ols(df, y, x, by).
+
+    The rows are resampled within every group, batch resamples per task on a
+    process pool with processes workers (1 runs them in this process). The
+    result has the index of ols() and the columns coef, boot_se,
+    boot_lower and boot_upper.
+    """
+    x = [x] if isinstance(x, str) else list(x)
+    values, codes, names = _data(df, x + [y], by, bridges)
+    seeds = np.random.SeedSequence(seed).spawn((resamples + batch - 1) // batch)
+    counts = [min(batch, resamples - i * batch) for i in range(len(seeds))]
+
+    if processes == 1:
+        _init_worker(values, codes, len(names))
+        fits = [_resample_fits(s, count) for s, count in zip(seeds, counts)]
+    else:
+        from tmdb.profiling import init_worker
+        with ProcessPoolExecutor(max_workers=processes, initializer=init_worker,
+                                 initargs=(_init_worker, values, codes, len(names))) as pool:
+            fits = list(pool.map(_resample_fits, seeds, counts))
+    fits = np.concatenate(fits)
+
+    coef = _solve(cross_products(values, codes, len(names)))[0]
+    lower, upper = np.nanpercentile(fits, [100 * alpha / 2, 100 * (1 - alpha / 2)], axis=0)
+    terms = ['intercept'] + x
+    result = pd.DataFrame({'coef': coef.ravel(), 'boot_se': np.nanstd(fits, axis=0, ddof=1).ravel(),
+                           'boot_lower': lower.ravel(), 'boot_upper': upper.ravel()},
+                          index=pd.MultiIndex.from_product([names, terms], names=[by, 'term']))
+    return result.droplevel(0) if by is None else result
@@ -0,0 +1,130 @@
+# coding: utf-8
+
+# Out-of-core version of the Data Wrangling section.
+#
+# The csv-file is read in chunks of chunksize rows and every chunk goes
+# through the same cleaning rules as pipeline.clean(). Duplicates are removed
+# across chunks with a set of the already seen ids, or with keep by a
+# tmdb.dedup.ChunkedDeduplicator in an extra pass. Two passes are needed:
+#   1. clean the chunks, write them to a temporary Parquet file and feed the
+#      columns of the quantile classes into KLL sketches (tmdb.binning)
+#   2. read the temporary file again row group by row group, add the classes
+#      with the approximate edges, scale to millions and write the result
+# The peak memory is bounded by the chunk size (plus the set of ids), not by
+# the size of the file. Needs pyarrow.
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from tmdb import pipeline
+from tmdb.binning import QUARTILES, KLLSketch
+
+# categories of a chunk are not the categories of the whole file, so the
+# streaming mode reads all text columns as plain strings:
+STREAM_DTYPES = {column: kind for column, kind in pipeline.DTYPES.items() if kind != 'category'}
+
+
+def read_chunks(path, chunksize=100000):
+    """Read the relevant columns of the csv-file in typed chunks."""
+    return pd.read_csv(path, usecols=pipeline.USE_COLUMNS, dtype=STREAM_DTYPES, parse_dates=['release_date'],
+                       date_format=pipeline.DATE_FORMAT, chunksize=chunksize)
+
+
+def _unseen(ids, seen):
+    """Return a mask of the ids which are neither in seen nor earlier in ids, and add them to seen."""
+    mask = np.zeros(len(ids), dtype=bool)
+    for i, movie_id in enumerate(ids):
+        if movie_id not in seen:
+            seen.add(movie_id)
+            mask[i] = True
+    return mask
+
+
+def clean_chunk(chunk, seen):
+    """Apply the cleaning rules of pipeline.clean() to one chunk.
+
+    Rows whose id is already in seen are dropped as duplicates.
+    """
+    chunk = chunk.drop(columns=pipeline.NOT_RELEVANT, errors='ignore')
+    chunk = chunk[_unseen(chunk['id'].to_numpy(), seen)]
+    chunk = pipeline.fill_unknown(chunk)
+    chunk = chunk.drop(chunk[(chunk.budget == 0) | (chunk.revenue == 0) | (chunk.runtime == 0)].index)
+    return chunk.reset_index(drop=True)
+
+
+def clean_chunks(chunks, seen=None):
+    """Yield the cleaned chunks of an iterable of raw chunks."""
+    if seen is None:
+        seen = set()
+    for chunk in chunks:
+        yield clean_chunk(chunk, seen)
+
+
+def stream_pipeline(path, output_path, chunksize=100000, k=200, seed=None, keep=None):
+    """Clean and classify a csv-file chunk by chunk and write the result to a Parquet file.
+
+    The quantile classes use approximate edges from KLL sketches with the
+    parameter k. By default the first row of every id is kept; with keep
+    ('latest' or 'most_votes') the csv-file is read once more to resolve
+    different rows of the same id (see tmdb.dedup). Returns a dict with the
+    row counts, the used edges and, with keep, the conflict report.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    sketches = {column: KLLSketch(k, seed) for column in pipeline.QUANTILE_CLASSES}
+    runtime_max = 0
+    rows_in = rows_cleaned = 0
+    seen = set()
+    tmp_path = output_path + '.cleaned.tmp'
+
+    deduplicator = None
+    if keep is not None:
+        from tmdb.dedup import ChunkedDeduplicator
+        deduplicator = ChunkedDeduplicator(keep)
+        for raw in read_chunks(path, chunksize):
+            deduplicator.add(raw.drop(columns=pipeline.NOT_RELEVANT, errors='ignore'))
+
+    # 1. pass: clean and collect the sketches
+    writer = None
+    for raw in read_chunks(path, chunksize):
+        rows_in += len(raw)
+        if deduplicator is not None:
+            raw = deduplicator.filter(raw.drop(columns=pipeline.NOT_RELEVANT, errors='ignore'))
+        chunk = clean_chunk(raw, seen)
+        rows_cleaned += len(chunk)
+        if len(chunk) == 0:
+            continue
+        for column, sketch in sketches.items():
+            sketch.update(chunk[column].to_numpy())
+        runtime_max = max(runtime_max, int(chunk['runtime'].max()))
+        table = pa.Table.from_pandas(chunk, preserve_index=False)
+        if writer is None:
+            writer = pq.ParquetWriter(tmp_path, table.schema)
+        writer.write_table(table.cast(writer.schema))
+    if writer is None:
+        raise ValueError('no rows left after cleaning {}'.format(path))
+    writer.close()
+
+    edges = {column: [float(edge) for edge in sketch.quantile(QUARTILES)]
+             for column, sketch in sketches.items()}
+    edges['runtime'] = pipeline.RUNTIME_EDGES + [runtime_max]
+
+    # 2. pass: classify row group by row group
+    writer = None
+    cleaned = pq.ParquetFile(tmp_path)
+    for i in range(cleaned.num_row_groups):
+        chunk = pipeline.classify(cleaned.read_row_group(i).to_pandas(), edges=edges)
+        table = pa.Table.from_pandas(chunk, preserve_index=False)
+        if writer is None:
+            writer = pq.ParquetWriter(output_path, table.schema)
+        writer.write_table(table.cast(writer.schema))
+    writer.close()
+    os.remove(tmp_path)
+
+    stats = {'rows_in': rows_in, 'rows_out': rows_cleaned, 'duplicates': rows_in - len(seen), 'edges': edges}
+    if deduplicator is not None:
+        stats['conflicts'] = deduplicator.report()
+    return stats
@@ -0,0 +1,103 @@
+# coding: utf-8
+
+# Top-k and bottom-k lists ("leaderboards") without sorting whole columns.
+#
+# np.argpartition selects the k largest or smallest values in linear time,
+# only these k values are sorted afterwards. Rankings of groups (genre,
+# actor, company, year, ...) are taken from the aggregates of an
+# AggregateCache (see tmdb.aggregates), so many leaderboards over the same
+# grouping share one grouped pass. For data in chunks, top_k_chunks keeps
+# only the k candidates of every chunk and merges them at the end.
+
+import numpy as np
+import pandas as pd
+
+from tmdb.aggregates import AggregateCache
+
+
+def top_k_positions(values, k, largest=True):
+    """Return the positions of the k largest (or smallest) values, sorted by value.
+
+    NaN values are ranked last in both directions.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    keys = -values if largest else values.copy()
+    keys[np.isnan(keys)] = np.inf
+    k = min(k, len(keys))
+    if k == 0:
+        return np.array([], dtype=np.int64)
+    if k < len(keys):
+        candidates = np.argpartition(keys, k - 1)[:k]
+    else:
+        candidates = np.arange(len(keys))
+    # sort the k candidates, ties keep the order of the data:
+    return candidates[np.lexsort((candidates, keys[candidates]))]
+
+
+def _aggregates(df, groupings):
+    """Return an AggregateCache of df with the bridges of the entities (genre, actor, ...) among groupings."""
+    from tmdb.bridges import LIST_COLUMNS, build_bridges
+    entities = {by: LIST_COLUMNS[by] for by in groupings if by in LIST_COLUMNS}
+    return AggregateCache(df, build_bridges(df, entities) if entities else None)
+
+
+def top_k(df, measure, k=10, largest=True, by=None, stat='mean', columns=None, aggregates=None):
+    """Return the k movies or groups with the largest (or smallest) measure.
+
+    Without by the movies themselves are ranked and the columns (default:
+    title and measure) of df are returned. With by (a column like
+    'release_year' or a bridge entity like 'actor') the statistic stat of the
+    measure per group is ranked and returned as Series.
+    """
+    if by is None:
+        if columns is None:
+            columns = ['title', measure]
+        positions = top_k_positions(df[measure].to_numpy(), k, largest)
+        return df.iloc[positions][columns]
+
+    if aggregates is None:
+        aggregates = _aggregates(df, [by])
+    grouped = aggregates.get(by, measure, stat)
+    return grouped.iloc[top_k_positions(grouped.to_numpy(), k, largest)]
+
+
+def leaderboards(df, specs, aggregates=None):
+    """Compute many leaderboards at once.
+
+    specs maps the name of a leaderboard to the keyword arguments of top_k,
+    for example {'top10_budget': {'measure': 'budget'}}. The measures of all
+    movie rankings are read from df once and the group rankings share the
+    grouped passes of one AggregateCache.
+    """
+    if aggregates is None:
+        aggregates = _aggregates(df, {spec.get('by') for spec in specs.values()})
+    movie_measures = sorted({spec['measure'] for spec in specs.values() if spec.get('by') is None})
+    values = {measure: df[measure].to_numpy() for measure in movie_measures}
+
+    results = {}
+    for name, spec in specs.items():
+        spec = dict(spec)
+        if spec.get('by') is None:
+            measure = spec['measure']
+            columns = spec.get('columns') or ['title', measure]
+            positions = top_k_positions(values[measure], spec.get('k', 10), spec.get('largest', True))
+            results[name] = df.iloc[positions][columns]
+        else:
+            results[name] = top_k(df, aggregates=aggregates, **spec)
+    return results
+
+
+def top_k_chunks(chunks, measure, k=10, largest=True, columns=None):
+    """Return the k rows with the largest (or smallest) measure of an iterable of DataFrame chunks.
+
+    Only the k best rows of every chunk are kept and merged with the best
+    rows so far, so the memory is bounded by the chunk size plus k rows.
+    """
+    best = None
+    for chunk in chunks:
+        if columns is not None:
+            chunk = chunk[columns]
+        candidates = chunk.iloc[top_k_positions(chunk[measure].to_numpy(), k, largest)]
+        best = candidates if best is None else pd.concat([best, candidates])
+        best = best.iloc[top_k_positions(best[measure].to_numpy(), k, largest)]
+    return best